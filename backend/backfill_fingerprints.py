@@ -0,0 +1,79 @@
+"""
+Compute the error fingerprint (icm.Cases.Fingerprint) of existing cases
+
+The API fingerprints cases as they are created or updated; run this once
+after applying database/add_case_fingerprint_migration.sql, after loading
+cases directly in SQL, or after changing the fingerprint normalization.
+Cases are read newest first, --chunk-size at a time, and only changed
+fingerprints are written (one executemany per chunk). Running API workers
+pick them up on their next vector index refresh.
+
+Usage:
+    python backfill_fingerprints.py
+    python backfill_fingerprints.py --chunk-size 5000
+"""
+import argparse
+import os
+import sys
+import time
+from dotenv import load_dotenv
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+load_dotenv()
+
+from db import db_manager
+from fingerprint import ERROR_FIELDS, case_fingerprint
+from pagination import cursor_key
+from repository import case_repository
+
+COLUMNS = ["CaseID", "CreatedDate", *ERROR_FIELDS, "Fingerprint"]
+
+
+def backfill(chunk_size: int):
+    """Stream every case and store fingerprints that are missing or out of date"""
+    db_manager.initialize()
+    db = db_manager.get_session()
+    scanned = written = 0
+    start = time.perf_counter()
+
+    try:
+        after = None
+        while True:
+            rows = case_repository.get_cases_page(db, COLUMNS, chunk_size, after)
+            if not rows:
+                break
+            after = cursor_key(rows[-1])
+
+            changed = {}
+            for row in rows:
+                fingerprint = case_fingerprint(row)
+                if fingerprint != row["Fingerprint"]:
+                    changed[row["CaseID"]] = fingerprint
+            case_repository.set_fingerprints(db, changed)
+
+            scanned += len(rows)
+            written += len(changed)
+            print(f"Scanned {scanned} cases, updated {written} fingerprints "
+                  f"({time.perf_counter() - start:.0f}s)")
+
+        print(f"\n✓ Fingerprinted {scanned} cases ({written} updated)")
+
+    except Exception as e:
+        print(f"✗ Error: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunk-size", type=int, default=1000,
+                        help="Cases read and updated together (default: 1000)")
+    args = parser.parse_args()
+
+    if args.chunk_size < 1:
+        parser.error("--chunk-size must be at least 1")
+
+    backfill(args.chunk_size)
@@ -0,0 +1,112 @@
+from typing import List, Optional, Tuple
+import asyncio
+import os
+import time
+import numpy as np
+
+from embedder import embedding_service
+from executors import inference_executor, OverloadedError
+from metrics import metrics
+
+embedding_batch_size = metrics.histogram(
+    "icm_embedding_batch_size",
+    "Texts encoded per micro-batched model call",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128)
+)
+embedding_queue_wait_seconds = metrics.histogram(
+    "icm_embedding_queue_wait_seconds",
+    "Time a text waited in the micro-batching queue before its batch was dispatched",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+)
+
+
+class EmbeddingBatcher:
+    """
+    Dynamic micro-batching in front of EmbeddingService
+
+    Concurrent encode() calls are queued and grouped into one encode_batch call
+    of up to max_batch_size texts, waiting at most max_wait_ms for a batch to
+    fill. One consumer runs per inference thread so batches overlap.
+    """
+
+    def __init__(self, max_batch_size: int = 32, max_wait_ms: float = 5.0, max_queue: int = 1024):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_queue = max_queue
+        self._queue: Optional[asyncio.Queue] = None
+        self._consumers: List[asyncio.Task] = []
+        self._loop = None
+
+    async def encode(self, text: str) -> np.ndarray:
+        """Encode one text as part of the next micro-batch"""
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((text, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            raise OverloadedError()
+        return await future
+
+    async def stop(self):
+        """Cancel the consumers (pending callers get CancelledError)"""
+        for task in self._consumers:
+            task.cancel()
+        await asyncio.gather(*self._consumers, return_exceptions=True)
+        self._consumers = []
+        self._queue = None
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._queue is not None and self._loop is loop:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._consumers = [
+            loop.create_task(self._consume())
+            for _ in range(max(1, inference_executor.workers))
+        ]
+
+    async def _consume(self):
+        while True:
+            batch = [await self._queue.get()]
+            deadline = time.perf_counter() + self.max_wait
+
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            await self._run_batch(batch)
+
+    async def _run_batch(self, batch: List[Tuple[str, asyncio.Future, float]]):
+        dispatched = time.perf_counter()
+        for _, _, enqueued in batch:
+            embedding_queue_wait_seconds.observe(dispatched - enqueued)
+        embedding_batch_size.observe(len(batch))
+
+        try:
+            embeddings = await inference_executor.run(
+                embedding_service.encode_batch,
+                [text for text, _, _ in batch]
+            )
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future, _), embedding in zip(batch, embeddings):
+            if not future.done():
+                future.set_result(embedding)
+
+
+# Global instance (one per worker process)
+embedding_batcher = EmbeddingBatcher(
+    max_batch_size=int(os.getenv("EMBED_BATCH_MAX_SIZE", "32")),
+    max_wait_ms=float(os.getenv("EMBED_BATCH_MAX_WAIT_MS", "5")),
+    max_queue=int(os.getenv("EMBED_QUEUE_MAX", "1024"))
+)
@@ -0,0 +1,139 @@
+"""
+Micro-benchmark: error fingerprint duplicate lookup vs embedding search
+
+Fingerprints a synthetic icm.Cases corpus (load_benchmark.synthetic_case),
+then looks up mutated copies of cases with stack traces: "volatile" copies
+differ only in line numbers (exact duplicates once normalized), "edited"
+copies also have one of the fingerprinted stack frames renamed. Reports the
+cost of fingerprinting a case and of a FingerprintIndex lookup next to an
+exact top-k search over an N x D matrix (SimilarityService.score, what every
+/recommend_icm pays after encoding), the recall of the copies' originals,
+and how many corpus cases match another one. With --encode the embedding
+model's single-query encode is timed too.
+
+Usage:
+    python benchmarks/duplicate_benchmark.py
+    python benchmarks/duplicate_benchmark.py --sizes 10000,100000 --copies 2000 --encode
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+import numpy as np
+
+# Add backend directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fingerprint import NEAR_DUPLICATE_DISTANCE, FingerprintIndex, case_fingerprint
+from load_benchmark import synthetic_corpus
+from similarity import SimilarityService
+
+
+def mutate(case: dict, rng: random.Random, edit: bool) -> dict:
+    """Copy of a case with new line numbers (and with edit, one renamed stack frame)"""
+    copy = dict(case)
+    copy["StackTrace"] = re.sub(r"line \d+", lambda _: f"line {rng.randint(10, 900)}", case["StackTrace"])
+    if edit:
+        lines = copy["StackTrace"].splitlines()
+        frame = rng.randrange(1, min(len(lines), 20))
+        lines[frame] = re.sub(r"\.(\w+)Async\(", ".RenamedAsync(", lines[frame])
+        copy["StackTrace"] = "\n".join(lines)
+    return copy
+
+
+def time_per_call(fn, items) -> float:
+    """Mean wall time of fn(item) over items in microseconds"""
+    start = time.perf_counter()
+    for item in items:
+        fn(item)
+    return (time.perf_counter() - start) / len(items) * 1e6
+
+
+def time_it(fn, repeat: int) -> float:
+    """Median wall time of fn() in milliseconds"""
+    fn()  # warm-up
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings))
+
+
+def run(sizes, copies: int, dimension: int, k: int, max_distance: int, repeat: int, encode: bool, seed: int) -> list:
+    rng = random.Random(seed)
+    encode_ms = None
+    if encode:
+        from embedder import embedding_service
+        embedding_service.load_model()
+        text = embedding_service.create_case_text(title="Storage requests throttled",
+                                                  description="Requests fail during peak hours")
+        encode_ms = time_it(lambda: embedding_service.encode_text(text), repeat)
+
+    results = []
+    for size in sizes:
+        cases = list(synthetic_corpus(size, seed))
+        start = time.perf_counter()
+        fingerprints = [case_fingerprint(case) for case in cases]
+        fingerprint_us = (time.perf_counter() - start) / size * 1e6
+
+        index = FingerprintIndex()
+        for case_id, fingerprint in enumerate(fingerprints):
+            index.set(case_id, fingerprint)
+        # Corpus cases within max_distance of another (unrelated) corpus case
+        colliding = sum(
+            1 for case_id, fingerprint in enumerate(fingerprints)
+            if fingerprint and len(index.find(fingerprint, max_distance)) > 1
+        )
+
+        traced = [case_id for case_id, case in enumerate(cases) if case.get("StackTrace")]
+        originals = [rng.choice(traced) for _ in range(copies)]
+        report = {
+            "cases": size,
+            "fingerprinted": len(index),
+            "colliding_cases": colliding,
+            "fingerprint_us": round(fingerprint_us, 1),
+        }
+        for kind in ("volatile", "edited"):
+            queries = [case_fingerprint(mutate(cases[case_id], rng, kind == "edited")) for case_id in originals]
+            found = sum(
+                any(match == case_id for match, _ in index.find(query, max_distance))
+                for case_id, query in zip(originals, queries)
+            )
+            report[f"{kind}_recall"] = round(found / copies, 3)
+            report[f"{kind}_lookup_us"] = round(time_per_call(lambda query: index.find(query, max_distance), queries), 2)
+
+        matrix = SimilarityService.normalize(
+            np.random.default_rng(seed).standard_normal((size, dimension), dtype=np.float32)
+        )
+        query = matrix[0].copy()
+        report["embedding_search_ms"] = round(time_it(lambda: SimilarityService.score(query, matrix, k), repeat), 3)
+        if encode_ms is not None:
+            report["encode_ms"] = round(encode_ms, 3)
+        report["lookup_speedup"] = round(report["embedding_search_ms"] * 1000 / report["volatile_lookup_us"], 1)
+        results.append(report)
+        print(json.dumps(report))
+        del cases, matrix
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000",
+                        help="Comma-separated corpus sizes (default: 10000,100000)")
+    parser.add_argument("--copies", type=int, default=1000, help="Mutated copies looked up per kind (default: 1000)")
+    parser.add_argument("--dimension", type=int, default=384, help="Embedding dimension (default: 384)")
+    parser.add_argument("--k", type=int, default=5, help="Top-k of the embedding search (default: 5)")
+    parser.add_argument("--max-distance", type=int, default=NEAR_DUPLICATE_DISTANCE,
+                        help=f"Fingerprint bits a duplicate may differ by (default: {NEAR_DUPLICATE_DISTANCE})")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed repetitions of each search (default: 20)")
+    parser.add_argument("--encode", action="store_true", help="Also time a single-query encode with the configured model")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed (default: 42)")
+    args = parser.parse_args()
+
+    run([int(size) for size in args.sizes.split(",")], args.copies, args.dimension, args.k,
+        args.max_distance, args.repeat, args.encode, args.seed)
@@ -0,0 +1,151 @@
+"""
+Benchmark: PyTorch vs ONNX Runtime (fp32 and int8) embedding engines
+
+Each engine runs in its own subprocess so load time and RSS are measured
+from a clean interpreter. Reports model load time, RSS after load and peak,
+single-text latency (p50/p95), batch throughput, and the cosine agreement of
+each ONNX engine with the torch embeddings.
+
+Run export_onnx.py --quantize first.
+
+Usage:
+    python benchmarks/embedding_benchmark.py
+    python benchmarks/embedding_benchmark.py --engines torch,onnx-int8 --texts 512 --threads 2
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+# Add backend directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ENGINES = {
+    "torch": {"engine": "torch", "onnx_quantized": False},
+    "onnx": {"engine": "onnx", "onnx_quantized": False},
+    "onnx-int8": {"engine": "onnx", "onnx_quantized": True},
+}
+
+
+def memory_mb() -> dict:
+    """Current and peak resident set size of this process in MB (Linux)"""
+    values = {}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(("VmRSS:", "VmHWM:")):
+                    name, kb = line.split()[:2]
+                    values[name.rstrip(":")] = int(kb) / 1024
+    except OSError:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        values = {"VmRSS": peak, "VmHWM": peak}
+    return {"rss_mb": round(values["VmRSS"], 1), "peak_rss_mb": round(values["VmHWM"], 1)}
+
+
+def run_engine(name: str, n_texts: int, repeat: int, threads: int, output: str) -> dict:
+    """Measure one engine in this process and save its verification embeddings to output"""
+    baseline = memory_mb()["rss_mb"]
+
+    start = time.perf_counter()
+    from embedder import EmbeddingService, embedding_service
+    from export_onnx import verification_texts
+
+    service = EmbeddingService(
+        model_name=embedding_service.model_name,
+        model_version=embedding_service.model_version,
+        onnx_model_dir=embedding_service.onnx_model_dir,
+        onnx_threads=threads,
+        **ENGINES[name]
+    )
+    service.load_model()
+    load_seconds = time.perf_counter() - start
+    loaded = memory_mb()
+
+    texts = verification_texts()
+    corpus = [f"{texts[i % len(texts)]} | Tags: sample-{i}" for i in range(n_texts)]
+
+    service.encode_text(corpus[0])  # warm-up
+    latencies = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        service.encode_text(corpus[i % n_texts])
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    service.encode_batch(corpus)
+    batch_seconds = time.perf_counter() - start
+
+    np.save(output, np.atleast_2d(service.encode_batch(texts)).astype(np.float32))
+
+    return {
+        "engine": name,
+        "load_seconds": round(load_seconds, 2),
+        "rss_baseline_mb": baseline,
+        "rss_after_load_mb": loaded["rss_mb"],
+        "peak_rss_mb": memory_mb()["peak_rss_mb"],
+        "latency_p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "latency_p95_ms": round(float(np.percentile(latencies, 95)), 2),
+        "batch_texts": n_texts,
+        "throughput_texts_per_s": round(n_texts / batch_seconds, 1)
+    }
+
+
+def run(engines, n_texts: int, repeat: int, threads: int) -> list:
+    from export_onnx import cosine_agreement
+
+    results = []
+    reference = None
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in engines:
+            output = os.path.join(tmp, f"{name}.npy")
+            completed = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--worker", name,
+                 "--texts", str(n_texts), "--repeat", str(repeat),
+                 "--threads", str(threads), "--output", output],
+                capture_output=True, text=True
+            )
+            if completed.returncode != 0:
+                print(json.dumps({"engine": name, "error": completed.stderr.strip().splitlines()[-1:]}))
+                continue
+
+            result = json.loads(completed.stdout.strip().splitlines()[-1])
+            embeddings = np.load(output)
+            if name == "torch":
+                reference = embeddings
+            elif reference is not None:
+                agreement = cosine_agreement(reference, embeddings)
+                result["min_cosine_vs_torch"] = round(float(agreement.min()), 5)
+                result["mean_cosine_vs_torch"] = round(float(agreement.mean()), 5)
+
+            results.append(result)
+            print(json.dumps(result))
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--engines", default="torch,onnx,onnx-int8",
+                        help="Comma-separated engines to compare (default: torch,onnx,onnx-int8)")
+    parser.add_argument("--texts", type=int, default=256, help="Texts in the throughput batch (default: 256)")
+    parser.add_argument("--repeat", type=int, default=50, help="Timed single-text encodes (default: 50)")
+    parser.add_argument("--threads", type=int, default=0,
+                        help="ONNX Runtime intra-op threads, 0 for the runtime default (default: 0)")
+    parser.add_argument("--worker", choices=sorted(ENGINES), help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_engine(args.worker, args.texts, args.repeat, args.threads, args.output)))
+    else:
+        engines = args.engines.split(",")
+        unknown = [name for name in engines if name not in ENGINES]
+        if unknown:
+            parser.error(f"unknown engines: {', '.join(unknown)}")
+        # torch first: it is the reference for the cosine comparison
+        run(sorted(engines, key=lambda name: name != "torch"), args.texts, args.repeat, args.threads)
@@ -0,0 +1,342 @@
+"""
+Load benchmark: /recommend_icm, /create_case and /cases at fixed concurrency
+
+Generates a reproducible synthetic icm.Cases corpus (realistic text lengths,
+stack traces on most cases, ICM outcomes on some), loads it through
+POST /cases/bulk, then drives each scenario with a fixed number of client
+threads (one keep-alive connection each) and reports p50/p95/p99 latency,
+throughput, errors and the server's peak RSS as JSON. Save one report per
+commit and compare them.
+
+With --spawn the API is started as a child process (uvicorn, one worker)
+from this checkout with the current environment, so point it at a
+disposable database, or pass --sqlite to run it on a new local SQLite file;
+otherwise --base-url targets a running server.
+
+Usage:
+    python benchmarks/load_benchmark.py --spawn --sqlite --corpus 10000 --output bench.json
+    python benchmarks/load_benchmark.py --base-url http://localhost:8000 --corpus 0 --scenarios recommend
+    python benchmarks/load_benchmark.py --write-corpus cases.ndjson --corpus 1000000
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PRODUCTS = {
+    "Azure Virtual Machines": ["Compute", "Networking", "Disks"],
+    "Azure SQL Database": ["Database Engine", "Connectivity", "Backup"],
+    "Azure Storage": ["Blob Storage", "Files", "Queues"],
+    "Azure Active Directory": ["Authentication", "Conditional Access", "Provisioning"],
+    "Azure Kubernetes Service": ["Node Pools", "Networking", "Upgrades"],
+    "Azure Functions": ["Triggers", "Scaling", "Deployment"],
+    "Azure Key Vault": ["Access Policies", "Certificates", "Secrets"],
+    "Azure App Service": ["Deployment", "Scaling", "Custom Domains"],
+}
+SYMPTOMS = [
+    ("fails to start after {event}", "StartTimedOut", "The operation did not complete within the allotted timeout"),
+    ("intermittent timeouts during {event}", "OperationTimedOut", "Connection timeout expired while waiting for a response"),
+    ("returns HTTP 500 after {event}", "InternalServerError", "The server encountered an internal error"),
+    ("authentication failures following {event}", "AuthenticationFailed", "The access token is expired or invalid"),
+    ("high latency since {event}", "ThrottlingLimitExceeded", "Request rate is large, retry after the specified interval"),
+    ("data not replicated after {event}", "ReplicationLagExceeded", "Secondary replica is behind the primary"),
+    ("deployment stuck after {event}", "DeploymentFailed", "The resource operation completed with terminal provisioning state Failed"),
+    ("access denied after {event}", "Forbidden", "The client does not have authorization to perform the action"),
+]
+EVENTS = ["scheduled maintenance", "a platform update", "a configuration change", "scaling out",
+          "a certificate rotation", "a region failover", "peak traffic", "a networking change"]
+WORDS = ("customer reports the issue affects production workloads in several subscriptions and started "
+         "without any change on their side logs show repeated retries and the monitoring dashboard "
+         "shows elevated error rates for the affected resources restarting the service did not help "
+         "the problem reproduces consistently within minutes of the trigger and impacts critical "
+         "business processes support engineer collected traces and correlation ids for review").split()
+SEVERITIES = ["Critical", "High", "Medium", "Low"]
+STATUSES = ["Open", "In Progress", "Resolved", "Closed"]
+REGIONS = ["East US", "West US", "West Europe", "North Europe", "Southeast Asia", None]
+
+
+def synthetic_case(rng: random.Random) -> dict:
+    """One CaseCreate body with realistic field lengths"""
+    product = rng.choice(list(PRODUCTS))
+    symptom, error_code, error_message = rng.choice(SYMPTOMS)
+    title = f"{product.replace('Azure ', '')} {symptom.format(event=rng.choice(EVENTS))}"
+    description = " ".join(rng.choice(WORDS) for _ in range(rng.randint(30, 150))).capitalize() + "."
+    case = {
+        "CaseTitle": title[:255],
+        "CaseDescription": f"{title}. {description}",
+        "Product": product,
+        "Component": rng.choice(PRODUCTS[product]),
+        "Severity": rng.choice(SEVERITIES),
+        "Priority": f"P{rng.randint(0, 3)}",
+        "Environment": rng.choice(["Production", "Staging", "Development"]),
+        "Region": rng.choice(REGIONS),
+        "ErrorCodes": error_code,
+        "ErrorMessage": error_message,
+        "CaseStatus": rng.choice(STATUSES),
+    }
+    if rng.random() < 0.6:
+        # 1-4 KB stack traces, like the ones pasted into real tickets
+        frames = [
+            f"   at Microsoft.{product.split()[-1]}.{rng.choice(WORDS).capitalize()}Service."
+            f"{rng.choice(WORDS).capitalize()}Async(CancellationToken token) in /src/{rng.choice(WORDS)}.cs:line {rng.randint(10, 900)}"
+            for _ in range(rng.randint(8, 35))
+        ]
+        case["StackTrace"] = f"System.{error_code}Exception: {error_message}\n" + "\n".join(frames)
+    if rng.random() < 0.3:
+        case["ICMNumber"] = f"ICM-{rng.randint(100000, 999999)}"
+        case["DaysDelayedBeforeICM"] = rng.randint(0, 30)
+    return case
+
+
+def synthetic_corpus(size: int, seed: int = 42):
+    rng = random.Random(seed)
+    for _ in range(size):
+        yield synthetic_case(rng)
+
+
+def recommend_body(rng: random.Random) -> dict:
+    case = synthetic_case(rng)
+    return {
+        "case_title": case["CaseTitle"],
+        "case_description": case["CaseDescription"],
+        "product": case["Product"],
+        "error_message": case["ErrorMessage"],
+        "stack_trace": case.get("StackTrace"),
+        "top_k": 5
+    }
+
+
+class Client:
+    """Minimal keep-alive JSON client (one per thread)"""
+
+    def __init__(self, base_url: str, timeout: float = 120.0):
+        url = urllib.parse.urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+        self._connection = connection_class(url.hostname, url.port, timeout=timeout)
+        self._prefix = url.path.rstrip("/")
+
+    def request(self, method: str, path: str, body=None, headers=None):
+        """Send a request (dict/list bodies as JSON) and return (status, raw body)"""
+        headers = dict(headers or {})
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        try:
+            self._connection.request(method, self._prefix + path, body=body, headers=headers)
+            response = self._connection.getresponse()
+            payload = response.read()
+        except (OSError, http.client.HTTPException):
+            self._connection.close()
+            raise
+        return response.status, payload
+
+
+def seed_corpus(base_url: str, size: int, seed: int, chunk_size: int = 1000) -> dict:
+    """Load the synthetic corpus through POST /cases/bulk (NDJSON)"""
+    client = Client(base_url, timeout=3600)
+    corpus = synthetic_corpus(size, seed)
+    created = 0
+    start = time.perf_counter()
+    while True:
+        chunk = [json.dumps(case) for _, case in zip(range(chunk_size), corpus)]
+        if not chunk:
+            break
+        status, payload = client.request(
+            "POST", "/cases/bulk", "\n".join(chunk).encode("utf-8"),
+            headers={"Content-Type": "application/x-ndjson"}
+        )
+        if status != 200:
+            raise RuntimeError(f"/cases/bulk returned {status}: {payload[:200]!r}")
+        created += json.loads(payload)["created"]
+    seconds = time.perf_counter() - start
+    return {"cases": created, "seconds": round(seconds, 1), "cases_per_s": round(created / seconds, 1) if seconds else None}
+
+
+def run_scenario(base_url: str, name: str, requests: int, concurrency: int, warmup: int, seed: int) -> dict:
+    """Drive one scenario with `concurrency` threads and summarize its latencies"""
+    local = threading.local()
+    counter = iter(range(warmup + requests))
+    thread_numbers = iter(range(concurrency))
+    lock = threading.Lock()
+    latencies, statuses = [], {}
+
+    def one_request(index: int):
+        if not hasattr(local, "client"):
+            local.client = Client(base_url)
+            with lock:
+                local.rng = random.Random(seed * 1000 + next(thread_numbers))
+            local.cursor = None
+        rng = local.rng
+        if name == "recommend":
+            method, path, body = "POST", "/recommend_icm", recommend_body(rng)
+        elif name == "create":
+            method, path, body = "POST", "/create_case", synthetic_case(rng)
+        else:
+            query = {"limit": 50, **({"cursor": local.cursor} if local.cursor else {})}
+            method, path, body = "GET", "/cases?" + urllib.parse.urlencode(query), None
+
+        start = time.perf_counter()
+        try:
+            status, payload = local.client.request(method, path, body)
+        except (OSError, http.client.HTTPException):
+            status, payload = "error", b""
+        elapsed = time.perf_counter() - start
+        if name == "list" and status == 200:
+            # Page forward, wrapping around at the end
+            local.cursor = json.loads(payload).get("next_cursor")
+
+        if index >= warmup:
+            with lock:
+                latencies.append(elapsed)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    def worker():
+        while True:
+            with lock:
+                index = next(counter, None)
+            if index is None:
+                return
+            one_request(index)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+    wall = time.perf_counter() - start
+
+    ms = np.array(latencies) * 1000
+    return {
+        "scenario": name,
+        "requests": len(latencies),
+        "concurrency": concurrency,
+        "statuses": statuses,
+        "latency_p50_ms": round(float(np.percentile(ms, 50)), 2),
+        "latency_p95_ms": round(float(np.percentile(ms, 95)), 2),
+        "latency_p99_ms": round(float(np.percentile(ms, 99)), 2),
+        "latency_mean_ms": round(float(ms.mean()), 2),
+        # Warm-up requests are included in the wall time, so this is conservative
+        "throughput_rps": round((warmup + len(latencies)) / wall, 1)
+    }
+
+
+def peak_rss_mb(pid: int) -> float:
+    """Peak resident set size (VmHWM) of a process in MB (Linux)"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def spawn_server(port: int, sqlite_path: str = None) -> subprocess.Popen:
+    """Start uvicorn on port from the backend directory and wait until /ready"""
+    env = dict(os.environ)
+    if sqlite_path:
+        # No snapshot: a stale one would describe another database
+        env.update(DATABASE_BACKEND="sqlite", SQLITE_PATH=sqlite_path, VECTOR_SNAPSHOT_DIR="")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env
+    )
+    client = Client(f"http://127.0.0.1:{port}", timeout=5)
+    deadline = time.monotonic() + 600
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with code {server.returncode}")
+        try:
+            if client.request("GET", "/ready")[0] == 200:
+                return server
+        except (OSError, http.client.HTTPException):
+            client = Client(f"http://127.0.0.1:{port}", timeout=5)
+        time.sleep(0.5)
+    server.terminate()
+    raise RuntimeError("Server did not become ready")
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(args) -> dict:
+    sqlite_dir = tempfile.TemporaryDirectory(prefix="load_benchmark_") if args.sqlite else None
+    sqlite_path = os.path.join(sqlite_dir.name, "icm.sqlite") if sqlite_dir else None
+    server = spawn_server(args.port, sqlite_path) if args.spawn else None
+    base_url = f"http://127.0.0.1:{args.port}" if server else args.base_url
+    try:
+        report = {
+            "commit": git_commit(),
+            "base_url": base_url,
+            "database": "sqlite" if sqlite_path else "configured",
+            "corpus_seeded": seed_corpus(base_url, args.corpus, args.seed) if args.corpus else None,
+            "scenarios": []
+        }
+        for name in args.scenarios.split(","):
+            result = run_scenario(base_url, name, args.requests, args.concurrency, args.warmup, args.seed)
+            report["scenarios"].append(result)
+            print(json.dumps(result), file=sys.stderr)
+        pid = server.pid if server else args.server_pid
+        report["server_peak_rss_mb"] = peak_rss_mb(pid) if pid else None
+        return report
+    finally:
+        if server:
+            server.terminate()
+            server.wait(timeout=30)
+        if sqlite_dir:
+            sqlite_dir.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000", help="API to benchmark (default: http://localhost:8000)")
+    parser.add_argument("--spawn", action="store_true", help="Start the API from this checkout instead of using --base-url")
+    parser.add_argument("--sqlite", action="store_true",
+                        help="With --spawn, run the API on a new SQLite database (removed afterwards)")
+    parser.add_argument("--port", type=int, default=8765, help="Port for --spawn (default: 8765)")
+    parser.add_argument("--server-pid", type=int, help="PID of an external server, to report its peak RSS")
+    parser.add_argument("--corpus", type=int, default=1000, help="Synthetic cases to load first, 0 to skip (default: 1000)")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for corpus and request bodies (default: 42)")
+    parser.add_argument("--scenarios", default="recommend,create,list",
+                        help="Comma-separated scenarios: recommend, create, list (default: all)")
+    parser.add_argument("--requests", type=int, default=500, help="Timed requests per scenario (default: 500)")
+    parser.add_argument("--warmup", type=int, default=20, help="Untimed requests per scenario (default: 20)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Client threads (default: 8)")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    parser.add_argument("--write-corpus", help="Only write the synthetic corpus as NDJSON (for ingest_cases.py) and exit")
+    args = parser.parse_args()
+
+    if args.sqlite and not args.spawn:
+        parser.error("--sqlite requires --spawn")
+    unknown = [name for name in args.scenarios.split(",") if name not in ("recommend", "create", "list")]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    if args.write_corpus:
+        with open(args.write_corpus, "w", encoding="utf-8") as f:
+            for case in synthetic_corpus(args.corpus, args.seed):
+                f.write(json.dumps(case) + "\n")
+        sys.exit(0)
+
+    report = run(args)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,99 @@
+"""
+Micro-benchmark: legacy similarity path vs fused SimilarityService.score
+
+Legacy path (what recommend_icm used to do per request): normalize the whole
+candidate matrix, full argsort for top-k, then max plus two threshold counts.
+Fused path: one matrix product against pre-normalized vectors, argpartition
+top-k and threshold counts from SimilarityService.summarize.
+
+Usage:
+    python benchmarks/similarity_benchmark.py
+    python benchmarks/similarity_benchmark.py --sizes 10000,100000 --batch 32
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+
+# Add backend directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from similarity import SimilarityService
+
+
+def legacy_score(query: np.ndarray, candidates: np.ndarray, k: int) -> dict:
+    """Replica of the pre-fusion pipeline in numpy (normalize both sides per call + full argsort + 3 passes)"""
+    query = query / np.linalg.norm(query)
+    candidates = candidates / np.linalg.norm(candidates, axis=1, keepdims=True)
+    similarities = candidates @ query
+    top_k = np.argsort(similarities)[::-1][:k]
+    return {
+        "top_k": [(int(idx), float(similarities[idx])) for idx in top_k],
+        "max_score": float(np.max(similarities)),
+        "count_above_alert": int(np.sum(similarities >= SimilarityService.ALERT_THRESHOLD)),
+        "count_above_icm": int(np.sum(similarities >= SimilarityService.RECOMMEND_ICM_THRESHOLD))
+    }
+
+
+def time_it(fn, repeat: int) -> float:
+    """Median wall time of fn() in milliseconds"""
+    fn()  # warm-up
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings))
+
+
+def run(sizes, dimension: int, k: int, batch: int, repeat: int) -> list:
+    rng = np.random.default_rng(42)
+    results = []
+
+    for size in sizes:
+        candidates = rng.standard_normal((size, dimension), dtype=np.float32)
+        queries = rng.standard_normal((batch, dimension), dtype=np.float32)
+        normalized = SimilarityService.normalize(candidates)
+        normalized_queries = SimilarityService.normalize(queries)
+
+        # Same answers before timing anything
+        legacy = legacy_score(queries[0], candidates, k)
+        fused = SimilarityService.score(normalized_queries[0], normalized, k)[0]
+        assert [idx for idx, _ in legacy["top_k"]] == [idx for idx, _ in fused["top_k"]]
+
+        legacy_ms = time_it(lambda: legacy_score(queries[0], candidates, k), repeat)
+        fused_ms = time_it(lambda: SimilarityService.score(normalized_queries[0], normalized, k), repeat)
+        legacy_batch_ms = time_it(lambda: [legacy_score(q, candidates, k) for q in queries], max(1, repeat // 5))
+        fused_batch_ms = time_it(lambda: SimilarityService.score(normalized_queries, normalized, k), max(1, repeat // 5))
+
+        results.append({
+            "candidates": size,
+            "dimension": dimension,
+            "k": k,
+            "legacy_ms": round(legacy_ms, 3),
+            "fused_ms": round(fused_ms, 3),
+            "speedup": round(legacy_ms / fused_ms, 1),
+            "batch_size": batch,
+            "legacy_batch_ms": round(legacy_batch_ms, 3),
+            "fused_batch_ms": round(fused_batch_ms, 3),
+            "batch_speedup": round(legacy_batch_ms / fused_batch_ms, 1)
+        })
+        print(json.dumps(results[-1]))
+        del candidates, normalized
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000,1000000",
+                        help="Comma-separated candidate counts (default: 10000,100000,1000000)")
+    parser.add_argument("--dimension", type=int, default=384, help="Embedding dimension (default: 384)")
+    parser.add_argument("--k", type=int, default=5, help="Top-k per query (default: 5)")
+    parser.add_argument("--batch", type=int, default=16, help="Queries per batch run (default: 16)")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed repetitions (default: 20)")
+    args = parser.parse_args()
+
+    run([int(size) for size in args.sizes.split(",")], args.dimension, args.k, args.batch, args.repeat)
@@ -0,0 +1,131 @@
+from sqlalchemy.orm import Session
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+from pydantic import ValidationError
+import json
+
+from models import BulkCaseError, BulkCaseResponse, Case, CaseCreate
+from embedder import embedding_service
+from repository import case_repository
+
+
+def parse_ndjson_line(line: str) -> Any:
+    """
+    Parse one NDJSON line (None for a blank line)
+
+    Invalid JSON gives a ValueError in place of the record, so the line is
+    reported as a failed row instead of aborting the whole stream.
+    """
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return ValueError(f"Invalid JSON: {e}")
+
+
+def read_ndjson(lines: Iterable[str]) -> Iterator[Any]:
+    """Parse one JSON value per non-blank line (see parse_ndjson_line)"""
+    for line in lines:
+        record = parse_ndjson_line(line)
+        if record is not None:
+            yield record
+
+
+def chunked(records: Iterable[Any], chunk_size: int) -> Iterator[List[Tuple[int, Any]]]:
+    """Group records into lists of (input index, record) of at most chunk_size"""
+    chunk = []
+    for index, record in enumerate(records):
+        chunk.append((index, record))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class BulkIngest:
+    """
+    Result of loading many CaseCreate records, accumulated chunk by chunk
+
+    Per-row failures (validation, database or embedding errors) are recorded
+    against the record's index in the input and never abort the other rows.
+    """
+
+    def __init__(self):
+        self.received = 0
+        self.case_ids: Dict[int, int] = {}
+        self.errors: List[BulkCaseError] = []
+
+    def validate(self, chunk: List[Tuple[int, Any]]) -> List[Tuple[int, CaseCreate]]:
+        """Parse a chunk of raw records, recording the invalid ones"""
+        valid = []
+        for index, record in chunk:
+            self.received += 1
+            if isinstance(record, Exception):
+                self.fail(index, str(record))
+                continue
+            try:
+                valid.append((index, CaseCreate.model_validate(record)))
+            except ValidationError as e:
+                self.fail(index, "; ".join(
+                    f"{'.'.join(str(part) for part in error['loc']) or 'record'}: {error['msg']}"
+                    for error in e.errors()
+                ))
+        return valid
+
+    def insert(self, db: Session, rows: List[Tuple[int, CaseCreate]]) -> List[Case]:
+        """
+        Insert a validated chunk in one transaction
+
+        If the chunk fails as a whole, its rows are retried one by one so only
+        the offending rows are reported.
+
+        Returns:
+            The created cases
+        """
+        if not rows:
+            return []
+        try:
+            created = case_repository.create_cases(db, [case for _, case in rows])
+            pairs = list(zip((index for index, _ in rows), created))
+        except Exception:
+            db.rollback()
+            pairs = []
+            for index, case in rows:
+                try:
+                    pairs.append((index, case_repository.create_case(db, case)))
+                except Exception as e:
+                    db.rollback()
+                    self.fail(index, f"Insert failed: {e}")
+
+        for index, case in pairs:
+            self.case_ids[index] = case.CaseID
+        return [case for _, case in pairs]
+
+    @staticmethod
+    def case_texts(cases: List[Case]) -> List[str]:
+        return [embedding_service.create_text_for_case(case.model_dump()) for case in cases]
+
+    @staticmethod
+    def case_segments(cases: List[Case]) -> List[list]:
+        return [embedding_service.create_case_segments(case.model_dump()) for case in cases]
+
+    def embedding_failed(self, cases: List[Case], error: Exception):
+        """Record created cases whose embeddings could not be stored (reindex.py picks them up)"""
+        indexes = {case_id: index for index, case_id in self.case_ids.items()}
+        for case in cases:
+            self.fail(indexes[case.CaseID], f"Created, but embedding failed: {error}")
+
+    def fail(self, index: int, error: str):
+        self.errors.append(BulkCaseError(index=index, error=error))
+
+    def response(self) -> BulkCaseResponse:
+        failed = {error.index for error in self.errors if error.index not in self.case_ids}
+        return BulkCaseResponse(
+            received=self.received,
+            created=len(self.case_ids),
+            failed=len(failed),
+            case_ids=[self.case_ids.get(index) for index in range(self.received)],
+            errors=sorted(self.errors, key=lambda error: error.index)
+        )
@@ -0,0 +1,252 @@
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+import numpy as np
+
+
+class CaseMetadata:
+    """
+    Columnar case attributes aligned with the rows of VectorIndex
+
+    Categorical columns are dictionary-encoded as int32 codes (-1 for NULL,
+    values compared case-insensitively like the database collation), so a
+    filter becomes a few vectorized comparisons and similarity search only
+    scores the matching slice of the matrix. The ICM outcome columns (has
+    ICM, DaysDelayedBeforeICM, CreatedDate) turn ICM statistics over search
+    hits into array lookups instead of a database query. The error
+    fingerprint column (fingerprint.py, 0 when the case has none) is kept so
+    a snapshot can rebuild the duplicate lookup without SQL.
+    """
+
+    # Filter name -> icm.Cases column
+    CATEGORICAL = {
+        "product": "Product",
+        "component": "Component",
+        "severity": "Severity",
+        "status": "CaseStatus",
+        "region": "Region"
+    }
+
+    # Per-row arrays stored in EmbeddingSnapshot
+    COLUMNS = (*CATEGORICAL.values(), "CreatedDate", "HasICM", "DaysDelayedBeforeICM", "Fingerprint")
+
+    def __init__(self):
+        self._codes: Dict[str, np.ndarray] = {
+            column: np.empty(0, dtype=np.int32) for column in self.CATEGORICAL.values()
+        }
+        self._vocabularies: Dict[str, Dict[str, int]] = {column: {} for column in self.CATEGORICAL.values()}
+        # Code -> value as first seen (original casing), for rollup labels
+        self._labels: Dict[str, List[str]] = {column: [] for column in self.CATEGORICAL.values()}
+        self._created = np.empty(0, dtype="datetime64[s]")
+        self._has_icm = np.empty(0, dtype=bool)
+        # NaN where DaysDelayedBeforeICM is NULL
+        self._delay = np.empty(0, dtype=np.float32)
+        self._fingerprint = np.empty(0, dtype=np.int64)
+
+    def resize(self, capacity: int, size: int):
+        """Reallocate every column to capacity rows, keeping the first size rows"""
+        for column, codes in self._codes.items():
+            self._codes[column] = self._grow(codes, capacity, size, -1)
+        self._created = self._grow(self._created, capacity, size, np.datetime64("NaT"))
+        self._has_icm = self._grow(self._has_icm, capacity, size, False)
+        self._delay = self._grow(self._delay, capacity, size, np.nan)
+        self._fingerprint = self._grow(self._fingerprint, capacity, size, 0)
+
+    def set_row(self, position: int, case: dict) -> bool:
+        """
+        Write the attributes of a case row (icm.Cases column names) at position
+
+        Returns:
+            True if any attribute changed
+        """
+        changed = False
+        for column, codes in self._codes.items():
+            code = self._encode(column, case.get(column))
+            changed |= bool(codes[position] != code)
+            codes[position] = code
+
+        created = self._to_datetime64(case.get("CreatedDate"))
+        has_icm = case.get("ICMNumber") is not None
+        delay = np.float32(np.nan if case.get("DaysDelayedBeforeICM") is None else case["DaysDelayedBeforeICM"])
+        changed |= bool(self._created[position] != created) or bool(self._has_icm[position] != has_icm)
+        changed |= not np.array_equal(self._delay[position], delay, equal_nan=True)
+        self._created[position] = created
+        self._has_icm[position] = has_icm
+        self._delay[position] = delay
+        fingerprint = case.get("Fingerprint") or 0
+        changed |= bool(self._fingerprint[position] != fingerprint)
+        self._fingerprint[position] = fingerprint
+        return changed
+
+    def move_row(self, source: int, target: int):
+        """Copy the attributes at source to target (swap-with-last removal)"""
+        for codes in self._codes.values():
+            codes[target] = codes[source]
+        self._created[target] = self._created[source]
+        self._has_icm[target] = self._has_icm[source]
+        self._delay[target] = self._delay[source]
+        self._fingerprint[target] = self._fingerprint[source]
+
+    @staticmethod
+    def filter_key(filters: Optional[dict]) -> tuple:
+        """Hashable key grouping queries that share the same filters"""
+        if not filters:
+            return ()
+        return tuple(sorted((name, str(value)) for name, value in filters.items() if value is not None))
+
+    def mask(self, filters: dict, size: int) -> np.ndarray:
+        """
+        Boolean mask over the first size rows matching every given filter
+
+        Args:
+            filters: Any of product, component, severity, status, region
+                (exact, case-insensitive), created_after (datetime) and
+                has_icm (bool); None values are ignored
+        """
+        return self._mask(filters, slice(0, size), size)
+
+    def matches(self, filters: dict, positions: np.ndarray) -> np.ndarray:
+        """Boolean mask of the rows at positions matching every given filter (see mask)"""
+        positions = np.asarray(positions, dtype=np.int64)
+        return self._mask(filters, positions, len(positions))
+
+    def _mask(self, filters: dict, rows, count: int) -> np.ndarray:
+        mask = np.ones(count, dtype=bool)
+        for name, column in self.CATEGORICAL.items():
+            value = filters.get(name)
+            if value is not None:
+                code = self._vocabularies[column].get(self._normalize(value))
+                if code is None:
+                    return np.zeros(count, dtype=bool)
+                mask &= self._codes[column][rows] == code
+
+        if filters.get("created_after") is not None:
+            mask &= self._created[rows] >= self._to_datetime64(filters["created_after"])
+        if filters.get("has_icm") is not None:
+            mask &= self._has_icm[rows] == bool(filters["has_icm"])
+        return mask
+
+    def fingerprints(self, size: int) -> np.ndarray:
+        """Error fingerprints of the first size rows (0 where a case has none)"""
+        return self._fingerprint[:size]
+
+    def icm_statistics(self, positions: np.ndarray, since: datetime) -> dict:
+        """
+        ICM outcome of the rows at positions created at or after since
+
+        Same figures as the former SQL aggregate: cases reviewed, cases with
+        an ICM and the mean DaysDelayedBeforeICM over rows that have one.
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        recent = positions[self._created[positions] >= self._to_datetime64(since)]
+        delays = self._delay[recent]
+        delays = delays[~np.isnan(delays)]
+        return {
+            "total_similar_cases_reviewed": int(len(recent)),
+            "cases_with_icm": int(np.count_nonzero(self._has_icm[recent])),
+            "average_delay_days": float(delays.mean(dtype=np.float64)) if len(delays) else 0.0
+        }
+
+    def icm_rollup(self, size: int, since: datetime) -> List[dict]:
+        """
+        Cases, cases with an ICM and mean ICM delay per product and creation
+        month over the first size rows created at or after since
+        """
+        rows = np.flatnonzero(self._created[:size] >= self._to_datetime64(since))
+        if not len(rows):
+            return []
+        products = self._codes["Product"][rows].astype(np.int64)
+        months = self._created[rows].astype("datetime64[M]").astype(np.int64)
+        groups, inverse = np.unique(np.stack([products, months], axis=1), axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+
+        totals = np.bincount(inverse, minlength=len(groups))
+        with_icm = np.bincount(inverse, weights=self._has_icm[rows], minlength=len(groups))
+        delays = self._delay[rows]
+        known = ~np.isnan(delays)
+        delay_sums = np.bincount(inverse[known], weights=delays[known], minlength=len(groups))
+        delay_counts = np.bincount(inverse[known], minlength=len(groups))
+
+        labels = self._labels["Product"]
+        return [
+            {
+                "product": labels[product] if product >= 0 else None,
+                "month": str(np.datetime64(month, "M")),
+                "total_cases": int(total),
+                "cases_with_icm": int(icm),
+                "average_delay_days": float(delay_sum / delay_count) if delay_count else 0.0
+            }
+            for (product, month), total, icm, delay_sum, delay_count
+            in zip(groups.tolist(), totals, with_icm, delay_sums, delay_counts)
+        ]
+
+    def to_columns(self) -> Dict[str, np.ndarray]:
+        """Columns for EmbeddingSnapshot (full capacity, fixed-width dtypes)"""
+        columns = {column: codes for column, codes in self._codes.items()}
+        columns["CreatedDate"] = self._created.view(np.int64)
+        columns["HasICM"] = self._has_icm.view(np.uint8)
+        columns["DaysDelayedBeforeICM"] = self._delay
+        columns["Fingerprint"] = self._fingerprint
+        return columns
+
+    def vocabularies(self) -> Dict[str, list]:
+        """Code -> value lists for EmbeddingSnapshot"""
+        return {
+            column: sorted(vocabulary, key=vocabulary.get)
+            for column, vocabulary in self._vocabularies.items()
+        }
+
+    def labels(self) -> Dict[str, list]:
+        """Code -> original value lists for EmbeddingSnapshot"""
+        return {column: list(labels) for column, labels in self._labels.items()}
+
+    @classmethod
+    def from_columns(
+        cls,
+        columns: Dict[str, np.ndarray],
+        vocabularies: Dict[str, list],
+        labels: Optional[Dict[str, list]] = None
+    ) -> "CaseMetadata":
+        """Rebuild from a snapshot's columns (arrays are used as given, e.g. memory-mapped)"""
+        metadata = cls()
+        for column in metadata._codes:
+            metadata._codes[column] = columns[column]
+            metadata._vocabularies[column] = {value: code for code, value in enumerate(vocabularies[column])}
+            metadata._labels[column] = list((labels or vocabularies)[column])
+        metadata._created = columns["CreatedDate"].view("datetime64[s]")
+        metadata._has_icm = columns["HasICM"].view(bool)
+        metadata._delay = columns["DaysDelayedBeforeICM"]
+        metadata._fingerprint = columns["Fingerprint"]
+        return metadata
+
+    def _encode(self, column: str, value) -> int:
+        if value is None:
+            return -1
+        vocabulary = self._vocabularies[column]
+        key = self._normalize(value)
+        code = vocabulary.get(key)
+        if code is None:
+            code = len(vocabulary)
+            vocabulary[key] = code
+            self._labels[column].append(str(value).strip())
+        return code
+
+    @staticmethod
+    def _normalize(value) -> str:
+        return str(value).strip().casefold()
+
+    @staticmethod
+    def _to_datetime64(value) -> np.datetime64:
+        if value is None:
+            return np.datetime64("NaT")
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        if value.tzinfo is not None:
+            # Database timestamps are naive UTC (GETDATE() on Azure SQL)
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return np.datetime64(value, "s")
+
+    @staticmethod
+    def _grow(array: np.ndarray, capacity: int, size: int, fill) -> np.ndarray:
+        grown = np.full(capacity, fill, dtype=array.dtype)
+        grown[:size] = array[:size]
+        return grown
@@ -1,31 +1,179 @@
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.orm import sessionmaker, declarative_base
-from sqlalchemy.pool import NullPool
+from sqlalchemy.pool import QueuePool
+from datetime import datetime
+import sqlite3
 import struct
 import os
-from azure.identity import DefaultAzureCredential
+import threading
+import time
+
+from metrics import metrics
+from timing import record_query
 
 Base = declarative_base()
 
+SQL_COPT_SS_ACCESS_TOKEN = 1256
+
+db_connect_seconds = metrics.histogram(
+    "icm_db_connect_seconds",
+    "Time to open a new physical database connection"
+)
+db_checkout_seconds = metrics.histogram(
+    "icm_db_pool_checkout_seconds",
+    "Time to obtain a pooled connection for a request (including pre-ping)"
+)
+db_pool_connections = metrics.gauge(
+    "icm_db_pool_connections",
+    "Pooled database connections by state",
+    ["state"]
+)
+db_token_refreshes = metrics.counter(
+    "icm_db_token_refreshes_total",
+    "Entra ID access tokens fetched for database connections"
+)
+
+
+class EntraTokenProvider:
+    """
+    Caches an Entra ID access token for Azure SQL and refreshes it shortly
+    before it expires, so every new pooled connection gets a valid token
+    """
+    
+    SCOPE = "https://database.windows.net/.default"
+    
+    def __init__(self, refresh_margin_seconds: int = 300):
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self._credential = None
+        self._token = None
+        self._lock = threading.Lock()
+    
+    def get_token_struct(self) -> bytes:
+        """Get the cached token packed for SQL_COPT_SS_ACCESS_TOKEN, refreshing if needed"""
+        with self._lock:
+            if self._token is None or self._token.expires_on - time.time() < self.refresh_margin_seconds:
+                if self._credential is None:
+                    # Imported here: only Entra ID deployments pay for azure-identity at startup
+                    from azure.identity import DefaultAzureCredential
+                    self._credential = DefaultAzureCredential()
+                self._token = self._credential.get_token(self.SCOPE)
+                db_token_refreshes.inc()
+            token = self._token.token
+        
+        token_bytes = token.encode("UTF-16-LE")
+        return struct.pack(f'<I{len(token_bytes)}s', len(token_bytes), token_bytes)
+
+
+# Same tables as database/schema.sql; SQLite timestamps are stored as
+# 'YYYY-MM-DD HH:MM:SS.fff' local time (GETDATE() and DATETIME precision)
+SQLITE_NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime')"
+SQLITE_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS icm.Cases (
+    CaseID INTEGER PRIMARY KEY AUTOINCREMENT,
+    CaseTitle TEXT NOT NULL,
+    CaseDescription TEXT NOT NULL,
+    Product TEXT NOT NULL,
+    Component TEXT,
+    Severity TEXT NOT NULL,
+    Priority TEXT NOT NULL,
+    CustomerTier TEXT,
+    SLAImpact TEXT,
+    Environment TEXT,
+    Region TEXT,
+    Tenant TEXT,
+    ErrorCodes TEXT,
+    ErrorMessage TEXT,
+    StackTrace TEXT,
+    AttachmentsJson TEXT,
+    LogLinksJson TEXT,
+    TroubleshootingSteps TEXT,
+    CaseStatus TEXT DEFAULT 'Open',
+    ResolutionNotes TEXT,
+    AssignedTeam TEXT,
+    AssignedTo TEXT,
+    Account TEXT,
+    Tags TEXT,
+    CreatedDate TIMESTAMP NOT NULL DEFAULT ({SQLITE_NOW}),
+    ModifiedDate TIMESTAMP,
+    ICMNumber TEXT,
+    ICMOpenedDate TIMESTAMP,
+    ICMDescription TEXT,
+    DaysDelayedBeforeICM INTEGER,
+    Fingerprint INTEGER,
+    CONSTRAINT CK_Cases_Severity CHECK (Severity IN ('Critical', 'High', 'Medium', 'Low')),
+    CONSTRAINT CK_Cases_Status CHECK (CaseStatus IN ('Open', 'In Progress', 'Resolved', 'Closed', 'Pending'))
+);
+CREATE INDEX IF NOT EXISTS icm.IX_Cases_Product ON Cases(Product);
+CREATE INDEX IF NOT EXISTS icm.IX_Cases_Severity ON Cases(Severity);
+CREATE INDEX IF NOT EXISTS icm.IX_Cases_Status ON Cases(CaseStatus);
+CREATE INDEX IF NOT EXISTS icm.IX_Cases_CreatedDate ON Cases(CreatedDate DESC, CaseID DESC);
+
+CREATE TABLE IF NOT EXISTS icm.CaseEmbeddings (
+    CaseID INTEGER NOT NULL PRIMARY KEY REFERENCES Cases(CaseID) ON DELETE CASCADE,
+    ModelName TEXT NOT NULL,
+    ModelVersion TEXT NOT NULL,
+    Dimension INTEGER NOT NULL,
+    TextHash TEXT NOT NULL,
+    Embedding BLOB NOT NULL,
+    FieldEmbeddings BLOB,
+    CreatedDate TIMESTAMP NOT NULL DEFAULT ({SQLITE_NOW}),
+    ModifiedDate TIMESTAMP NOT NULL DEFAULT ({SQLITE_NOW})
+);
+CREATE INDEX IF NOT EXISTS icm.IX_CaseEmbeddings_Model ON CaseEmbeddings(ModelName, ModelVersion);
+"""
+
+# (table, column, type) added to SQLITE_SCHEMA since its first version
+SQLITE_ADDED_COLUMNS = [
+    ("CaseEmbeddings", "FieldEmbeddings", "BLOB"),
+    ("Cases", "Fingerprint", "INTEGER"),
+]
+
+
+def register_sqlite_timestamps():
+    """Store datetimes in the SQLITE_NOW format and read TIMESTAMP columns back as datetimes"""
+    sqlite3.register_adapter(datetime, lambda value: value.isoformat(" ", timespec="milliseconds"))
+    sqlite3.register_converter("TIMESTAMP", lambda value: datetime.fromisoformat(value.decode()))
+
+
+def attach_sqlite_database(dbapi_connection, path: str):
+    """
+    Attach the database file as schema icm, so the icm.* table names of the
+    T-SQL queries resolve unchanged, in WAL mode (readers never block the writer)
+    """
+    dbapi_connection.execute("ATTACH DATABASE ? AS icm", (path,))
+    dbapi_connection.execute("PRAGMA icm.journal_mode=WAL")
+    dbapi_connection.execute("PRAGMA icm.synchronous=NORMAL")
+    dbapi_connection.execute("PRAGMA foreign_keys=ON")
+
 
 class DatabaseManager:
     def __init__(self):
         self.engine = None
         self.SessionLocal = None
+        # mssql (Azure SQL / SQL Server) or sqlite (local file, see SQLITE_PATH)
+        self.backend = os.getenv("DATABASE_BACKEND", "mssql").lower()
+        self.sqlite_path = os.getenv("SQLITE_PATH", "icm.sqlite")
         self.use_entra_auth = os.getenv("USE_ENTRA_AUTH", "false").lower() == "true"
+        self.token_provider = EntraTokenProvider(
+            refresh_margin_seconds=int(os.getenv("ENTRA_TOKEN_REFRESH_MARGIN_SECONDS", "300"))
+        )
         
     def get_connection_string(self):
         """Build connection string with SQL Auth or Entra ID token auth"""
+        if self.backend == "sqlite":
+            # In-memory main database; SQLITE_PATH is attached as schema icm on connect
+            return "sqlite://"
+        
         server = os.getenv("AZURE_SQL_SERVER")
         database = os.getenv("AZURE_SQL_DATABASE")
         driver = os.getenv("SQL_DRIVER", "ODBC Driver 18 for SQL Server")
         
         if self.use_entra_auth:
-            # Entra ID (Azure AD) authentication
+            # Entra ID (Azure AD) authentication; the access token is injected
+            # per connection, which the driver rejects alongside Authentication=
             connection_string = (
                 f"mssql+pyodbc://{server}/{database}"
                 f"?driver={driver}"
-                f"&Authentication=ActiveDirectoryInteractive"
                 f"&Encrypt=yes"
                 f"&TrustServerCertificate=no"
             )
@@ -43,37 +191,103 @@ class DatabaseManager:
         return connection_string
     
     def get_token_for_entra(self):
-        """Get Azure AD token for authentication"""
-        credential = DefaultAzureCredential()
-        token_bytes = credential.get_token("https://database.windows.net/.default").token.encode("UTF-16-LE")
-        token_struct = struct.pack(f'<I{len(token_bytes)}s', len(token_bytes), token_bytes)
-        return token_struct
+        """Get Azure AD token for authentication (cached until shortly before expiry)"""
+        return self.token_provider.get_token_struct()
     
     def initialize(self):
-        """Initialize database connection"""
+        """Initialize pooled database engine"""
         connection_string = self.get_connection_string()
         
-        # Connection args for Entra ID token
-        connect_args = {}
-        if self.use_entra_auth:
-            token = self.get_token_for_entra()
-            connect_args = {
-                "attrs_before": {1256: token}  # SQL_COPT_SS_ACCESS_TOKEN
+        if self.backend == "sqlite":
+            register_sqlite_timestamps()
+            dialect_args = {
+                # The default for in-memory URLs is one connection per thread
+                "poolclass": QueuePool,
+                "connect_args": {
+                    "check_same_thread": False,
+                    "detect_types": sqlite3.PARSE_DECLTYPES,
+                    # Seconds a writer waits for another process's write lock
+                    "timeout": float(os.getenv("SQLITE_BUSY_TIMEOUT", "30"))
+                }
             }
+        elif self.backend == "mssql":
+            # Send executemany() parameter arrays in one round trip (bulk inserts, embedding upserts)
+            dialect_args = {"fast_executemany": True}
+        else:
+            raise ValueError(f"Unknown DATABASE_BACKEND: {self.backend}")
         
         self.engine = create_engine(
             connection_string,
-            connect_args=connect_args,
-            poolclass=NullPool,  # Disable pooling for token refresh
-            echo=False
+            pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+            max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+            pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+            pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+            pool_pre_ping=os.getenv("DB_POOL_PRE_PING", "true").lower() == "true",
+            echo=False,
+            **dialect_args
         )
         
+        @event.listens_for(self.engine, "do_connect")
+        def connect_with_fresh_token(dialect, conn_rec, cargs, cparams):
+            # Runs for every new physical connection, so pooled connections opened
+            # hours after startup still get a valid Entra ID token
+            if self.use_entra_auth:
+                attrs_before = dict(cparams.get("attrs_before", {}))
+                attrs_before[SQL_COPT_SS_ACCESS_TOKEN] = self.get_token_for_entra()
+                cparams["attrs_before"] = attrs_before
+            
+            start = time.perf_counter()
+            connection = dialect.connect(*cargs, **cparams)
+            db_connect_seconds.observe(time.perf_counter() - start)
+            return connection
+        
+        @event.listens_for(self.engine, "before_cursor_execute")
+        def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+            context.query_start = time.perf_counter()
+        
+        @event.listens_for(self.engine, "after_cursor_execute")
+        def record_query_time(conn, cursor, statement, parameters, context, executemany):
+            # Counted per request and exported as icm_db_query_seconds (see timing.py)
+            record_query(statement, time.perf_counter() - context.query_start)
+        
+        if self.backend == "sqlite":
+            @event.listens_for(self.engine, "connect")
+            def attach_database(dbapi_connection, connection_record):
+                attach_sqlite_database(dbapi_connection, self.sqlite_path)
+            
+            # Create missing tables, so a new file is ready to use
+            connection = self.engine.raw_connection()
+            try:
+                connection.driver_connection.executescript(SQLITE_SCHEMA)
+                # Columns added after the file may have been created
+                for table, column, column_type in SQLITE_ADDED_COLUMNS:
+                    columns = {row[1] for row in connection.driver_connection.execute(
+                        f"PRAGMA icm.table_info({table})"
+                    )}
+                    if column not in columns:
+                        connection.driver_connection.execute(
+                            f"ALTER TABLE icm.{table} ADD COLUMN {column} {column_type}"
+                        )
+            finally:
+                connection.close()
+        
+        pool = self.engine.pool
+        db_pool_connections.set_function(pool.checkedout, state="checked_out")
+        db_pool_connections.set_function(pool.checkedin, state="idle")
+        
         self.SessionLocal = sessionmaker(
             autocommit=False,
             autoflush=False,
             bind=self.engine
         )
     
+    def dispose(self):
+        """Close pooled connections and drop the engine (e.g. in the gunicorn master before forking)"""
+        if self.engine is not None:
+            self.engine.dispose()
+        self.engine = None
+        self.SessionLocal = None
+    
     def get_session(self):
         """Get database session"""
         if self.SessionLocal is None:
@@ -99,6 +313,15 @@ def get_db():
     """Dependency for FastAPI endpoints"""
     db = db_manager.get_session()
     try:
+        # Check out the pooled connection up front so wait time is measured;
+        # a failure here surfaces from the endpoint's first query as before
+        start = time.perf_counter()
+        try:
+            db.connection()
+        except Exception:
+            pass
+        else:
+            db_checkout_seconds.observe(time.perf_counter() - start)
         yield db
     finally:
         db.close()
@@ -1,21 +1,80 @@
-from sentence_transformers import SentenceTransformer
-from typing import List
+from typing import List, Optional, Tuple
+import hashlib
+import os
+import threading
 import numpy as np
 
 
 class EmbeddingService:
-    """Service for generating embeddings using sentence-transformers"""
+    """
+    Service for generating embeddings using sentence-transformers
     
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+    engine="onnx" runs the same model exported by export_onnx.py on ONNX Runtime
+    (optionally int8-quantized) instead of PyTorch; its vectors match the torch
+    ones within the cosine tolerance checked at export time, so stored
+    embeddings stay valid.
+    
+    With field_embeddings, each case is also embedded field by field in
+    chunks short enough for the model's token limit (create_case_segments),
+    for late fusion in the vector index (see field_vectors.py).
+    """
+    
+    ENGINES = ("torch", "onnx")
+    
+    # Fields embedded separately with field_embeddings; codes are indexes into FIELDS
+    FIELDS = ("title", "description", "error", "stack_trace")
+    # Leading stack trace kept for field segments (get_cases_for_embedding cuts it here as well)
+    STACK_TRACE_CHARS = 1000
+    
+    def __init__(
+        self,
+        model_name: str = "all-MiniLM-L6-v2",
+        model_version: str = "1",
+        engine: str = "torch",
+        onnx_model_dir: str = None,
+        onnx_quantized: bool = False,
+        onnx_threads: int = 0,
+        field_embeddings: bool = False,
+        chunk_chars: int = 500,
+        max_chunks: int = 8
+    ):
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown EMBEDDING_ENGINE '{engine}' (expected one of {', '.join(self.ENGINES)})")
         self.model_name = model_name
+        self.model_version = model_version
+        self.engine = engine
+        self.onnx_model_dir = onnx_model_dir or os.path.join(".cache", "onnx", model_name)
+        self.onnx_quantized = onnx_quantized
+        self.onnx_threads = onnx_threads
+        self.field_embeddings = field_embeddings
+        self.chunk_chars = chunk_chars
+        self.max_chunks = max_chunks
         self.model = None
+        self._load_lock = threading.Lock()
         
     def load_model(self):
-        """Load the sentence transformer model"""
-        if self.model is None:
+        """Load the sentence transformer model (or its ONNX export) once, even when called concurrently"""
+        with self._load_lock:
+            if self.model is None:
+                self._load_model()
+    
+    def _load_model(self):
+        if self.engine == "onnx":
+            from onnx_encoder import OnnxEncoder
+            
+            print(f"Loading ONNX embedding model: {self.model_name} from {self.onnx_model_dir}"
+                  f"{' (int8)' if self.onnx_quantized else ''}")
+            self.model = OnnxEncoder(
+                self.onnx_model_dir,
+                quantized=self.onnx_quantized,
+                threads=self.onnx_threads
+            )
+        else:
+            from sentence_transformers import SentenceTransformer
+            
             print(f"Loading embedding model: {self.model_name}")
             self.model = SentenceTransformer(self.model_name)
-            print("Model loaded successfully")
+        print("Model loaded successfully")
     
     def is_loaded(self) -> bool:
         """Check if model is loaded"""
@@ -54,7 +113,145 @@ class EmbeddingService:
             parts.append(f"Stack Trace: {stack_trace_short}")
         
         return " | ".join(parts)
+    
+    def create_text_for_case(self, case: dict) -> str:
+        """Create text representation from a case row (dict with icm.Cases column names)"""
+        return self.create_case_text(
+            title=case["CaseTitle"],
+            description=case["CaseDescription"],
+            product=case.get("Product"),
+            error_message=case.get("ErrorMessage"),
+            stack_trace=case.get("StackTrace")
+        )
+    
+    def create_case_segments(self, case: dict) -> List[Tuple[int, str]]:
+        """
+        (field code, text) chunks of a case's fields, in field order
+        
+        Each field is cut at whitespace into chunks of at most chunk_chars
+        characters (~128 word pieces at the default 500), so the model never
+        silently truncates them; at most max_chunks are kept per field.
+        Empty when field embeddings are disabled.
+        """
+        if not self.field_embeddings:
+            return []
+        values = (
+            case.get("CaseTitle"),
+            case.get("CaseDescription"),
+            case.get("ErrorMessage"),
+            (case.get("StackTrace") or "")[:self.STACK_TRACE_CHARS]
+        )
+        return [
+            (code, chunk)
+            for code, value in enumerate(values)
+            for chunk in self._chunks(value or "")
+        ]
+    
+    def _chunks(self, text: str) -> List[str]:
+        text = " ".join(text.split())
+        chunks = []
+        start = 0
+        while start < len(text) and len(chunks) < self.max_chunks:
+            end = start + self.chunk_chars
+            if end < len(text):
+                space = text.rfind(" ", start, end + 1)
+                if space > start:
+                    end = space
+            chunks.append(text[start:end].strip())
+            start = end
+        return [chunk for chunk in chunks if chunk]
+    
+    def encode_segments(
+        self,
+        segments: List[List[Tuple[int, str]]]
+    ) -> List[Optional[Tuple[np.ndarray, np.ndarray]]]:
+        """
+        Encode the segments of many cases in one batched model call
+        
+        Returns:
+            Per case, (uint8 field codes, normalized float32 vectors), or None
+            for a case without segments
+        """
+        texts = [text for case_segments in segments for _, text in case_segments]
+        if not texts:
+            return [None] * len(segments)
+        vectors = np.asarray(self.encode_batch(texts), dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        
+        result = []
+        offset = 0
+        for case_segments in segments:
+            if not case_segments:
+                result.append(None)
+                continue
+            codes = np.array([code for code, _ in case_segments], dtype=np.uint8)
+            result.append((codes, vectors[offset:offset + len(case_segments)]))
+            offset += len(case_segments)
+        return result
+    
+    def encode_cases(
+        self,
+        case_texts: List[str],
+        segments: List[List[Tuple[int, str]]]
+    ) -> Tuple[np.ndarray, List[Optional[Tuple[np.ndarray, np.ndarray]]]]:
+        """
+        Encode case texts and their segments (see encode_segments)
+        
+        Segments of every case go through one model call; without field
+        embeddings this is just encode_batch(case_texts).
+        """
+        embeddings = self.encode_batch(case_texts)
+        return embeddings, self.encode_segments(segments)
+    
+    def document_hash(self, case_text: str, segments: List[Tuple[int, str]]) -> str:
+        """
+        Hash of everything embedded for a case: its text and its segments
+        
+        Equals text_hash(case_text) without segments, so enabling field
+        embeddings marks every case as changed for reindex.py --mode changed.
+        """
+        if not segments:
+            return self.text_hash(case_text)
+        return self.text_hash("\0".join([case_text] + [f"{self.FIELDS[code]}:{text}" for code, text in segments]))
+    
+    @staticmethod
+    def text_hash(text: str) -> str:
+        """SHA-256 hex digest of the text an embedding was computed from"""
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+    
+    @staticmethod
+    def to_bytes(embedding: np.ndarray) -> bytes:
+        """Serialize an embedding as little-endian float32 for storage"""
+        return np.asarray(embedding, dtype="<f4").tobytes()
+    
+    @staticmethod
+    def from_bytes(data: bytes) -> np.ndarray:
+        """Deserialize an embedding stored with to_bytes"""
+        return np.frombuffer(data, dtype="<f4")
+    
+    @staticmethod
+    def field_vectors_to_bytes(codes: np.ndarray, vectors: np.ndarray) -> bytes:
+        """Serialize field vectors compactly: one uint8 field code per vector, then float16 vectors"""
+        return np.asarray(codes, dtype=np.uint8).tobytes() + np.asarray(vectors, dtype="<f2").tobytes()
+    
+    @staticmethod
+    def field_vectors_from_bytes(data: bytes, dimension: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Deserialize field vectors stored with field_vectors_to_bytes (vectors as float32)"""
+        count = len(data) // (1 + 2 * dimension)
+        codes = np.frombuffer(data, dtype=np.uint8, count=count)
+        vectors = np.frombuffer(data, dtype="<f2", count=count * dimension, offset=count)
+        return codes, vectors.reshape(count, dimension).astype(np.float32)
 
 
 # Global instance
-embedding_service = EmbeddingService()
+embedding_service = EmbeddingService(
+    model_name=os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2"),
+    model_version=os.getenv("EMBEDDING_MODEL_VERSION", "1"),
+    engine=os.getenv("EMBEDDING_ENGINE", "torch").lower(),
+    onnx_model_dir=os.getenv("ONNX_MODEL_DIR") or None,
+    onnx_quantized=os.getenv("ONNX_QUANTIZED", "false").lower() == "true",
+    onnx_threads=int(os.getenv("ONNX_THREADS", "0")),
+    field_embeddings=os.getenv("FIELD_EMBEDDINGS", "false").lower() == "true",
+    chunk_chars=int(os.getenv("FIELD_CHUNK_CHARS", "500")),
+    max_chunks=int(os.getenv("FIELD_MAX_CHUNKS", "8"))
+)
@@ -0,0 +1,170 @@
+from collections import OrderedDict
+from typing import Optional, Tuple
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import numpy as np
+
+from embedder import embedding_service
+from metrics import metrics
+
+cache_hits = metrics.counter(
+    "icm_embedding_cache_hits_total",
+    "Query embeddings served from cache",
+    ["tier"]
+)
+cache_misses = metrics.counter(
+    "icm_embedding_cache_misses_total",
+    "Query embeddings not found in any cache tier"
+)
+cache_evictions = metrics.counter(
+    "icm_embedding_cache_evictions_total",
+    "Cache entries dropped",
+    ["tier", "reason"]
+)
+
+
+class EmbeddingCache:
+    """
+    Bounded LRU + TTL cache of query embeddings
+
+    Keyed by a hash of the model name/version and the whitespace-normalized
+    case text, so re-submitting the same ticket skips inference. The in-process
+    tier is per worker; the optional SQLite tier at shared_path is shared by
+    every worker on the instance (put it under /dev/shm for a shared-memory tier).
+    """
+
+    PRUNE_EVERY = 256
+
+    def __init__(
+        self,
+        max_entries: int = 2048,
+        ttl_seconds: float = 3600.0,
+        shared_path: Optional[str] = None,
+        shared_max_entries: int = 100000
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.shared_path = shared_path or None
+        self.shared_max_entries = shared_max_entries
+        self._entries: "OrderedDict[str, Tuple[float, np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._shared_puts = 0
+
+    @staticmethod
+    def key(text: str) -> str:
+        """Cache key for a case text under the current model"""
+        normalized = re.sub(r"\s+", " ", text).strip()
+        material = f"{embedding_service.model_name}\0{embedding_service.model_version}\0{normalized}"
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """Look up the in-process tier (no I/O)"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, embedding = entry
+            if now - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                cache_evictions.inc(tier="memory", reason="ttl")
+                return None
+            self._entries.move_to_end(key)
+
+        cache_hits.inc(tier="memory")
+        return embedding
+
+    def get_shared(self, key: str) -> Optional[np.ndarray]:
+        """Look up the shared SQLite tier and promote hits to the in-process tier"""
+        if not self.shared_path:
+            return None
+        try:
+            row = self._connection().execute(
+                "SELECT embedding, created FROM embeddings WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error:
+            return None
+
+        if row is None or time.time() - row[1] > self.ttl_seconds:
+            return None
+
+        embedding = embedding_service.from_bytes(row[0])
+        self._put_memory(key, embedding)
+        cache_hits.inc(tier="shared")
+        return embedding
+
+    def record_miss(self):
+        cache_misses.inc()
+
+    def put(self, key: str, embedding: np.ndarray):
+        """Store in the in-process tier"""
+        self._put_memory(key, np.asarray(embedding, dtype=np.float32))
+
+    def put_shared(self, key: str, embedding: np.ndarray):
+        """Store in the shared SQLite tier (best effort)"""
+        if not self.shared_path:
+            return
+        try:
+            connection = self._connection()
+            connection.execute(
+                "INSERT OR REPLACE INTO embeddings (key, embedding, created) VALUES (?, ?, ?)",
+                (key, embedding_service.to_bytes(embedding), time.time())
+            )
+            self._shared_puts += 1
+            if self._shared_puts % self.PRUNE_EVERY == 0:
+                self._prune_shared(connection)
+        except sqlite3.Error:
+            pass
+
+    def _put_memory(self, key: str, embedding: np.ndarray):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), embedding)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                cache_evictions.inc(tier="memory", reason="capacity")
+
+    def _prune_shared(self, connection: sqlite3.Connection):
+        expired = connection.execute(
+            "DELETE FROM embeddings WHERE created < ?", (time.time() - self.ttl_seconds,)
+        ).rowcount
+        overflow = connection.execute(
+            "DELETE FROM embeddings WHERE key IN ("
+            "SELECT key FROM embeddings ORDER BY created DESC LIMIT -1 OFFSET ?)",
+            (self.shared_max_entries,)
+        ).rowcount
+        if expired > 0:
+            cache_evictions.inc(expired, tier="shared", reason="ttl")
+        if overflow > 0:
+            cache_evictions.inc(overflow, tier="shared", reason="capacity")
+
+    def _connection(self) -> sqlite3.Connection:
+        """One autocommit SQLite connection per thread"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            directory = os.path.dirname(self.shared_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.shared_path, timeout=0.1, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=OFF")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings "
+                "(key TEXT PRIMARY KEY, embedding BLOB NOT NULL, created REAL NOT NULL)"
+            )
+            self._local.connection = connection
+        return connection
+
+
+# Global instance (in-process tier per worker, shared tier per instance)
+embedding_cache = EmbeddingCache(
+    max_entries=int(os.getenv("EMBEDDING_CACHE_SIZE", "2048")),
+    ttl_seconds=float(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", "3600")),
+    shared_path=os.getenv("EMBEDDING_CACHE_PATH", ""),
+    shared_max_entries=int(os.getenv("EMBEDDING_CACHE_SHARED_MAX_ENTRIES", "100000"))
+)
@@ -0,0 +1,170 @@
+from datetime import datetime
+from typing import Dict, Optional
+import json
+import os
+import struct
+import numpy as np
+
+MAGIC = b"ICMEMBS\0"
+FORMAT_VERSION = 2
+ALIGNMENT = 64
+DTYPES = {"float32": "<f4", "float16": "<f2"}
+
+# magic, format version, header length
+_PREAMBLE = struct.Struct("<8sII")
+
+
+class SnapshotError(ValueError):
+    """Raised when a snapshot file is missing, corrupt or built for another model"""
+
+
+class EmbeddingSnapshot:
+    """
+    Versioned on-disk copy of the vector index, opened with mmap
+
+    File layout (little-endian):
+        magic "ICMEMBS\\0", uint32 format version, uint32 header length
+        JSON header: model_name, model_version, dimension, rows, capacity,
+            dtype, watermark (max ModifiedDate), created, columns (name ->
+            dtype of each per-row column) and free-form attributes
+        padding to a 64-byte boundary
+        capacity x dimension matrix of L2-normalized vectors (float32 or float16)
+        capacity int64 CaseIDs
+        one capacity-length array per column, each 64-byte aligned
+
+    Rows past `rows` are zero headroom: a float32 snapshot mapped copy-on-write
+    can take new cases without reallocating, and pages nobody writes to stay
+    shared with every other process mapping the same file.
+    """
+
+    def __init__(self, header: dict, matrix: np.ndarray, case_ids: np.ndarray, columns: Dict[str, np.ndarray]):
+        self.header = header
+        self.matrix = matrix
+        self.case_ids = case_ids
+        self.columns = columns
+
+    @property
+    def rows(self) -> int:
+        return int(self.header["rows"])
+
+    @property
+    def watermark(self) -> Optional[datetime]:
+        value = self.header.get("watermark")
+        return datetime.fromisoformat(value) if value else None
+
+    @staticmethod
+    def write(
+        path: str,
+        model_name: str,
+        model_version: str,
+        case_ids: np.ndarray,
+        matrix: np.ndarray,
+        watermark: Optional[datetime],
+        dtype: str = "float32",
+        headroom: float = 0.25,
+        columns: Optional[Dict[str, np.ndarray]] = None,
+        attributes: Optional[dict] = None
+    ):
+        """
+        Write a snapshot atomically (temp file then rename, so readers never see a partial file)
+
+        columns are per-row arrays aligned with case_ids (only the first rows
+        entries are written); attributes is stored in the JSON header.
+        """
+        columns = {name: np.asarray(values)[:len(case_ids)] for name, values in (columns or {}).items()}
+        if dtype not in DTYPES:
+            raise SnapshotError(f"Unsupported snapshot dtype '{dtype}' (expected one of {', '.join(DTYPES)})")
+
+        rows, dimension = matrix.shape
+        capacity = rows + max(1024, int(rows * headroom))
+        header = json.dumps({
+            "model_name": model_name,
+            "model_version": model_version,
+            "dimension": int(dimension),
+            "rows": int(rows),
+            "capacity": int(capacity),
+            "dtype": dtype,
+            "watermark": watermark.isoformat() if isinstance(watermark, datetime) else watermark,
+            "created": datetime.now().isoformat(),
+            "columns": {name: values.dtype.newbyteorder("<").str for name, values in columns.items()},
+            "attributes": attributes or {}
+        }).encode("utf-8")
+        data_offset = EmbeddingSnapshot._data_offset(len(header))
+        item_size = np.dtype(DTYPES[dtype]).itemsize
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        ids_offset = data_offset + capacity * dimension * item_size
+        with open(tmp_path, "wb") as f:
+            f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header)))
+            f.write(header)
+            f.seek(data_offset)
+            np.ascontiguousarray(matrix, dtype=DTYPES[dtype]).tofile(f)
+            # Headroom rows are left as holes (read back as zeros)
+            f.seek(ids_offset)
+            np.ascontiguousarray(case_ids, dtype="<i8").tofile(f)
+            offset = ids_offset + capacity * 8
+            for values in columns.values():
+                offset = EmbeddingSnapshot._align(offset)
+                f.seek(offset)
+                np.ascontiguousarray(values, dtype=values.dtype.newbyteorder("<")).tofile(f)
+                offset += capacity * values.dtype.itemsize
+            f.truncate(offset)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def open(path: str, model_name: str, model_version: str) -> "EmbeddingSnapshot":
+        """
+        Map a snapshot for the given model
+
+        float32 matrices are mapped copy-on-write (no read at startup); float16
+        ones are converted to a private float32 array.
+        """
+        try:
+            with open(path, "rb") as f:
+                magic, version, header_length = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+                header = json.loads(f.read(header_length))
+        except (OSError, struct.error, ValueError) as e:
+            raise SnapshotError(f"Cannot read snapshot {path}: {e}") from e
+
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise SnapshotError(f"{path} is not a version {FORMAT_VERSION} embedding snapshot")
+        if header.get("model_name") != model_name or header.get("model_version") != model_version:
+            raise SnapshotError(
+                f"{path} was built for {header.get('model_name')} v{header.get('model_version')}, "
+                f"not {model_name} v{model_version}"
+            )
+
+        dimension, capacity = int(header["dimension"]), int(header["capacity"])
+        dtype = np.dtype(DTYPES.get(header.get("dtype"), "<f4"))
+        data_offset = EmbeddingSnapshot._data_offset(header_length)
+        ids_offset = data_offset + capacity * dimension * dtype.itemsize
+        column_offsets = {}
+        offset = ids_offset + capacity * 8
+        for name, column_dtype in header.get("columns", {}).items():
+            offset = EmbeddingSnapshot._align(offset)
+            column_offsets[name] = (offset, np.dtype(column_dtype))
+            offset += capacity * np.dtype(column_dtype).itemsize
+        if os.path.getsize(path) < offset:
+            raise SnapshotError(f"{path} is truncated")
+
+        matrix = np.memmap(path, dtype=dtype, mode="c", offset=data_offset, shape=(capacity, dimension))
+        case_ids = np.memmap(path, dtype="<i8", mode="c", offset=ids_offset, shape=(capacity,))
+        columns = {
+            name: np.memmap(path, dtype=column_dtype, mode="c", offset=column_offset, shape=(capacity,))
+            for name, (column_offset, column_dtype) in column_offsets.items()
+        }
+        if dtype != np.float32:
+            matrix = matrix.astype(np.float32)
+
+        return EmbeddingSnapshot(header, matrix, case_ids, columns)
+
+    @staticmethod
+    def _data_offset(header_length: int) -> int:
+        return EmbeddingSnapshot._align(_PREAMBLE.size + header_length)
+
+    @staticmethod
+    def _align(offset: int) -> int:
+        return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
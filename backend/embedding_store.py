@@ -0,0 +1,139 @@
+from sqlalchemy.orm import Session
+from typing import List, Optional, Tuple
+import numpy as np
+
+from models import Case
+from embedder import embedding_service
+from repository import embedding_repository
+from vector_index import vector_index
+
+
+class EmbeddingStore:
+    """
+    Keeps per-case embeddings in icm.CaseEmbeddings so they are computed once per case
+
+    Every embedding written here is also applied to this worker's in-memory vector index.
+    With field embeddings enabled, a case's per-field chunk vectors are stored
+    alongside its embedding and the text hash covers them too.
+    """
+
+    def index_case(self, db: Session, case: Case) -> bool:
+        """
+        Compute and store the embedding for a created or updated case
+
+        Args:
+            case: Case as returned by CaseRepository
+
+        Returns:
+            True if the embedding was (re)computed, False if the stored one is current
+        """
+        case_text = self.pending_text(db, case)
+        if case_text is None:
+            return False
+
+        segments = embedding_service.create_case_segments(case.model_dump())
+        self.store(
+            db, case, case_text,
+            embedding_service.encode_text(case_text),
+            embedding_service.encode_segments([segments])[0]
+        )
+        return True
+
+    def pending_text(self, db: Session, case: Case) -> Optional[str]:
+        """
+        Get the text to embed for a case, or None if its stored embedding is current
+
+        Lets callers run the model call elsewhere (e.g. on the inference pool)
+        between pending_text() and store().
+        """
+        case_dict = case.model_dump()
+        case_text = embedding_service.create_text_for_case(case_dict)
+        stored_hash = embedding_repository.get_text_hash(
+            db,
+            case.CaseID,
+            embedding_service.model_name,
+            embedding_service.model_version
+        )
+        if stored_hash == self._document_hash(case_dict, case_text):
+            return None
+        return case_text
+
+    def store(
+        self,
+        db: Session,
+        case: Case,
+        case_text: str,
+        embedding: np.ndarray,
+        field_vectors: Optional[Tuple[np.ndarray, np.ndarray]] = None
+    ) -> None:
+        """
+        Store an embedding computed from case_text and apply it to the vector index
+
+        Args:
+            field_vectors: Encoded create_case_segments() of the case
+                (EmbeddingService.encode_segments), None without field embeddings
+        """
+        case_dict = case.model_dump()
+        self._save(db, case_dict, self._document_hash(case_dict, case_text), embedding, field_vectors)
+
+    def store_many(
+        self,
+        db: Session,
+        cases: List[Case],
+        case_texts: List[str],
+        embeddings: np.ndarray,
+        field_vectors: Optional[List[Optional[Tuple[np.ndarray, np.ndarray]]]] = None
+    ) -> None:
+        """Store embeddings for many new cases with one batched upsert and apply them to the vector index"""
+        field_vectors = field_vectors or [None] * len(cases)
+        case_dicts = [case.model_dump() for case in cases]
+        embedding_repository.upsert_embeddings(
+            db,
+            embedding_service.model_name,
+            embedding_service.model_version,
+            [
+                {
+                    "case_id": case["CaseID"],
+                    "dimension": int(embedding.shape[-1]),
+                    "text_hash": self._document_hash(case, case_text),
+                    "embedding": embedding_service.to_bytes(embedding),
+                    "field_embeddings": self._field_bytes(case_field_vectors)
+                }
+                for case, case_text, embedding, case_field_vectors
+                in zip(case_dicts, case_texts, embeddings, field_vectors)
+            ]
+        )
+        for case, embedding, case_field_vectors in zip(case_dicts, embeddings, field_vectors):
+            vector_index.upsert(case["CaseID"], embedding, case, case_field_vectors)
+
+    @staticmethod
+    def _document_hash(case: dict, case_text: str) -> str:
+        return embedding_service.document_hash(case_text, embedding_service.create_case_segments(case))
+
+    @staticmethod
+    def _field_bytes(field_vectors: Optional[Tuple[np.ndarray, np.ndarray]]) -> Optional[bytes]:
+        return embedding_service.field_vectors_to_bytes(*field_vectors) if field_vectors is not None else None
+
+    def _save(
+        self,
+        db: Session,
+        case: dict,
+        text_hash: str,
+        embedding: np.ndarray,
+        field_vectors: Optional[Tuple[np.ndarray, np.ndarray]] = None
+    ) -> None:
+        embedding_repository.upsert_embedding(
+            db,
+            case["CaseID"],
+            embedding_service.model_name,
+            embedding_service.model_version,
+            text_hash,
+            embedding_service.to_bytes(embedding),
+            int(embedding.shape[-1]),
+            self._field_bytes(field_vectors)
+        )
+        vector_index.upsert(case["CaseID"], embedding, case, field_vectors)
+
+
+# Global instance
+embedding_store = EmbeddingStore()
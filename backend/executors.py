@@ -0,0 +1,80 @@
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException
+from functools import partial
+import asyncio
+import os
+import time
+
+from metrics import metrics
+
+inference_in_flight = metrics.gauge(
+    "icm_inference_in_flight",
+    "Model inference calls admitted (running or queued on the inference pool)"
+)
+inference_queue_wait_seconds = metrics.histogram(
+    "icm_inference_queue_wait_seconds",
+    "Time a request waited for an inference slot"
+)
+inference_rejected = metrics.counter(
+    "icm_inference_rejected_total",
+    "Inference calls rejected with 503 because every slot stayed busy"
+)
+
+
+class OverloadedError(HTTPException):
+    """Raised when admission control rejects work; surfaces as 503 Service Unavailable"""
+
+    def __init__(self, retry_after_seconds: int = 1):
+        super().__init__(
+            status_code=503,
+            detail="Server is busy, please retry",
+            headers={"Retry-After": str(retry_after_seconds)}
+        )
+
+
+class InferenceExecutor:
+    """
+    Dedicated bounded thread pool for model inference
+
+    Keeps SentenceTransformer.encode off the event loop and admits at most
+    max_in_flight calls at once. Further callers wait up to queue_timeout
+    seconds for a slot and are then rejected with OverloadedError.
+    """
+
+    def __init__(self, workers: int = 2, max_in_flight: int = 8, queue_timeout: float = 2.0):
+        self.workers = workers
+        self.max_in_flight = max_in_flight
+        self.queue_timeout = queue_timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="inference")
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._in_flight = 0
+        inference_in_flight.set_function(lambda: self._in_flight)
+
+    async def run(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) on the inference pool once a slot is free"""
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            inference_rejected.inc()
+            raise OverloadedError(retry_after_seconds=max(1, int(self.queue_timeout)))
+        inference_queue_wait_seconds.observe(time.perf_counter() - start)
+
+        self._in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, partial(fn, *args, **kwargs))
+        finally:
+            self._in_flight -= 1
+            self._slots.release()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Global instance (one per worker process)
+inference_executor = InferenceExecutor(
+    workers=int(os.getenv("INFERENCE_WORKERS", "2")),
+    max_in_flight=int(os.getenv("MAX_INFLIGHT_ENCODES", "8")),
+    queue_timeout=float(os.getenv("ENCODE_QUEUE_TIMEOUT_SECONDS", "2.0"))
+)
@@ -0,0 +1,176 @@
+"""
+Export the embedding model to ONNX for EMBEDDING_ENGINE=onnx
+
+Writes model.onnx (and model.int8.onnx with --quantize), tokenizer.json and
+manifest.json to ONNX_MODEL_DIR, then checks that ONNX embeddings match the
+sentence-transformers ones: every verification text must reach the cosine
+tolerance or the export fails with a non-zero exit code.
+
+Needs the full torch stack plus onnxruntime, so run it once at build time,
+not on the App Service workers.
+
+Usage:
+    python export_onnx.py
+    python export_onnx.py --quantize --int8-tolerance 0.99
+"""
+import argparse
+import json
+import os
+import sys
+from typing import List
+import numpy as np
+from dotenv import load_dotenv
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+load_dotenv()
+
+from embedder import embedding_service
+from onnx_encoder import OnnxEncoder, MODEL_FILE, QUANTIZED_MODEL_FILE, TOKENIZER_FILE, MANIFEST_FILE
+
+
+def verification_texts() -> List[str]:
+    """Case texts covering short, long (truncated) and stack-trace inputs"""
+    cases = [
+        ("Azure VM fails to start after reboot",
+         "Virtual machine in West US region fails to boot after scheduled maintenance. Error code: VMStartTimedOut",
+         "Azure Virtual Machines", "The VM failed to start within the expected time frame", None),
+        ("Database connection timeout in production",
+         "Application experiencing intermittent database connection timeouts during peak hours",
+         "Azure SQL Database", "Timeout expired. The timeout period elapsed prior to completion of the operation",
+         "at System.Data.SqlClient.SqlConnection.OnError(SqlException exception)\n"
+         "at System.Data.SqlClient.TdsParser.ThrowExceptionAndWarning()"),
+        ("Storage account throttling",
+         "Requests to blob storage return 503 Server Busy under load " * 40,
+         "Azure Storage", "ServerBusy", None),
+        ("Login page blank", "Users see an empty page after signing in", None, None, None),
+        ("AKS pods stuck in CrashLoopBackOff",
+         "Deployment rollout fails; pods restart repeatedly after node pool upgrade",
+         "Azure Kubernetes Service", "Back-off restarting failed container",
+         "Traceback (most recent call last):\n  File \"app.py\", line 12, in <module>\n"
+         "ModuleNotFoundError: No module named 'requests'"),
+    ]
+    return [
+        embedding_service.create_case_text(title, description, product, error_message, stack_trace)
+        for title, description, product, error_message, stack_trace in cases
+    ]
+
+
+def cosine_agreement(reference: np.ndarray, candidate: np.ndarray) -> np.ndarray:
+    """Row-wise cosine similarity between two embedding matrices"""
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    candidate = candidate / np.linalg.norm(candidate, axis=1, keepdims=True)
+    return np.sum(reference * candidate, axis=1)
+
+
+def export_model(output_dir: str, opset: int):
+    """Export the transformer (token embeddings) and tokenizer from the sentence-transformers model"""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(embedding_service.model_name, device="cpu")
+    transformer = model[0].auto_model.eval()
+    tokenizer = model.tokenizer
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids")
+                   if name in tokenizer.model_input_names]
+
+    class TokenEmbeddings(torch.nn.Module):
+        def __init__(self, wrapped):
+            super().__init__()
+            self.wrapped = wrapped
+
+        def forward(self, *inputs):
+            return self.wrapped(**dict(zip(input_names, inputs))).last_hidden_state
+
+    sample = tokenizer(["export sample", "a slightly longer export sample"], padding=True, return_tensors="pt")
+    os.makedirs(output_dir, exist_ok=True)
+    with torch.no_grad():
+        torch.onnx.export(
+            TokenEmbeddings(transformer),
+            tuple(sample[name] for name in input_names),
+            os.path.join(output_dir, MODEL_FILE),
+            input_names=input_names,
+            output_names=["token_embeddings"],
+            dynamic_axes={
+                **{name: {0: "batch", 1: "sequence"} for name in input_names},
+                "token_embeddings": {0: "batch", 1: "sequence"}
+            },
+            opset_version=opset,
+            do_constant_folding=True
+        )
+
+    tokenizer.backend_tokenizer.save(os.path.join(output_dir, TOKENIZER_FILE))
+    manifest = {
+        "model_name": embedding_service.model_name,
+        "model_version": embedding_service.model_version,
+        "dimension": model.get_sentence_embedding_dimension(),
+        "max_seq_length": model.max_seq_length,
+        "pad_token": tokenizer.pad_token,
+        "pad_token_id": tokenizer.pad_token_id
+    }
+    with open(os.path.join(output_dir, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    return model, manifest
+
+
+def quantize_model(output_dir: str):
+    """Dynamic int8 quantization of the exported weights"""
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    quantize_dynamic(
+        os.path.join(output_dir, MODEL_FILE),
+        os.path.join(output_dir, QUANTIZED_MODEL_FILE),
+        weight_type=QuantType.QInt8
+    )
+
+
+def check_agreement(model, output_dir: str, quantized: bool, tolerance: float) -> float:
+    """Minimum cosine between torch and ONNX embeddings over the verification texts"""
+    texts = verification_texts()
+    reference = model.encode(texts, convert_to_numpy=True, show_progress_bar=False)
+    candidate = OnnxEncoder(output_dir, quantized=quantized).encode(texts)
+    worst = float(cosine_agreement(reference, candidate).min())
+
+    status = "✓" if worst >= tolerance else "✗"
+    print(f"{status} {'int8' if quantized else 'fp32'} ONNX vs torch: min cosine {worst:.5f} "
+          f"(tolerance {tolerance})")
+    return worst
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output-dir", default=embedding_service.onnx_model_dir,
+                        help="Directory to write the export to (default: ONNX_MODEL_DIR)")
+    parser.add_argument("--quantize", action="store_true",
+                        help="Also write an int8 dynamically quantized model")
+    parser.add_argument("--opset", type=int, default=14)
+    parser.add_argument("--tolerance", type=float, default=0.9999,
+                        help="Minimum cosine for the fp32 export (default: 0.9999)")
+    parser.add_argument("--int8-tolerance", type=float, default=0.99,
+                        help="Minimum cosine for the int8 export (default: 0.99)")
+    args = parser.parse_args()
+
+    print(f"Exporting {embedding_service.model_name} to {args.output_dir}...")
+    model, manifest = export_model(args.output_dir, args.opset)
+    manifest["min_cosine"] = {"fp32": check_agreement(model, args.output_dir, False, args.tolerance)}
+    passed = manifest["min_cosine"]["fp32"] >= args.tolerance
+
+    if args.quantize:
+        print("Quantizing to int8...")
+        quantize_model(args.output_dir)
+        manifest["min_cosine"]["int8"] = check_agreement(model, args.output_dir, True, args.int8_tolerance)
+        passed = passed and manifest["min_cosine"]["int8"] >= args.int8_tolerance
+
+    with open(os.path.join(args.output_dir, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    if not passed:
+        print("✗ ONNX embeddings are outside tolerance; keep EMBEDDING_ENGINE=torch")
+        sys.exit(1)
+    print(f"\n✓ Export ready; set EMBEDDING_ENGINE=onnx and ONNX_MODEL_DIR={args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
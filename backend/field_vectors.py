@@ -0,0 +1,232 @@
+from typing import Dict, Optional, Tuple
+import numpy as np
+
+from embedder import EmbeddingService
+
+# Weight name of the combined case-text vector in FIELD_WEIGHTS
+CASE_FIELD = "case"
+FUSIONS = ("mean", "max")
+
+
+def parse_field_weights(spec: str) -> Dict[str, float]:
+    """Parse FIELD_WEIGHTS ("case:1,title:1,stack_trace:0.5"); unlisted fields weigh 1"""
+    weights = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, value = item.partition(":")
+        name = name.strip()
+        if name != CASE_FIELD and name not in EmbeddingService.FIELDS:
+            raise ValueError(f"Unknown field {name!r} in FIELD_WEIGHTS "
+                             f"(expected {CASE_FIELD} or one of {', '.join(EmbeddingService.FIELDS)})")
+        weights[name] = float(value)
+        if weights[name] < 0:
+            raise ValueError(f"FIELD_WEIGHTS must not be negative ({item})")
+    return weights
+
+
+class FieldVectors:
+    """
+    Per-field chunk vectors of the indexed cases, for late fusion
+
+    Vectors are held in one append-only float32 arena; each VectorIndex
+    position points at its span, ordered by field code. Replacing or removing
+    a case leaves its old span dead until the arena is compacted, so updates
+    never shift other rows.
+
+    A case's score fuses the score of its combined text (field "case") with
+    one score per field, the best of that field's chunks:
+
+        mean: sum(w_f * s_f) / sum(w_f)
+        max:  max(w_f * s_f)
+
+    over the fields the case has. Cases without field vectors keep their
+    combined score (weighted by the case weight with max fusion).
+    """
+
+    def __init__(self, weights: Optional[Dict[str, float]] = None, fusion: str = "mean"):
+        if fusion not in FUSIONS:
+            raise ValueError(f"Unknown field fusion {fusion!r} (expected one of {', '.join(FUSIONS)})")
+        weights = weights or {}
+        self.case_weight = weights.get(CASE_FIELD, 1.0)
+        self.weights = np.array([weights.get(field, 1.0) for field in EmbeddingService.FIELDS], dtype=np.float32)
+        self.fusion = fusion
+        self.reset()
+
+    def reset(self):
+        """Drop every vector (positions are reallocated by the next resize)"""
+        self._arena = np.empty((0, 0), dtype=np.float32)
+        self._fields = np.empty(0, dtype=np.uint8)
+        self._used = 0
+        self._dead = 0
+        self._starts = np.zeros(0, dtype=np.int64)
+        self._lengths = np.zeros(0, dtype=np.int32)
+        self._changes = 0
+        self._plan = None
+
+    @property
+    def segments(self) -> int:
+        """Number of live field vectors"""
+        return self._used - self._dead
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the arena and the per-position spans"""
+        return self._arena.nbytes + self._fields.nbytes + self._starts.nbytes + self._lengths.nbytes
+
+    def resize(self, capacity: int, size: int):
+        """Reallocate the per-position spans to capacity rows, keeping the first size rows"""
+        starts = np.zeros(capacity, dtype=np.int64)
+        lengths = np.zeros(capacity, dtype=np.int32)
+        starts[:size] = self._starts[:size]
+        lengths[:size] = self._lengths[:size]
+        self._starts = starts
+        self._lengths = lengths
+
+    def set(self, position: int, codes: Optional[np.ndarray], vectors: Optional[np.ndarray]) -> bool:
+        """
+        Replace the field vectors of the case at position (None clears them)
+
+        Args:
+            codes: uint8 field codes (indexes into EmbeddingService.FIELDS)
+            vectors: Normalized vectors, one per code
+
+        Returns:
+            True if the vectors changed
+        """
+        count = 0 if codes is None else len(codes)
+        if count:
+            order = np.argsort(codes, kind="stable")
+            codes, vectors = np.asarray(codes)[order], vectors[order]
+        start, length = int(self._starts[position]), int(self._lengths[position])
+        if count == length and (
+            count == 0
+            or (np.array_equal(self._fields[start:start + length], codes)
+                and np.array_equal(self._arena[start:start + length], vectors))
+        ):
+            return False
+
+        self._dead += length
+        self._lengths[position] = count
+        if count:
+            self._reserve(self._used + count, vectors.shape[1])
+            self._arena[self._used:self._used + count] = vectors
+            self._fields[self._used:self._used + count] = codes
+            self._starts[position] = self._used
+            self._used += count
+        self._changes += 1
+        return True
+
+    def move(self, source: int, target: int):
+        """Point target at the vectors of source and clear source (VectorIndex swap-remove)"""
+        self._dead += int(self._lengths[target])
+        self._starts[target] = self._starts[source]
+        self._lengths[target] = self._lengths[source]
+        self._lengths[source] = 0
+        self._changes += 1
+
+    def compact(self, size: int):
+        """Rewrite the arena without dead spans once they outnumber the live vectors"""
+        if self._dead <= max(self.segments, 1024):
+            return
+        lengths = self._lengths[:size].astype(np.int64)
+        starts = np.cumsum(lengths) - lengths
+        live = self._span_indexes(self._starts[:size], lengths, starts)
+        self._arena = self._arena[live]
+        self._fields = self._fields[live]
+        self._starts[:size] = starts
+        self._used = len(live)
+        self._dead = 0
+        self._changes += 1
+
+    def plan(self, positions: Optional[np.ndarray], size: int) -> Optional[tuple]:
+        """
+        Fusion plan of some cases, for fuse() (the caller holds the index lock)
+
+        The plan holds a view of the arena rows written so far; set() only
+        appends past them and compact() allocates a new arena, so the plan
+        stays valid without the lock.
+
+        Args:
+            positions: VectorIndex positions of the scored cases, or None
+                for the first size positions (cached until the next change)
+
+        Returns:
+            The plan, or None if none of the cases have field vectors
+        """
+        if positions is None:
+            if self._plan is None or self._plan[0] != (self._changes, size):
+                self._plan = ((self._changes, size), self._fusion_plan(np.arange(size)))
+            return self._plan[1]
+        return self._fusion_plan(positions)
+
+    def fuse(self, queries: np.ndarray, case_scores: np.ndarray, plan: Optional[tuple]) -> np.ndarray:
+        """
+        Fuse per-field scores into the combined-text scores of some cases
+
+        Args:
+            queries: Q x D normalized query vectors
+            case_scores: Q x C combined-text similarities
+            plan: plan() of the C scored cases
+
+        Returns:
+            Q x C fused scores
+        """
+        fused = case_scores * self.case_weight if self.fusion == "max" else case_scores.copy()
+        if plan is None:
+            return fused
+        arena, cases, segments, group_starts, case_starts, weights, weight_sums = plan
+
+        # Gathering copies the vectors; scoring the whole arena is cheaper once
+        # the cases hold a sizeable share of it
+        if len(segments) * 4 > len(arena):
+            scores = (queries @ arena.T)[:, segments]
+        else:
+            scores = queries @ arena[segments].T
+        field_scores = np.maximum.reduceat(scores, group_starts, axis=1) * weights
+
+        if self.fusion == "max":
+            fused[:, cases] = np.maximum(fused[:, cases], np.maximum.reduceat(field_scores, case_starts, axis=1))
+        else:
+            fused[:, cases] = (
+                np.add.reduceat(field_scores, case_starts, axis=1) + self.case_weight * case_scores[:, cases]
+            ) / weight_sums
+        return fused
+
+    def _fusion_plan(self, positions: np.ndarray) -> Optional[Tuple[np.ndarray, ...]]:
+        """Arena and the arena rows of the given positions grouped by (case, field), or None if none have vectors"""
+        lengths = self._lengths[positions].astype(np.int64)
+        cases = np.flatnonzero(lengths)
+        if cases.size == 0:
+            return None
+        lengths = lengths[cases]
+        offsets = np.cumsum(lengths) - lengths
+        segments = self._span_indexes(self._starts[positions[cases]], lengths, offsets)
+
+        fields = self._fields[segments]
+        boundaries = np.ones(len(segments), dtype=bool)
+        boundaries[1:] = fields[1:] != fields[:-1]
+        boundaries[offsets] = True
+        group_starts = np.flatnonzero(boundaries)
+        case_starts = np.searchsorted(group_starts, offsets)
+        weights = self.weights[fields[group_starts]]
+        weight_sums = np.maximum(np.add.reduceat(weights, case_starts) + self.case_weight, 1e-6)
+        return self._arena[:self._used], cases, segments, group_starts, case_starts, weights, weight_sums
+
+    @staticmethod
+    def _span_indexes(starts: np.ndarray, lengths: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+        """Concatenated arena indexes of the spans (offsets: cumulative lengths before each span)"""
+        return np.arange(int(lengths.sum())) - np.repeat(offsets, lengths) + np.repeat(starts, lengths)
+
+    def _reserve(self, required: int, dimension: int):
+        """Grow the arena geometrically so appends stay amortized O(1)"""
+        if self._arena.shape[0] >= required and self._arena.shape[1] == dimension:
+            return
+        capacity = max(1024, self._arena.shape[0])
+        while capacity < required:
+            capacity *= 2
+        arena = np.zeros((capacity, dimension), dtype=np.float32)
+        fields = np.zeros(capacity, dtype=np.uint8)
+        if self._used and self._arena.shape[1] == dimension:
+            arena[:self._used] = self._arena[:self._used]
+            fields[:self._used] = self._fields[:self._used]
+        self._arena = arena
+        self._fields = fields
@@ -0,0 +1,210 @@
+from typing import Dict, List, Optional, Set, Tuple
+import hashlib
+import re
+import string
+import numpy as np
+
+# icm.Cases columns an error fingerprint is computed from
+ERROR_FIELDS = ("ErrorMessage", "ErrorCodes", "StackTrace")
+
+# Stack trace lines fingerprinted (the top frames identify a crash site; cutting
+# by lines, not characters, keeps the cut stable when a number changes length)
+STACK_TRACE_LINES = 20
+# Error text shorter than this (after normalization) gets no fingerprint: short
+# generic messages ("Internal server error") would make every such case a duplicate
+MIN_TOKENS = 12
+
+# Punctuation and whitespace split tokens (str.translate is much faster than a regex)
+_SEPARATORS = str.maketrans({char: " " for char in string.punctuation.replace("_", "") + string.whitespace})
+_HEX_DIGITS = frozenset(string.hexdigits.lower())
+_MASK = (1 << 64) - 1
+
+# Default fingerprint distance (bits) of near-duplicates: renaming one of
+# STACK_TRACE_LINES frames typically flips 3-8 of the 64 bits, while unrelated
+# errors are ~32 bits apart (benchmarks/duplicate_benchmark.py)
+NEAR_DUPLICATE_DISTANCE = 6
+
+# Token -> hash memo, cleared when it outgrows this many tokens
+TOKEN_HASH_CACHE_SIZE = 100000
+_TOKEN_HASHES: Dict[str, int] = {}
+
+
+def _normalize_token(token: str) -> str:
+    # Volatile values (line numbers, counters, IDs, addresses) become placeholders,
+    # so copies that differ only in them get the same fingerprint
+    if token.isdigit():
+        return "<n>"
+    if token.startswith("0x") and len(token) > 10:
+        return "<address>"
+    if len(token) >= 4 and _HEX_DIGITS.issuperset(token):
+        return "<hex>"
+    return token
+
+
+def normalize_error_text(text: Optional[str]) -> List[str]:
+    """Lowercased tokens of an error message or stack trace with volatile values replaced"""
+    return [
+        token if token.isalpha() else _normalize_token(token)
+        for token in (text or "").lower().translate(_SEPARATORS).split()
+    ]
+
+
+def _token_hashes(tokens: List[str]) -> np.ndarray:
+    """Stable 64-bit hash of every token, memoized (error text reuses a small vocabulary)"""
+    if len(_TOKEN_HASHES) > TOKEN_HASH_CACHE_SIZE:
+        _TOKEN_HASHES.clear()
+    for token in dict.fromkeys(tokens):
+        if token not in _TOKEN_HASHES:
+            _TOKEN_HASHES[token] = int.from_bytes(
+                hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little"
+            )
+    return np.array([_TOKEN_HASHES[token] for token in tokens], dtype=np.uint64)
+
+
+def _mix(x: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer (wrapping uint64 arithmetic)"""
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def simhash(hashes: np.ndarray) -> Optional[int]:
+    """
+    64-bit SimHash of 64-bit feature hashes
+
+    Every feature votes on each bit; similar feature sets give fingerprints a
+    few bits apart. None without features.
+    """
+    if not len(hashes):
+        return None
+    bits = np.unpackbits(hashes.astype("<u8").view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+    majority = bits.sum(axis=0, dtype=np.int64) * 2 > len(hashes)
+    return int(np.packbits(majority, bitorder="little").view("<u8")[0])
+
+
+def error_fingerprint(
+    error_message: Optional[str],
+    error_codes: Optional[str],
+    stack_trace: Optional[str]
+) -> Optional[int]:
+    """
+    Fingerprint of a case's error: SimHash over the distinct word 3-shingles
+    of the normalized error message and stack trace, XORed with a hash of the
+    error codes
+
+    Cases with the same error codes are as many bits apart as their error
+    texts; different error codes put them ~32 bits apart. Returned as a
+    signed 64-bit integer (icm.Cases.Fingerprint is BIGINT) and never 0,
+    which CaseMetadata uses for "no fingerprint". None when the error text is
+    shorter than MIN_TOKENS.
+    """
+    tokens = normalize_error_text(error_message) + normalize_error_text(
+        "\n".join((stack_trace or "").splitlines()[:STACK_TRACE_LINES])
+    )
+    if len(tokens) < MIN_TOKENS:
+        return None
+    # Shingle hashes are combined from token hashes in one vectorized pass; only
+    # distinct shingles vote, so boilerplate repeated on every frame does not
+    # outvote the rest
+    hashes = _token_hashes(tokens)
+    shingles = _mix(hashes[:-2] ^ _mix(hashes[1:-1] ^ _mix(hashes[2:])))
+    value = simhash(np.unique(shingles))
+    codes = sorted(set(re.split(r"[\s,;]+", (error_codes or "").lower())) - {""})
+    if codes:
+        value ^= int.from_bytes(hashlib.blake2b(" ".join(codes).encode("utf-8"), digest_size=8).digest(), "little")
+    value = value or 1
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def case_fingerprint(case: dict) -> Optional[int]:
+    """error_fingerprint of a case row or CaseCreate dump (icm.Cases column names)"""
+    return error_fingerprint(case.get("ErrorMessage"), case.get("ErrorCodes"), case.get("StackTrace"))
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Number of differing bits between two fingerprints"""
+    return bin((a ^ b) & _MASK).count("1")
+
+
+class FingerprintIndex:
+    """
+    Exact and near-duplicate lookup of case fingerprints
+
+    Each fingerprint is split into BANDS bands of 16 bits, with one dict per
+    band from band value to CaseIDs. Fingerprints d bits apart have a band
+    with at most d // BANDS differing bits (pigeonhole): up to BANDS - 1 bits
+    a lookup probes each band's value, up to MAX_DISTANCE it also probes the
+    values one bit off. Only the cases found are compared, so a lookup takes
+    microseconds however large the corpus. Not thread-safe; VectorIndex
+    holds it under its lock.
+    """
+
+    BANDS = 4
+    BAND_BITS = 16
+    MAX_DISTANCE = 2 * BANDS - 1
+
+    def __init__(self):
+        self._fingerprints: Dict[int, int] = {}
+        self._bands: List[Dict[int, Set[int]]] = [{} for _ in range(self.BANDS)]
+
+    def __len__(self) -> int:
+        return len(self._fingerprints)
+
+    def set(self, case_id: int, fingerprint: Optional[int]) -> bool:
+        """
+        Index (or with None, forget) the fingerprint of a case
+
+        Returns:
+            True if it changed
+        """
+        fingerprint = fingerprint & _MASK if fingerprint else None
+        current = self._fingerprints.get(case_id)
+        if current == fingerprint:
+            return False
+        if current is not None:
+            del self._fingerprints[case_id]
+            for band, value in enumerate(self._band_values(current)):
+                case_ids = self._bands[band][value]
+                case_ids.discard(case_id)
+                if not case_ids:
+                    del self._bands[band][value]
+        if fingerprint is not None:
+            self._fingerprints[case_id] = fingerprint
+            for band, value in enumerate(self._band_values(fingerprint)):
+                self._bands[band].setdefault(value, set()).add(case_id)
+        return True
+
+    def remove(self, case_id: int) -> bool:
+        return self.set(case_id, None)
+
+    def find(self, fingerprint: Optional[int], max_distance: int = MAX_DISTANCE) -> List[Tuple[int, int]]:
+        """
+        Cases whose fingerprint is at most max_distance bits from fingerprint
+
+        Returns:
+            (CaseID, distance) tuples, closest first (distance 0 is an exact
+            duplicate of the normalized error)
+        """
+        if not fingerprint:
+            return []
+        if not 0 <= max_distance <= self.MAX_DISTANCE:
+            raise ValueError(f"max_distance must be between 0 and {self.MAX_DISTANCE}")
+        fingerprint &= _MASK
+        flips = [0] if max_distance < self.BANDS else [0, *(1 << bit for bit in range(self.BAND_BITS))]
+        candidates: Set[int] = set()
+        for band, value in enumerate(self._band_values(fingerprint)):
+            buckets = self._bands[band]
+            for flip in flips:
+                candidates.update(buckets.get(value ^ flip, ()))
+        fingerprints = self._fingerprints
+        matches = []
+        for case_id in candidates:
+            distance = bin(fingerprint ^ fingerprints[case_id]).count("1")
+            if distance <= max_distance:
+                matches.append((distance, case_id))
+        matches.sort()
+        return [(case_id, distance) for distance, case_id in matches]
+
+    def _band_values(self, fingerprint: int):
+        mask = (1 << self.BAND_BITS) - 1
+        return [(fingerprint >> (band * self.BAND_BITS)) & mask for band in range(self.BANDS)]
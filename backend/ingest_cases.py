@@ -0,0 +1,106 @@
+"""
+Bulk-load cases (CaseCreate records) from a JSON array or NDJSON file
+
+Cases are inserted --chunk-size at a time in one transaction per chunk,
+embedded with one model call per chunk and stored in icm.CaseEmbeddings.
+Invalid or rejected records are reported by their index in the input and
+do not stop the load. Running API workers pick the new cases up on their
+next vector index refresh.
+
+Usage:
+    python ingest_cases.py cases.json
+    python ingest_cases.py cases.ndjson --chunk-size 1000
+    cat cases.ndjson | python ingest_cases.py - --format ndjson
+    python ingest_cases.py cases.ndjson --report report.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from dotenv import load_dotenv
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+load_dotenv()
+
+from db import db_manager
+from embedder import embedding_service
+from embedding_store import embedding_store
+from bulk_ingest import BulkIngest, chunked, read_ndjson
+
+
+def read_records(f, file_format: str):
+    """Iterate the records of a JSON array (loaded at once) or NDJSON file (streamed)"""
+    if file_format == "ndjson":
+        return read_ndjson(f)
+    records = json.load(f)
+    if not isinstance(records, list):
+        raise ValueError("Expected a JSON array of cases")
+    return records
+
+
+def ingest_cases(f, file_format: str, chunk_size: int, report_path: str = None):
+    """Insert, embed and store every record, chunk by chunk"""
+    db_manager.initialize()
+    db = db_manager.get_session()
+    ingest = BulkIngest()
+    start = time.perf_counter()
+
+    try:
+        embedding_service.load_model()
+
+        for chunk in chunked(read_records(f, file_format), chunk_size):
+            cases = ingest.insert(db, ingest.validate(chunk))
+            if cases:
+                case_texts = BulkIngest.case_texts(cases)
+                segments = BulkIngest.case_segments(cases)
+                try:
+                    embeddings, field_vectors = embedding_service.encode_cases(case_texts, segments)
+                    embedding_store.store_many(db, cases, case_texts, embeddings, field_vectors)
+                except Exception as e:
+                    db.rollback()
+                    ingest.embedding_failed(cases, e)
+            print(f"Read {ingest.received} records, created {len(ingest.case_ids)} cases "
+                  f"({time.perf_counter() - start:.0f}s)")
+
+    except Exception as e:
+        print(f"✗ Error: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+    result = ingest.response()
+    for error in result.errors[:20]:
+        print(f"  record {error.index}: {error.error}")
+    if len(result.errors) > 20:
+        print(f"  ... {len(result.errors) - 20} more errors")
+    if report_path:
+        with open(report_path, "w") as report:
+            report.write(result.model_dump_json(indent=2))
+
+    print(f"\n✓ Created {result.created} of {result.received} cases ({result.failed} failed)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="JSON array or NDJSON file of cases, - for stdin")
+    parser.add_argument("--format", choices=("json", "ndjson"),
+                        help="Input format (default: ndjson for .ndjson/.jsonl files and stdin, else json)")
+    parser.add_argument("--chunk-size", type=int, default=500,
+                        help="Cases inserted per transaction and encoded per model call (default: 500)")
+    parser.add_argument("--report", help="Write the full result (CaseIDs and per-record errors) as JSON")
+    args = parser.parse_args()
+
+    if args.chunk_size < 1:
+        parser.error("--chunk-size must be at least 1")
+    file_format = args.format or (
+        "ndjson" if args.path == "-" or args.path.endswith((".ndjson", ".jsonl")) else "json"
+    )
+
+    if args.path == "-":
+        ingest_cases(sys.stdin, file_format, args.chunk_size, args.report)
+    else:
+        with open(args.path, encoding="utf-8") as f:
+            ingest_cases(f, file_format, args.chunk_size, args.report)
@@ -1,26 +1,51 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response, JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from datetime import datetime
-from typing import List
+from typing import List, Optional
+import gc
+import json
 import os
+import time
+import numpy as np
 from dotenv import load_dotenv
 
+# Load environment variables before the services below read their configuration
+load_dotenv()
+
 from models import (
     HealthResponse,
+    ReadinessResponse,
     CaseCreate,
+    CaseUpdate,
     Case,
+    CasePage,
+    BulkCaseResponse,
     RecommendationRequest,
     RecommendationResponse,
-    SimilarCase
+    SimilarCase,
+    DuplicateCase,
+    ICMStatistics,
+    ICMRollupResponse
 )
 from db import get_db, db_manager
+from metrics import metrics, MetricsRegistry, process_memory
 from embedder import embedding_service
-from similarity import SimilarityService
-from repository import CaseRepository
-
-# Load environment variables
-load_dotenv()
+from executors import inference_executor
+from batcher import embedding_batcher
+from embedding_cache import embedding_cache
+from embedding_store import embedding_store
+from fingerprint import NEAR_DUPLICATE_DISTANCE, FingerprintIndex, error_fingerprint
+from vector_index import vector_index
+from response_cache import response_cache
+from repository import case_repository, embedding_repository
+from bulk_ingest import BulkIngest, parse_ndjson_line
+from pagination import CursorError, cursor_key, decode_cursor, encode_cursor, parse_fields
+from readiness import WarmUp
+from timing import begin_request, stage, request_seconds, request_db_queries, request_db_seconds
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -29,6 +54,49 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Upper bound on /recommend_icm/batch size
+MAX_BATCH_RECOMMENDATIONS = int(os.getenv("MAX_BATCH_RECOMMENDATIONS", "500"))
+
+# Upper bound on records in a JSON array posted to /cases/bulk (NDJSON bodies
+# are read chunk by chunk), and the rows inserted per transaction
+MAX_BULK_CASES = int(os.getenv("MAX_BULK_CASES", "10000"))
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "500"))
+
+# Upper bound on GET /cases page size (also the chunk size of NDJSON exports)
+MAX_CASES_PAGE_SIZE = int(os.getenv("MAX_CASES_PAGE_SIZE", "500"))
+
+# Fingerprint bits two cases' errors may differ by and still count as duplicates
+# (0: exact duplicates only, at most FingerprintIndex.MAX_DISTANCE)
+DUPLICATE_MAX_DISTANCE = int(os.getenv("DUPLICATE_MAX_DISTANCE", str(NEAR_DUPLICATE_DISTANCE)))
+if not 0 <= DUPLICATE_MAX_DISTANCE <= FingerprintIndex.MAX_DISTANCE:
+    raise ValueError(f"DUPLICATE_MAX_DISTANCE must be between 0 and {FingerprintIndex.MAX_DISTANCE}")
+
+# Score /recommend_icm queries whose error exactly duplicates an indexed case
+# with that case's stored vector instead of running the model
+DUPLICATE_SHORT_CIRCUIT = os.getenv("DUPLICATE_SHORT_CIRCUIT", "false").lower() == "true"
+
+duplicate_cases_total = metrics.counter(
+    "icm_duplicate_cases_total",
+    "Created cases whose error duplicates an indexed case, by kind (exact or near)",
+    ["kind"]
+)
+duplicate_short_circuits = metrics.counter(
+    "icm_duplicate_short_circuits_total",
+    "Recommendation queries scored with an exact duplicate's vector instead of encoding"
+)
+
+process_memory_bytes = metrics.gauge(
+    "icm_process_memory_bytes",
+    "Worker memory from /proc/self/smaps_rollup by kind (rss, pss, shared, private)",
+    ["pid", "kind"]
+)
+
+# Add a Server-Timing header (per-stage and database durations) to every response
+SERVER_TIMING = os.getenv("SERVER_TIMING", "false").lower() == "true"
+
+# Background model load and index warm-up (progress is reported by /ready)
+warm_up = WarmUp(retry_seconds=float(os.getenv("WARMUP_RETRY_SECONDS", "10")))
+
 # CORS configuration
 app.add_middleware(
     CORSMiddleware,
@@ -39,24 +107,211 @@ app.add_middleware(
 )
 
 
+
+@app.middleware("http")
+async def record_request_timings(request: Request, call_next):
+    """Record latency, stage timings and database usage of every request (see timing.py)"""
+    timings = begin_request()
+    start = time.perf_counter()
+    response = await call_next(request)
+    
+    route = route_template(request)
+    request_seconds.observe(
+        time.perf_counter() - start,
+        route=route,
+        method=request.method,
+        status=response.status_code
+    )
+    request_db_queries.observe(timings.db_queries, route=route)
+    request_db_seconds.observe(timings.db_seconds, route=route)
+    if SERVER_TIMING:
+        response.headers["Server-Timing"] = timings.server_timing()
+    return response
+
+
+def route_template(request: Request) -> str:
+    """Path template of the matched route (keeps label values bounded), or unmatched"""
+    endpoint = request.scope.get("endpoint")
+    for route in request.app.routes:
+        if endpoint is not None and getattr(route, "endpoint", None) is endpoint:
+            return route.path
+    return "unmatched"
+
+
+def load_model() -> str:
+    """Warm-up stage: load the embedding model"""
+    embedding_service.load_model()
+    return f"{embedding_service.model_name} ({embedding_service.engine})"
+
+
+def warm_vector_index() -> str:
+    """Warm-up stage: load stored embeddings (skipped if a request already did)"""
+    if not vector_index.is_warm():
+        db = db_manager.get_session()
+        try:
+            vector_index.ensure_warm(db)
+        finally:
+            db.close()
+    return f"{vector_index.size} cases"
+
+
+def refresh_vector_index():
+    """Rate-limited vector index refresh with a session of its own"""
+    db = db_manager.get_session()
+    try:
+        vector_index.refresh(db)
+    finally:
+        db.close()
+
+
+def preload():
+    """
+    Load shared state in the gunicorn master before workers fork (see gunicorn.conf.py)
+    
+    Workers inherit the torch weights and the vector index matrix copy-on-write,
+    so those pages stay shared until a worker writes to them, and their own
+    warm-up stages find everything loaded. ONNX Runtime sessions are not
+    fork-safe, so the ONNX engine still loads per worker.
+    """
+    if embedding_service.engine == "torch":
+        print("Preloading embedding model in the master process...")
+        embedding_service.load_model()
+    
+    print("Preloading vector index in the master process...")
+    try:
+        warm_vector_index()
+    except Exception as e:
+        # Workers retry the warm-up themselves
+        print(f"Vector index preload failed: {e}")
+    finally:
+        # Pooled connections must not be shared across the fork
+        db_manager.dispose()
+    
+    # Move everything loaded so far out of the collector's generations so
+    # garbage collection in workers does not write to (and copy) those pages
+    gc.freeze()
+
+
 @app.on_event("startup")
 async def startup_event():
-    """Initialize services on startup"""
+    """
+    Initialize services on startup
+    
+    Creating the engine does not connect, so the worker starts serving right
+    away; the model and vector index load in the background and /ready turns
+    green once both are available.
+    """
     print("Initializing database connection...")
     db_manager.initialize()
     
-    print("Loading embedding model...")
-    embedding_service.load_model()
+    # Per-worker memory; pss summed over workers is the instance total
+    worker_pid = os.getpid()
+    for kind in ("rss", "pss", "shared", "private"):
+        process_memory_bytes.set_function(
+            lambda kind=kind: process_memory().get(kind, 0),
+            pid=worker_pid,
+            kind=kind
+        )
+    
+    print("Loading embedding model and warming vector index in the background...")
+    warm_up.start([
+        ("model", load_model),
+        ("vector_index", warm_vector_index)
+    ])
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Persist the approximate search index so the next start only adds new rows"""
+    warm_up.stop()
+    if vector_index.is_warm():
+        vector_index.save()
+    await embedding_batcher.stop()
+    inference_executor.shutdown()
+
+
+async def encode_query(text: str) -> np.ndarray:
+    """
+    Encode one text, micro-batched with concurrent callers on the inference pool
+    (raises OverloadedError when saturated)
+    
+    Repeat texts are served from the embedding cache without running the model.
+    """
+    key = embedding_cache.key(text)
+    embedding = embedding_cache.get(key)
+    if embedding is not None:
+        return embedding
+    
+    if embedding_cache.shared_path:
+        embedding = await run_in_threadpool(embedding_cache.get_shared, key)
+        if embedding is not None:
+            return embedding
     
-    print("Startup complete!")
+    embedding_cache.record_miss()
+    embedding = await embedding_batcher.encode(text)
+    embedding_cache.put(key, embedding)
+    if embedding_cache.shared_path:
+        await run_in_threadpool(embedding_cache.put_shared, key, embedding)
+    return embedding
+
+
+async def encode_queries(texts: List[str]) -> np.ndarray:
+    """Encode many texts in one model call, skipping those already cached"""
+    keys = [embedding_cache.key(text) for text in texts]
+    embeddings = [embedding_cache.get(key) for key in keys]
+    
+    if embedding_cache.shared_path and any(embedding is None for embedding in embeddings):
+        def lookup_shared():
+            return [
+                embedding if embedding is not None else embedding_cache.get_shared(key)
+                for key, embedding in zip(keys, embeddings)
+            ]
+        embeddings = await run_in_threadpool(lookup_shared)
+    
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    if missing:
+        encoded = await inference_executor.run(
+            embedding_service.encode_batch,
+            [texts[i] for i in missing]
+        )
+        for i, embedding in zip(missing, encoded):
+            embedding_cache.record_miss()
+            embedding_cache.put(keys[i], embedding)
+            embeddings[i] = embedding
+        if embedding_cache.shared_path:
+            def store_shared():
+                for i in missing:
+                    embedding_cache.put_shared(keys[i], embeddings[i])
+            await run_in_threadpool(store_shared)
+    
+    return np.vstack(embeddings)
+
+
+async def index_case(db: Session, case: Case):
+    """Refresh a case's stored embedding without blocking the event loop"""
+    try:
+        case_text = await run_in_threadpool(embedding_store.pending_text, db, case)
+        if case_text is None:
+            # Text unchanged, but filterable attributes (status, ICM, ...) may not be
+            await run_in_threadpool(vector_index.update_metadata, case.CaseID, case.model_dump())
+            return
+        embedding = await encode_query(case_text)
+        field_vectors = None
+        segments = embedding_service.create_case_segments(case.model_dump())
+        if segments:
+            field_vectors = (await inference_executor.run(embedding_service.encode_segments, [segments]))[0]
+        await run_in_threadpool(embedding_store.store, db, case, case_text, embedding, field_vectors)
+    except Exception as e:
+        # The case is already committed; a missing embedding is picked up by reindex.py
+        print(f"Failed to embed case #{case.CaseID}: {e}")
 
 
 @app.get("/health", response_model=HealthResponse)
 async def health_check(db: Session = Depends(get_db)):
-    """Health check endpoint"""
+    """Liveness check: answers as soon as the worker is up, even while warming"""
     db_status = "connected"
     try:
-        db_manager.test_connection()
+        await run_in_threadpool(db_manager.test_connection)
     except Exception as e:
         db_status = f"error: {str(e)}"
     
@@ -68,14 +323,55 @@ async def health_check(db: Session = Depends(get_db)):
     )
 
 
+@app.get("/ready", response_model=ReadinessResponse, responses={503: {"model": ReadinessResponse}})
+async def readiness_check():
+    """Readiness check: 200 once the model and vector index are loaded, 503 before"""
+    readiness = ReadinessResponse(
+        ready=embedding_service.is_loaded() and vector_index.is_warm(),
+        model_loaded=embedding_service.is_loaded(),
+        index_warm=vector_index.is_warm(),
+        indexed_cases=vector_index.size,
+        stages=warm_up.status()
+    )
+    return JSONResponse(
+        status_code=200 if readiness.ready else 503,
+        content=readiness.model_dump(mode="json")
+    )
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics for this worker process"""
+    return Response(content=metrics.render(), media_type=MetricsRegistry.CONTENT_TYPE)
+
+
+def find_duplicates(
+    fingerprint: Optional[int],
+    filters: Optional[dict] = None,
+    limit: int = 10,
+    exclude: Optional[int] = None
+) -> List[DuplicateCase]:
+    """Indexed cases within DUPLICATE_MAX_DISTANCE fingerprint bits, closest first"""
+    matches = vector_index.find_duplicates(fingerprint, DUPLICATE_MAX_DISTANCE, filters, limit + 1)
+    return [
+        DuplicateCase(case_id=case_id, distance=distance)
+        for case_id, distance in matches
+        if case_id != exclude
+    ][:limit]
+
+
 @app.post("/create_case", response_model=Case)
 async def create_case(
     case_data: CaseCreate,
+    response: Response,
     db: Session = Depends(get_db)
 ):
     """
     Create a new case in the database
     
+    Indexed cases with the same (or a near-identical) error fingerprint are
+    listed, closest first, in the X-Duplicate-Of header.
+    
     Args:
         case_data: Case information
         
@@ -83,96 +379,154 @@ async def create_case(
         Created case with CaseID and timestamps
     """
     try:
-        case = CaseRepository.create_case(db, case_data)
-        return case
+        case = await run_in_threadpool(case_repository.create_case, db, case_data)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create case: {str(e)}")
+    
+    response_cache.invalidate()
+    with stage("duplicates"):
+        duplicates = await run_in_threadpool(find_duplicates, case.Fingerprint, exclude=case.CaseID)
+    if duplicates:
+        duplicate_cases_total.inc(kind="exact" if duplicates[0].distance == 0 else "near")
+        response.headers["X-Duplicate-Of"] = ",".join(str(duplicate.case_id) for duplicate in duplicates)
+    await index_case(db, case)
+    return case
 
 
-@app.post("/recommend_icm", response_model=RecommendationResponse)
-async def recommend_icm(
-    request: RecommendationRequest,
-    db: Session = Depends(get_db)
-):
+@app.post("/cases/bulk", response_model=BulkCaseResponse)
+async def create_cases_bulk(request: Request, db: Session = Depends(get_db)):
     """
-    Find similar cases using semantic similarity
+    Create many cases from a JSON array, or from an NDJSON stream
+    (Content-Type: application/x-ndjson)
     
-    Args:
-        request: Case information for similarity search
-        
-    Returns:
-        Top-k similar cases with similarity scores and thresholds
+    Records are inserted BULK_CHUNK_SIZE at a time, one transaction per chunk,
+    then embedded in one model call per chunk and added to the vector index.
+    Invalid or rejected records are reported by their index in the input and
+    do not stop the rest; case_ids has the new CaseID (or null) of every record.
     """
+    ingest = BulkIngest()
+    chunk = []
+    async for record in bulk_records(request):
+        chunk.append((ingest.received + len(chunk), record))
+        if len(chunk) >= BULK_CHUNK_SIZE:
+            await ingest_chunk(db, ingest, chunk)
+            chunk = []
+    if chunk:
+        await ingest_chunk(db, ingest, chunk)
+    
+    return ingest.response()
+
+
+async def bulk_records(request: Request):
+    """Yield the raw records of a /cases/bulk body (JSON array or NDJSON)"""
+    if "ndjson" in request.headers.get("content-type", ""):
+        buffer = b""
+        async for data in request.stream():
+            *lines, buffer = (buffer + data).split(b"\n")
+            for line in lines:
+                record = parse_ndjson_line(line.decode("utf-8", errors="replace"))
+                if record is not None:
+                    yield record
+        record = parse_ndjson_line(buffer.decode("utf-8", errors="replace"))
+        if record is not None:
+            yield record
+        return
+    
     try:
-        # Create text representation for the query case
-        query_text = embedding_service.create_case_text(
-            title=request.case_title,
-            description=request.case_description,
-            product=request.product,
-            error_message=request.error_message,
-            stack_trace=request.stack_trace
+        records = json.loads(await request.body())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON body: {e}")
+    if not isinstance(records, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array of cases")
+    if len(records) > MAX_BULK_CASES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {MAX_BULK_CASES} cases per JSON array; stream larger loads as NDJSON"
         )
-        
-        # Generate embedding for query
-        query_embedding = embedding_service.encode_text(query_text)
-        
-        # Get existing cases from database
-        existing_cases = CaseRepository.get_cases_for_similarity_search(db)
-        
-        if not existing_cases:
-            return RecommendationResponse(
-                similar_cases=[],
-                alert_threshold_reached=False,
-                recommend_icm=False,
-                highest_similarity=0.0
-            )
-        
-        # Generate embeddings for all existing cases
-        case_texts = [
-            embedding_service.create_case_text(
-                title=case["CaseTitle"],
-                description=case["CaseDescription"],
-                product=case.get("Product"),
-                error_message=case.get("ErrorMessage"),
-                stack_trace=case.get("StackTrace")
-            )
-            for case in existing_cases
+    for record in records:
+        yield record
+
+
+async def ingest_chunk(db: Session, ingest: BulkIngest, chunk: list):
+    """Insert, embed and index one chunk of /cases/bulk records"""
+    cases = await run_in_threadpool(ingest.insert, db, ingest.validate(chunk))
+    if not cases:
+        return
+    response_cache.invalidate()
+    case_texts = BulkIngest.case_texts(cases)
+    segments = BulkIngest.case_segments(cases)
+    try:
+        embeddings, field_vectors = await inference_executor.run(embedding_service.encode_cases, case_texts, segments)
+        await run_in_threadpool(embedding_store.store_many, db, cases, case_texts, embeddings, field_vectors)
+    except Exception as e:
+        # The cases are committed; reindex.py embeds them later
+        await run_in_threadpool(db.rollback)
+        ingest.embedding_failed(cases, e)
+
+
+def build_recommendations(
+    db: Session,
+    requests: List[RecommendationRequest],
+    query_embeddings: np.ndarray
+) -> List[RecommendationResponse]:
+    """
+    Rank, fetch and summarize similar cases for already encoded queries
+    
+    Database work does not depend on top_k: every hit is loaded in one
+    get_cases_by_ids query, and ICM statistics are read from the vector
+    index's in-memory ICM columns. Cases whose error fingerprint matches the
+    request's are looked up in the index too and returned as duplicate_cases.
+    """
+    # Pick up cases written by other workers since the last refresh
+    with stage("index_refresh"):
+        vector_index.refresh(db)
+    
+    # Score against the in-memory index: top-k and threshold analysis in one pass,
+    # restricted to the cases matching each request's filters
+    filters = [
+        request.filters.model_dump(exclude_none=True) if request.filters else None
+        for request in requests
+    ]
+    analyses = vector_index.search_batch(
+        query_embeddings,
+        k=max(request.top_k for request in requests),
+        filters=filters
+    )
+    for request, analysis in zip(requests, analyses):
+        analysis["top_k"] = analysis["top_k"][:request.top_k]
+    
+    with stage("duplicates"):
+        duplicates = [
+            find_duplicates(request_fingerprint(request), request_filters, limit=request.top_k)
+            for request, request_filters in zip(requests, filters)
         ]
-        
-        candidate_embeddings = embedding_service.encode_batch(case_texts)
-        
-        # Compute similarities
-        similarities = SimilarityService.compute_cosine_similarity(
-            query_embedding,
-            candidate_embeddings
-        )
-        
-        # Get top-k similar cases
-        top_k_results = SimilarityService.get_top_k_similar(
-            similarities,
-            k=request.top_k
+    
+    # One round trip for every hit, in ranking order
+    with stage("fetch_cases"):
+        cases = case_repository.get_cases_by_ids(
+            db,
+            [case_id for analysis in analyses for case_id, _ in analysis["top_k"]]
         )
-        
-        # Fetch full case details for top results
+    
+    responses = []
+    for analysis, duplicate_cases in zip(analyses, duplicates):
         similar_cases = []
-        for idx, score in top_k_results:
-            case_id = existing_cases[idx]["CaseID"]
-            case = CaseRepository.get_case_by_id(db, case_id)
+        for case_id, score in analysis["top_k"]:
+            case = cases.get(case_id)
             if case:
-                similar_cases.append(
-                    SimilarCase(case=case, similarity_score=score)
-                )
-        
-        # Analyze results
-        analysis = SimilarityService.analyze_similarities(similarities)
+                similar_cases.append(SimilarCase(case=case, similarity_score=score))
+            else:
+                # Deleted by another worker since the last refresh
+                vector_index.remove(case_id)
         
         # Get ICM statistics if recommend_icm is true
         icm_stats = None
         if analysis["recommend_icm"] and similar_cases:
-            similar_case_ids = [sc.case.CaseID for sc in similar_cases]
-            stats_data = CaseRepository.get_icm_statistics(db, similar_case_ids, months=6)
-            
-            from models import ICMStatistics
+            with stage("icm_statistics"):
+                stats_data = vector_index.icm_statistics(
+                    [sc.case.CaseID for sc in similar_cases],
+                    months=6
+                )
             icm_stats = ICMStatistics(
                 total_similar_cases_reviewed=stats_data["total_similar_cases_reviewed"],
                 cases_with_icm=stats_data["cases_with_icm"],
@@ -181,14 +535,154 @@ async def recommend_icm(
                 review_period_months=6
             )
         
-        return RecommendationResponse(
+        responses.append(RecommendationResponse(
             similar_cases=similar_cases,
             alert_threshold_reached=analysis["alert"],
             recommend_icm=analysis["recommend_icm"],
             highest_similarity=analysis["max_score"],
-            icm_statistics=icm_stats
+            icm_statistics=icm_stats,
+            duplicate_cases=duplicate_cases
+        ))
+    
+    return responses
+
+
+def build_recommendations_in_session(
+    requests: List[RecommendationRequest],
+    query_embeddings: np.ndarray
+) -> List[RecommendationResponse]:
+    """build_recommendations with a session of its own (cache hits never check one out)"""
+    db = db_manager.get_session()
+    try:
+        return build_recommendations(db, requests, query_embeddings)
+    finally:
+        db.close()
+
+
+@app.get("/icm_statistics/rollup", response_model=ICMRollupResponse)
+async def icm_statistics_rollup(
+    months: int = Query(12, ge=1, le=120),
+    db: Session = Depends(get_db)
+):
+    """
+    ICM statistics per product and creation month for dashboards
+    
+    Covers the last `months` calendar months (the current one included) of
+    indexed cases; computed from the vector index's ICM columns and reused
+    until the index changes.
+    """
+    try:
+        await run_in_threadpool(vector_index.refresh, db)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to load case index: {str(e)}")
+    rows = await run_in_threadpool(vector_index.icm_rollup, months)
+    return ICMRollupResponse(months=months, rows=rows)
+
+
+def create_query_text(request: RecommendationRequest) -> str:
+    """Create text representation for a query case"""
+    return embedding_service.create_case_text(
+        title=request.case_title,
+        description=request.case_description,
+        product=request.product,
+        error_message=request.error_message,
+        stack_trace=request.stack_trace
+    )
+
+
+def request_fingerprint(request: RecommendationRequest) -> Optional[int]:
+    """Error fingerprint of a query case (None when its error text is too short)"""
+    return error_fingerprint(request.error_message, request.error_codes, request.stack_trace)
+
+
+def duplicate_vector(request: RecommendationRequest, query_text: str) -> Optional[np.ndarray]:
+    """
+    Stored vector of an indexed case whose error exactly duplicates the
+    request's, if that vector was computed from the same text as the query
+    
+    The fingerprint only covers the error, so the duplicate's stored TextHash
+    must also equal the query's; otherwise the query is encoded as usual.
+    """
+    matches = vector_index.find_duplicates(request_fingerprint(request), max_distance=0, limit=1)
+    if not matches:
+        return None
+    case_id = matches[0][0]
+    query_hash = embedding_service.document_hash(query_text, embedding_service.create_case_segments({
+        "CaseTitle": request.case_title,
+        "CaseDescription": request.case_description,
+        "ErrorMessage": request.error_message,
+        "StackTrace": request.stack_trace
+    }))
+    db = db_manager.get_session()
+    try:
+        stored_hash = embedding_repository.get_text_hash(
+            db, case_id, embedding_service.model_name, embedding_service.model_version
         )
+    finally:
+        db.close()
+    if stored_hash != query_hash:
+        return None
+    vector = vector_index.vector(case_id)
+    if vector is not None:
+        duplicate_short_circuits.inc()
+    return vector
+
+
+@app.post("/recommend_icm", response_model=RecommendationResponse)
+async def recommend_icm(request: RecommendationRequest):
+    """
+    Find similar cases using semantic similarity
+    
+    Repeated requests are answered from the response cache until a case is
+    written or the vector index changes; the index is refreshed (at most
+    once per refresh interval) before the cache is consulted, so writes by
+    other workers reach cached responses too (see response_cache.py). With
+    DUPLICATE_SHORT_CIRCUIT, a query whose error exactly duplicates an
+    indexed case embedded from the same text reuses that case's vector
+    without running the model.
+    
+    Args:
+        request: Case information for similarity search
         
+    Returns:
+        Top-k similar cases with similarity scores and thresholds
+    """
+    try:
+        with stage("query_text"):
+            query_text = create_query_text(request)
+            fingerprint = request_fingerprint(request)
+        # Pick up other workers' writes before trusting a cached response
+        if vector_index.refresh_due():
+            with stage("index_refresh"):
+                await run_in_threadpool(refresh_vector_index)
+        cache_key = response_cache.key(
+            query_text,
+            request.top_k,
+            request.filters.model_dump(mode="json", exclude_none=True) if request.filters else None,
+            fingerprint
+        )
+        body = response_cache.get(cache_key)
+        if body is not None:
+            return Response(content=body, media_type="application/json", headers={"X-Response-Cache": "hit"})
+        version = response_cache.version()
+        
+        # Generate embedding for query
+        with stage("encode"):
+            query_embedding = None
+            if DUPLICATE_SHORT_CIRCUIT:
+                query_embedding = await run_in_threadpool(duplicate_vector, request, query_text)
+            if query_embedding is None:
+                query_embedding = await encode_query(query_text)
+        
+        responses = await run_in_threadpool(
+            build_recommendations_in_session, [request], np.atleast_2d(query_embedding)
+        )
+        body = responses[0].model_dump_json().encode("utf-8")
+        response_cache.put(cache_key, version, body)
+        return Response(content=body, media_type="application/json", headers={"X-Response-Cache": "miss"})
+        
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -196,29 +690,153 @@ async def recommend_icm(
         )
 
 
-@app.get("/cases", response_model=List[Case])
+@app.post("/recommend_icm/batch", response_model=List[RecommendationResponse])
+async def recommend_icm_batch(
+    requests: List[RecommendationRequest],
+    db: Session = Depends(get_db)
+):
+    """
+    Find similar cases for many incoming cases at once
+    
+    Uncached queries are encoded in one model call and all are scored as one matrix product;
+    every hit is fetched in one query and ICM statistics are read from the
+    vector index.
+    
+    Args:
+        requests: Case information for each similarity search
+        
+    Returns:
+        One recommendation per request, in request order
+    """
+    if len(requests) > MAX_BATCH_RECOMMENDATIONS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {MAX_BATCH_RECOMMENDATIONS} requests per batch"
+        )
+    if not requests:
+        return []
+    
+    try:
+        with stage("query_text"):
+            query_texts = [create_query_text(request) for request in requests]
+        with stage("encode_batch"):
+            query_embeddings = await encode_queries(query_texts)
+        
+        return await run_in_threadpool(build_recommendations, db, requests, query_embeddings)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to generate recommendations: {str(e)}"
+        )
+
+
+@app.get("/cases", response_model=CasePage)
 async def get_cases(
-    limit: int = 100,
-    offset: int = 0,
+    limit: int = Query(100, ge=1, le=MAX_CASES_PAGE_SIZE),
+    cursor: str = None,
+    fields: str = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
     db: Session = Depends(get_db)
 ):
-    """Get all cases with pagination"""
+    """
+    List cases newest first, one keyset page at a time
+    
+    Pass next_cursor from the previous page as cursor to continue. fields is
+    "summary" (default), "all" or a comma-separated list of case fields.
+    format=ndjson streams every case from cursor onwards, one JSON object per
+    line, fetching limit rows per query.
+    """
+    try:
+        columns = parse_fields(fields)
+        after = decode_cursor(cursor) if cursor else None
+    except CursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if format == "ndjson":
+        return StreamingResponse(stream_cases(columns, limit, after), media_type="application/x-ndjson")
+    
     try:
-        cases = CaseRepository.get_all_cases(db, limit=limit, offset=offset)
-        return cases
+        # One extra row tells whether there is a next page
+        rows = await run_in_threadpool(case_repository.get_cases_page, db, columns, limit + 1, after)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve cases: {str(e)}")
+    
+    items = rows[:limit]
+    next_cursor = encode_cursor(items[-1]) if len(rows) > limit else None
+    return CasePage(items=items, next_cursor=next_cursor)
+
+
+def stream_cases(columns: List[str], chunk_size: int, after):
+    """
+    Yield NDJSON lines for every case after the cursor, chunk by chunk
+    
+    Uses its own session: the request's session is closed before a streamed
+    body finishes. Each chunk is a separate short query, so an export never
+    holds a read open while the client drains the response.
+    """
+    db = db_manager.get_session()
+    try:
+        while True:
+            rows = case_repository.get_cases_page(db, columns, chunk_size, after)
+            for row in rows:
+                yield json.dumps(jsonable_encoder(row)) + "\n"
+            if len(rows) < chunk_size:
+                return
+            after = cursor_key(rows[-1])
+    finally:
+        db.close()
 
 
 @app.get("/cases/{case_id}", response_model=Case)
 async def get_case(case_id: int, db: Session = Depends(get_db)):
     """Get a specific case by ID"""
-    case = CaseRepository.get_case_by_id(db, case_id)
+    case = await run_in_threadpool(case_repository.get_case_by_id, db, case_id)
+    if not case:
+        raise HTTPException(status_code=404, detail="Case not found")
+    return case
+
+
+@app.put("/cases/{case_id}", response_model=Case)
+async def update_case(
+    case_id: int,
+    updates: CaseUpdate,
+    db: Session = Depends(get_db)
+):
+    """Update fields of a case and refresh its stored embedding"""
+    try:
+        case = await run_in_threadpool(
+            case_repository.update_case, db, case_id, updates.model_dump(exclude_unset=True)
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to update case: {str(e)}")
+    
     if not case:
         raise HTTPException(status_code=404, detail="Case not found")
+    
+    response_cache.invalidate()
+    await index_case(db, case)
     return case
 
 
+@app.delete("/cases/{case_id}")
+async def delete_case(case_id: int, db: Session = Depends(get_db)):
+    """Delete a case (its stored embedding is removed by ON DELETE CASCADE)"""
+    try:
+        deleted = await run_in_threadpool(case_repository.delete_case, db, case_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to delete case: {str(e)}")
+    
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Case not found")
+    
+    response_cache.invalidate()
+    vector_index.remove(case_id)
+    return {"deleted": True, "CaseID": case_id}
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
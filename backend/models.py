@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Any, Optional, List, Dict
 from datetime import datetime
 
 
@@ -37,27 +37,90 @@ class CaseCreate(CaseBase):
     pass
 
 
+class CaseUpdate(BaseModel):
+    CaseTitle: Optional[str] = Field(None, max_length=255)
+    CaseDescription: Optional[str] = None
+    Product: Optional[str] = Field(None, max_length=100)
+    Component: Optional[str] = Field(None, max_length=100)
+    Severity: Optional[str] = Field(None, max_length=20)
+    Priority: Optional[str] = Field(None, max_length=20)
+    CustomerTier: Optional[str] = Field(None, max_length=50)
+    SLAImpact: Optional[str] = Field(None, max_length=50)
+    Environment: Optional[str] = Field(None, max_length=50)
+    Region: Optional[str] = Field(None, max_length=50)
+    Tenant: Optional[str] = Field(None, max_length=100)
+    ErrorCodes: Optional[str] = None
+    ErrorMessage: Optional[str] = None
+    StackTrace: Optional[str] = None
+    AttachmentsJson: Optional[str] = None
+    LogLinksJson: Optional[str] = None
+    TroubleshootingSteps: Optional[str] = None
+    CaseStatus: Optional[str] = Field(None, max_length=50)
+    ResolutionNotes: Optional[str] = None
+    AssignedTeam: Optional[str] = Field(None, max_length=100)
+    AssignedTo: Optional[str] = Field(None, max_length=100)
+    Account: Optional[str] = Field(None, max_length=100)
+    Tags: Optional[str] = None
+    ICMNumber: Optional[str] = Field(None, max_length=100)
+    ICMOpenedDate: Optional[datetime] = None
+    ICMDescription: Optional[str] = None
+    DaysDelayedBeforeICM: Optional[int] = None
+
+
 class Case(CaseBase):
     CaseID: int
     CreatedDate: datetime
     ModifiedDate: Optional[datetime] = None
+    # SimHash of the error fields (fingerprint.py), set by the repository
+    Fingerprint: Optional[int] = None
     
     class Config:
         from_attributes = True
 
 
+class BulkCaseError(BaseModel):
+    index: int
+    error: str
+
+
+class BulkCaseResponse(BaseModel):
+    received: int
+    created: int
+    failed: int
+    case_ids: List[Optional[int]]
+    errors: List[BulkCaseError]
+
+
+class CasePage(BaseModel):
+    items: List[Dict[str, Any]]
+    next_cursor: Optional[str] = None
+
+
 class SimilarCase(BaseModel):
     case: Case
     similarity_score: float
 
 
+class CaseFilters(BaseModel):
+    """Restrict similarity search to matching cases (exact, case-insensitive values)"""
+    product: Optional[str] = None
+    component: Optional[str] = None
+    severity: Optional[str] = None
+    status: Optional[str] = None
+    region: Optional[str] = None
+    created_after: Optional[datetime] = None
+    has_icm: Optional[bool] = None
+
+
 class RecommendationRequest(BaseModel):
     case_title: str
     case_description: str
     product: Optional[str] = None
     error_message: Optional[str] = None
+    error_codes: Optional[str] = None
     stack_trace: Optional[str] = None
     top_k: int = Field(5, ge=1, le=20)
+    filters: Optional[CaseFilters] = None
 
 
 class ICMStatistics(BaseModel):
@@ -68,12 +131,32 @@ class ICMStatistics(BaseModel):
     review_period_months: int = 6
 
 
+class ICMRollupRow(BaseModel):
+    product: Optional[str] = None
+    month: str
+    total_cases: int
+    cases_with_icm: int
+    average_delay_days: float
+
+
+class ICMRollupResponse(BaseModel):
+    months: int
+    rows: List[ICMRollupRow]
+
+
+class DuplicateCase(BaseModel):
+    case_id: int
+    distance: int  # differing fingerprint bits, 0 for an exact duplicate
+
+
 class RecommendationResponse(BaseModel):
     similar_cases: List[SimilarCase]
     alert_threshold_reached: bool  # >= 0.75
     recommend_icm: bool  # >= 0.80
     highest_similarity: float
     icm_statistics: Optional[ICMStatistics] = None
+    # Cases with the same (or a near-identical) error, closest first
+    duplicate_cases: List[DuplicateCase] = []
 
 
 class HealthResponse(BaseModel):
@@ -81,3 +164,18 @@ class HealthResponse(BaseModel):
     timestamp: datetime
     database: str
     model_loaded: bool
+
+
+class WarmUpStage(BaseModel):
+    status: str
+    attempts: int
+    seconds: Optional[float] = None
+    detail: Optional[str] = None
+
+
+class ReadinessResponse(BaseModel):
+    ready: bool
+    model_loaded: bool
+    index_warm: bool
+    indexed_cases: int
+    stages: Dict[str, WarmUpStage]
@@ -0,0 +1,85 @@
+from datetime import datetime
+from typing import List, Optional, Tuple
+import base64
+import json
+
+from models import Case
+
+# Columns GET /cases returns when no fields= selector is given: enough to
+# render a case list without pulling the NVARCHAR(MAX) text columns (keep in
+# sync with the INCLUDE list of IX_Cases_CreatedDate_CaseID in schema.sql)
+SUMMARY_FIELDS = (
+    "CaseID",
+    "CaseTitle",
+    "Product",
+    "Component",
+    "Severity",
+    "Priority",
+    "CaseStatus",
+    "Region",
+    "AssignedTeam",
+    "AssignedTo",
+    "ICMNumber",
+    "CreatedDate",
+    "ModifiedDate"
+)
+
+# Columns a fields= selector may name (also the allowlist for the SELECT list)
+CASE_FIELDS = tuple(Case.model_fields)
+
+# Always selected: they make up the keyset cursor
+KEY_FIELDS = ("CreatedDate", "CaseID")
+
+
+class CursorError(ValueError):
+    """Raised for a malformed pagination cursor or fields selector"""
+
+
+def parse_fields(fields: Optional[str]) -> List[str]:
+    """
+    Resolve a fields= selector to icm.Cases column names
+
+    None or "summary" gives SUMMARY_FIELDS, "all" every column; otherwise a
+    comma-separated list of Case field names. CaseID and CreatedDate are
+    always included.
+    """
+    if not fields or fields == "summary":
+        selected = list(SUMMARY_FIELDS)
+    elif fields == "all":
+        selected = list(CASE_FIELDS)
+    else:
+        selected = [name.strip() for name in fields.split(",") if name.strip()]
+        unknown = [name for name in selected if name not in CASE_FIELDS]
+        if unknown:
+            raise CursorError(f"Unknown fields: {', '.join(unknown)}")
+
+    for name in reversed(KEY_FIELDS):
+        if name not in selected:
+            selected.insert(0, name)
+    return list(dict.fromkeys(selected))
+
+
+def cursor_key(row: dict) -> Tuple[str, int]:
+    """(CreatedDate ISO string, CaseID) keyset position of a row"""
+    created = row["CreatedDate"]
+    if isinstance(created, datetime):
+        # DATETIME is only accurate to ~3 ms; milliseconds round-trip exactly
+        created = created.isoformat(timespec="milliseconds")
+    return created, int(row["CaseID"])
+
+
+def encode_cursor(row: dict) -> str:
+    """Opaque cursor pointing after row (ordered by CreatedDate DESC, CaseID DESC)"""
+    payload = json.dumps(list(cursor_key(row)), separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    """Keyset position (see cursor_key) of a cursor from encode_cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created, case_id = json.loads(base64.urlsafe_b64decode(padded))
+        datetime.fromisoformat(created)
+        return created, int(case_id)
+    except (ValueError, TypeError) as e:
+        raise CursorError(f"Invalid cursor: {cursor}") from e
@@ -9,7 +9,8 @@ from dotenv import load_dotenv
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from db import db_manager
-from repository import CaseRepository
+from repository import case_repository
+from embedding_store import embedding_store
 from models import CaseCreate
 
 load_dotenv()
@@ -87,7 +88,8 @@ def populate_database():
         
         for idx, case_data in enumerate(sample_cases, 1):
             case = CaseCreate(**case_data)
-            created = CaseRepository.create_case(db, case)
+            created = case_repository.create_case(db, case)
+            embedding_store.index_case(db, created)
             print(f"✓ Created case #{created.CaseID}: {created.CaseTitle}")
         
         print(f"\n✓ Successfully created {len(sample_cases)} sample cases")
@@ -0,0 +1,79 @@
+from typing import Callable, Dict, List, Optional, Tuple
+import threading
+import time
+
+from metrics import metrics
+
+startup_stage_seconds = metrics.gauge(
+    "icm_startup_stage_seconds",
+    "Wall time of the last attempt of each background warm-up stage",
+    ["stage"]
+)
+
+
+class WarmUp:
+    """
+    Runs the slow start-up stages (model load, vector index warm-up) on
+    background threads so the worker can answer /health immediately
+
+    Each stage is retried every retry_seconds until it succeeds, so a database
+    that is still unreachable at start-up does not leave the worker unready for
+    good. Progress is exposed through status() for /ready.
+    """
+
+    def __init__(self, retry_seconds: float = 10.0):
+        self.retry_seconds = retry_seconds
+        self._stages: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def start(self, stages: List[Tuple[str, Callable[[], Optional[str]]]]):
+        """
+        Run independent stages concurrently, one daemon thread each
+
+        Each stage is a (name, fn) pair; fn may return a short progress detail.
+        Model loading is CPU-bound and index warm-up waits on the database, so
+        running them side by side shortens the cold start.
+        """
+        with self._lock:
+            for name, _ in stages:
+                self._stages[name] = {"status": "pending", "attempts": 0, "seconds": None, "detail": None}
+        for name, fn in stages:
+            threading.Thread(target=self._run, args=(name, fn), name=f"warm-up-{name}", daemon=True).start()
+
+    def stop(self):
+        """Stop retrying (a stage already running finishes in the background)"""
+        self._stopped.set()
+
+    def status(self) -> Dict[str, dict]:
+        """Copy of the per-stage status, attempt count, duration and detail"""
+        with self._lock:
+            return {name: dict(stage) for name, stage in self._stages.items()}
+
+    def _run(self, name: str, fn: Callable[[], Optional[str]]):
+        while not self._stopped.is_set():
+            self._update(name, status="loading")
+            start = time.perf_counter()
+            try:
+                detail = fn()
+            except Exception as e:
+                self._update(name, status="failed", seconds=time.perf_counter() - start, detail=str(e))
+                print(f"Warm-up stage '{name}' failed, retrying in {self.retry_seconds}s: {e}")
+                self._stopped.wait(self.retry_seconds)
+                continue
+
+            seconds = time.perf_counter() - start
+            self._update(name, status="ready", seconds=seconds, detail=detail)
+            print(f"Warm-up stage '{name}' ready in {seconds:.1f}s")
+            return
+
+    def _update(self, name: str, status: str, seconds: Optional[float] = None, detail: Optional[str] = None):
+        with self._lock:
+            stage = self._stages[name]
+            stage["status"] = status
+            if status == "loading":
+                stage["attempts"] += 1
+            else:
+                stage["seconds"] = round(seconds, 3)
+                stage["detail"] = detail
+                startup_stage_seconds.set(seconds, stage=name)
@@ -0,0 +1,237 @@
+"""
+(Re)build stored embeddings by streaming icm.Cases in keyset-paginated chunks
+
+Each chunk of --chunk-size cases is fetched (CaseID > last CaseID), encoded
+and written with one batched MERGE and one commit, so memory stays bounded
+by the chunk size whatever the corpus size. After every committed chunk the
+last CaseID is saved to a checkpoint file; an interrupted run resumes from
+there. Running API workers pick the new vectors up on their next refresh.
+
+Run after applying database/add_case_embeddings_migration.sql, after loading
+database/sample_data.sql, or after changing EMBEDDING_MODEL / EMBEDDING_MODEL_VERSION.
+With FIELD_EMBEDDINGS=true, --mode changed also adds the per-field chunk vectors.
+
+Usage:
+    python reindex.py                   # cases without an embedding
+    python reindex.py --mode changed    # also re-embed cases whose text changed
+    python reindex.py --mode all        # re-embed every case
+    python reindex.py --workers 4       # encode chunks in 4 processes
+    python reindex.py --restart         # ignore an existing checkpoint
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+load_dotenv()
+
+from db import db_manager
+from embedder import embedding_service
+from repository import embedding_repository
+
+MODES = ("missing", "changed", "all")
+
+
+def default_checkpoint_path(mode: str) -> str:
+    model = embedding_service.model_name.replace("/", "_")
+    return os.path.join(".cache", f"reindex_{model}_v{embedding_service.model_version}_{mode}.json")
+
+
+class Checkpoint:
+    """Last committed CaseID and running counts, saved atomically after every chunk"""
+
+    def __init__(self, path: str, mode: str):
+        self.path = path
+        self.state = {
+            "model_name": embedding_service.model_name,
+            "model_version": embedding_service.model_version,
+            "mode": mode,
+            "last_case_id": 0,
+            "scanned": 0,
+            "written": 0
+        }
+
+    def load(self) -> bool:
+        """Resume from the checkpoint file if it matches this model and mode"""
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if any(state.get(key) != self.state[key] for key in ("model_name", "model_version", "mode")):
+            print(f"Ignoring checkpoint {self.path}: written for another model or mode")
+            return False
+        self.state.update(state)
+        return True
+
+    def advance(self, last_case_id: int, scanned: int, written: int):
+        self.state["last_case_id"] = last_case_id
+        self.state["scanned"] += scanned
+        self.state["written"] += written
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def _init_worker():
+    """Load the model once per encoding process"""
+    embedding_service.load_model()
+
+
+def _encode(texts, segments):
+    return embedding_service.encode_cases(texts, segments)
+
+
+def _pending(cases, mode: str):
+    """Cases of a chunk that need a new embedding, with their text, field segments and text hash"""
+    pending = []
+    for case in cases:
+        case_text = embedding_service.create_text_for_case(case)
+        segments = embedding_service.create_case_segments(case)
+        text_hash = embedding_service.document_hash(case_text, segments)
+        if mode == "changed" and case["TextHash"] == text_hash:
+            continue
+        pending.append((case["CaseID"], case_text, segments, text_hash))
+    return pending
+
+
+def reindex(mode: str, chunk_size: int, workers: int, checkpoint_path: str, restart: bool):
+    """Stream every case in CaseID order and store embeddings chunk by chunk"""
+    db_manager.initialize()
+    db = db_manager.get_session()
+    checkpoint = Checkpoint(checkpoint_path, mode)
+    if restart:
+        checkpoint.clear()
+    elif checkpoint.load():
+        print(f"Resuming after CaseID {checkpoint.state['last_case_id']} "
+              f"({checkpoint.state['written']} embeddings already written)")
+
+    pool = None
+    if workers > 1:
+        # spawn: forking a process that already holds torch/ORT threads is unsafe
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker
+        )
+    else:
+        embedding_service.load_model()
+
+    # Chunks encoded but not yet written, oldest first; bounded so at most
+    # 2 x workers chunks are in memory and the checkpoint only moves forward
+    in_flight = deque()
+    max_in_flight = 2 * workers if pool else 0
+    start = time.perf_counter()
+
+    def write_oldest():
+        last_case_id, scanned, pending, result = in_flight.popleft()
+        if pending:
+            embeddings, field_vectors = result.result() if pool else result
+            embedding_repository.upsert_embeddings(
+                db,
+                embedding_service.model_name,
+                embedding_service.model_version,
+                [
+                    {
+                        "case_id": case_id,
+                        "dimension": int(embedding.shape[-1]),
+                        "text_hash": text_hash,
+                        "embedding": embedding_service.to_bytes(embedding),
+                        "field_embeddings": (
+                            embedding_service.field_vectors_to_bytes(*case_field_vectors)
+                            if case_field_vectors is not None else None
+                        )
+                    }
+                    for (case_id, _, _, text_hash), embedding, case_field_vectors
+                    in zip(pending, embeddings, field_vectors)
+                ]
+            )
+        checkpoint.advance(last_case_id, scanned, len(pending))
+        elapsed = time.perf_counter() - start
+        print(f"Scanned {checkpoint.state['scanned']} cases, wrote {checkpoint.state['written']} embeddings "
+              f"(up to CaseID {last_case_id}, {elapsed:.0f}s)")
+
+    try:
+        print(f"Reindexing ({mode}) with {embedding_service.model_name} "
+              f"(version {embedding_service.model_version})...")
+        after_case_id = checkpoint.state["last_case_id"]
+
+        while True:
+            cases = embedding_repository.get_cases_for_embedding(
+                db,
+                embedding_service.model_name,
+                embedding_service.model_version,
+                after_case_id=after_case_id,
+                limit=chunk_size,
+                missing_only=mode == "missing"
+            )
+            if not cases:
+                break
+            after_case_id = cases[-1]["CaseID"]
+
+            pending = _pending(cases, mode)
+            texts = [case_text for _, case_text, _, _ in pending]
+            segments = [case_segments for _, _, case_segments, _ in pending]
+            result = None
+            if texts:
+                result = pool.submit(_encode, texts, segments) if pool else _encode(texts, segments)
+            in_flight.append((after_case_id, len(cases), pending, result))
+
+            while len(in_flight) > max_in_flight:
+                write_oldest()
+
+        while in_flight:
+            write_oldest()
+
+        print(f"\n✓ Successfully stored {checkpoint.state['written']} embeddings "
+              f"({checkpoint.state['scanned']} cases scanned)")
+        checkpoint.clear()
+
+    except Exception as e:
+        print(f"✗ Error: {e}")
+        print(f"  Rerun to resume after CaseID {checkpoint.state['last_case_id']}")
+        db.rollback()
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=MODES, default="missing",
+                        help="missing: cases without an embedding; changed: also cases whose text changed; "
+                             "all: every case (default: missing)")
+    parser.add_argument("--chunk-size", type=int, default=256,
+                        help="Cases fetched, encoded and committed together (default: 256)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Encoding processes; 1 encodes in this process (default: 1)")
+    parser.add_argument("--checkpoint",
+                        help="Checkpoint file (default: .cache/reindex_<model>_v<version>_<mode>.json)")
+    parser.add_argument("--restart", action="store_true",
+                        help="Ignore an existing checkpoint and start from the first case")
+    args = parser.parse_args()
+
+    if args.chunk_size < 1 or args.workers < 1:
+        parser.error("--chunk-size and --workers must be at least 1")
+
+    reindex(args.mode, args.chunk_size, args.workers,
+            args.checkpoint or default_checkpoint_path(args.mode), args.restart)
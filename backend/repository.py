@@ -1,15 +1,162 @@
+from abc import ABC, abstractmethod
 from sqlalchemy.orm import Session
-from sqlalchemy import text
-from typing import List, Optional
+from sqlalchemy import text, bindparam
+from typing import Dict, Iterable, List, Optional, Tuple
 from models import CaseCreate, Case
 from datetime import datetime
+import calendar
 
+from db import db_manager
+from fingerprint import ERROR_FIELDS, case_fingerprint
 
-class CaseRepository:
-    """Repository for database operations on Cases table"""
+
+class CaseRepository(ABC):
+    """
+    Repository for database operations on Cases table
+    
+    Queries in portable SQL are implemented here; statements that need the
+    dialect's syntax for returning written rows, the current time or row
+    limits are implemented per DATABASE_BACKEND (MssqlCaseRepository, and
+    SqliteCaseRepository in sqlite_repository.py). Use case_repository.
+    """
+    
+    # SQL expression of the current time in the dialect (as written to ModifiedDate)
+    NOW_SQL = "CURRENT_TIMESTAMP"
+    
+    @abstractmethod
+    def create_case(self, db: Session, case_data: CaseCreate) -> Case:
+        """Insert a new case into icm.Cases table"""
+    
+    @abstractmethod
+    def create_cases(self, db: Session, cases: List[CaseCreate]) -> List[Case]:
+        """
+        Insert many cases in one transaction
+        
+        Returns:
+            Created cases in the order given; nothing is committed if any row
+            fails (the caller rolls back)
+        """
+    
+    def get_case_by_id(self, db: Session, case_id: int) -> Optional[Case]:
+        """Get a case by ID"""
+        query = text("SELECT * FROM icm.Cases WHERE CaseID = :case_id")
+        result = db.execute(query, {"case_id": case_id})
+        row = result.fetchone()
+        
+        if row:
+            return Case.model_validate(dict(row._mapping))
+        return None
+    
+    def get_cases_by_ids(self, db: Session, case_ids: Iterable[int]) -> Dict[int, Case]:
+        """
+        Get many cases in one parameterized query
+        Returns dict keyed by CaseID in the order the IDs were given (e.g. ranking
+        order); IDs that do not exist are absent
+        """
+        case_ids = list(dict.fromkeys(case_ids))
+        found = {}
+        
+        # SQL Server allows ~2100 parameters per statement
+        query = text("SELECT * FROM icm.Cases WHERE CaseID IN :case_ids").bindparams(
+            bindparam("case_ids", expanding=True)
+        )
+        for start in range(0, len(case_ids), 2000):
+            result = db.execute(query, {"case_ids": case_ids[start:start + 2000]})
+            for row in result:
+                case = Case.model_validate(dict(row._mapping))
+                found[case.CaseID] = case
+        
+        return {case_id: found[case_id] for case_id in case_ids if case_id in found}
+    
+    @abstractmethod
+    def get_cases_page(
+        self,
+        db: Session,
+        columns: List[str],
+        limit: int,
+        after: Optional[Tuple[str, int]] = None
+    ) -> List[dict]:
+        """
+        Get one page of cases, newest first, as dicts of the given columns
+        
+        Keyset pagination: `after` is the (CreatedDate, CaseID) of the last row
+        of the previous page, so every page is one seek on the
+        (CreatedDate DESC, CaseID DESC) index however deep it is. Column names
+        must come from pagination.parse_fields (they are interpolated into the
+        SELECT list).
+        """
+    
+    @abstractmethod
+    def update_case(self, db: Session, case_id: int, updates: dict) -> Optional[Case]:
+        """Update a case with given fields (None values are left unchanged)"""
+    
+    def delete_case(self, db: Session, case_id: int) -> bool:
+        """Delete a case by ID"""
+        query = text("DELETE FROM icm.Cases WHERE CaseID = :case_id")
+        result = db.execute(query, {"case_id": case_id})
+        db.commit()
+        return result.rowcount > 0
+    
+    def set_fingerprints(self, db: Session, fingerprints: Dict[int, Optional[int]]) -> None:
+        """
+        Store error fingerprints by CaseID in one executemany and one commit
+        
+        ModifiedDate moves too, so vector index refreshes pick them up.
+        """
+        if not fingerprints:
+            return
+        query = text(f"""
+            UPDATE icm.Cases
+            SET Fingerprint = :fingerprint, ModifiedDate = {self.NOW_SQL}
+            WHERE CaseID = :case_id
+        """)
+        db.execute(query, [
+            {"case_id": case_id, "fingerprint": value}
+            for case_id, value in fingerprints.items()
+        ])
+        db.commit()
+    
+    @staticmethod
+    def _insert_params(case_data: CaseCreate) -> dict:
+        """INSERT parameters of a case: its fields and its error fingerprint"""
+        params = case_data.model_dump()
+        params["Fingerprint"] = case_fingerprint(params)
+        return params
     
     @staticmethod
-    def create_case(db: Session, case_data: CaseCreate) -> Case:
+    def _refresh_fingerprint(db: Session, row: dict, updates: dict) -> dict:
+        """Recompute the fingerprint of an updated row whose error fields changed (before the commit)"""
+        if all(updates.get(field) is None for field in ERROR_FIELDS):
+            return row
+        value = case_fingerprint(row)
+        if value != row.get("Fingerprint"):
+            db.execute(
+                text("UPDATE icm.Cases SET Fingerprint = :fingerprint WHERE CaseID = :case_id"),
+                {"case_id": row["CaseID"], "fingerprint": value}
+            )
+            row["Fingerprint"] = value
+        return row
+    
+    @staticmethod
+    def _set_clauses(case_id: int, updates: dict) -> Tuple[List[str], dict]:
+        """SET clauses and parameters of an UPDATE for the non-None updates"""
+        set_clauses = []
+        params = {"case_id": case_id}
+        
+        for key, value in updates.items():
+            if value is not None:
+                set_clauses.append(f"{key} = :{key}")
+                params[key] = value
+        
+        return set_clauses, params
+
+
+class MssqlCaseRepository(CaseRepository):
+    """CaseRepository for SQL Server / Azure SQL (T-SQL)"""
+    
+    NOW_SQL = "GETDATE()"
+    
+    def create_case(self, db: Session, case_data: CaseCreate) -> Case:
         """Insert a new case into icm.Cases table"""
         query = text("""
             INSERT INTO icm.Cases (
@@ -18,7 +165,7 @@ class CaseRepository:
                 ErrorMessage, StackTrace, AttachmentsJson, LogLinksJson,
                 TroubleshootingSteps, CaseStatus, ResolutionNotes, AssignedTeam,
                 AssignedTo, Account, Tags, ICMNumber, ICMOpenedDate, ICMDescription,
-                DaysDelayedBeforeICM, CreatedDate
+                DaysDelayedBeforeICM, Fingerprint, CreatedDate
             )
             OUTPUT INSERTED.*
             VALUES (
@@ -27,86 +174,91 @@ class CaseRepository:
                 :ErrorMessage, :StackTrace, :AttachmentsJson, :LogLinksJson,
                 :TroubleshootingSteps, :CaseStatus, :ResolutionNotes, :AssignedTeam,
                 :AssignedTo, :Account, :Tags, :ICMNumber, :ICMOpenedDate, :ICMDescription,
-                :DaysDelayedBeforeICM, GETDATE()
+                :DaysDelayedBeforeICM, :Fingerprint, GETDATE()
             )
         """)
         
-        result = db.execute(query, case_data.model_dump())
+        result = db.execute(query, self._insert_params(case_data))
         db.commit()
         
         row = result.fetchone()
         return Case.model_validate(dict(row._mapping))
     
-    @staticmethod
-    def get_case_by_id(db: Session, case_id: int) -> Optional[Case]:
-        """Get a case by ID"""
-        query = text("SELECT * FROM icm.Cases WHERE CaseID = :case_id")
-        result = db.execute(query, {"case_id": case_id})
-        row = result.fetchone()
-        
-        if row:
-            return Case.model_validate(dict(row._mapping))
-        return None
-    
-    @staticmethod
-    def get_all_cases(
-        db: Session,
-        limit: Optional[int] = None,
-        offset: int = 0
-    ) -> List[Case]:
-        """Get all cases with optional pagination"""
-        query_str = "SELECT * FROM icm.Cases ORDER BY CreatedDate DESC"
+    def create_cases(self, db: Session, cases: List[CaseCreate]) -> List[Case]:
+        """
+        Rows are sent to a #CaseStaging temp table with one executemany (a
+        single round trip with fast_executemany) and moved into icm.Cases by
+        one MERGE, whose OUTPUT carries the staging row number so the new
+        CaseIDs map back to the input order.
+        """
+        if not cases:
+            return []
+        columns = [*CaseCreate.model_fields, "Fingerprint"]
         
-        if limit:
-            query_str += f" OFFSET {offset} ROWS FETCH NEXT {limit} ROWS ONLY"
+        db.execute(text("DROP TABLE IF EXISTS #CaseStaging"))
+        # Same column types as icm.Cases, without the identity and defaults
+        db.execute(text(f"""
+            SELECT TOP 0 CAST(0 AS INT) AS RowNo, {", ".join(columns)}
+            INTO #CaseStaging
+            FROM icm.Cases
+        """))
+        db.execute(
+            text(f"""
+                INSERT INTO #CaseStaging (RowNo, {", ".join(columns)})
+                VALUES (:RowNo, {", ".join(":" + column for column in columns)})
+            """),
+            [{"RowNo": row_no, **self._insert_params(case)} for row_no, case in enumerate(cases)]
+        )
+        result = db.execute(text(f"""
+            MERGE icm.Cases AS target
+            USING #CaseStaging AS source
+            ON 1 = 0
+            WHEN NOT MATCHED THEN
+                INSERT ({", ".join(columns)}, CreatedDate)
+                VALUES ({", ".join("source." + column for column in columns)}, GETDATE())
+            OUTPUT source.RowNo, INSERTED.*;
+        """))
         
-        query = text(query_str)
-        result = db.execute(query)
+        created = {}
+        for row in result:
+            row = dict(row._mapping)
+            created[row.pop("RowNo")] = Case.model_validate(row)
+        db.execute(text("DROP TABLE #CaseStaging"))
+        db.commit()
         
-        return [Case.model_validate(dict(row._mapping)) for row in result]
+        return [created[row_no] for row_no in range(len(cases))]
     
-    @staticmethod
-    def get_cases_for_similarity_search(
+    def get_cases_page(
+        self,
         db: Session,
-        exclude_case_id: Optional[int] = None
+        columns: List[str],
+        limit: int,
+        after: Optional[Tuple[str, int]] = None
     ) -> List[dict]:
-        """
-        Get cases with relevant fields for similarity computation
-        Returns list of dicts with CaseID and text fields
-        """
-        query_str = """
-            SELECT 
-                CaseID,
-                CaseTitle,
-                CaseDescription,
-                Product,
-                ErrorMessage,
-                StackTrace
-            FROM icm.Cases
-        """
-        
-        if exclude_case_id:
-            query_str += f" WHERE CaseID != {exclude_case_id}"
-        
-        query = text(query_str)
-        result = db.execute(query)
+        where = ""
+        params = {"limit": limit}
+        if after:
+            # Compare as DATETIME: a datetime2 parameter would not equal the
+            # stored value (DATETIME ticks are 1/300 s) and rows would be skipped
+            where = """
+            WHERE CreatedDate < CAST(:after_created AS DATETIME)
+                OR (CreatedDate = CAST(:after_created AS DATETIME) AND CaseID < :after_case_id)
+            """
+            params.update(after_created=after[0], after_case_id=after[1])
         
+        query = text(f"""
+            SELECT TOP (:limit) {", ".join(columns)}
+            FROM icm.Cases
+            {where}
+            ORDER BY CreatedDate DESC, CaseID DESC
+        """)
+        result = db.execute(query, params)
         return [dict(row._mapping) for row in result]
     
-    @staticmethod
-    def update_case(db: Session, case_id: int, updates: dict) -> Optional[Case]:
-        """Update a case with given fields"""
-        # Build dynamic UPDATE query
-        set_clauses = []
-        params = {"case_id": case_id}
-        
-        for key, value in updates.items():
-            if value is not None:
-                set_clauses.append(f"{key} = :{key}")
-                params[key] = value
-        
+    def update_case(self, db: Session, case_id: int, updates: dict) -> Optional[Case]:
+        set_clauses, params = self._set_clauses(case_id, updates)
         if not set_clauses:
-            return CaseRepository.get_case_by_id(db, case_id)
+            return self.get_case_by_id(db, case_id)
         
         set_clauses.append("ModifiedDate = GETDATE()")
         
@@ -119,55 +271,265 @@ class CaseRepository:
         
         query = text(query_str)
         result = db.execute(query, params)
+        row = result.fetchone()
+        if row:
+            row = self._refresh_fingerprint(db, dict(row._mapping), updates)
         db.commit()
         
-        row = result.fetchone()
         if row:
-            return Case.model_validate(dict(row._mapping))
+            return Case.model_validate(row)
         return None
+
+
+def subtract_months(value: datetime, months: int) -> datetime:
+    """Calendar month arithmetic matching T-SQL DATEADD(MONTH, -months, value)"""
+    month_index = value.year * 12 + value.month - 1 - months
+    year, month = divmod(month_index, 12)
+    month += 1
+    return value.replace(year=year, month=month, day=min(value.day, calendar.monthrange(year, month)[1]))
+
+
+class EmbeddingRepository(ABC):
+    """
+    Repository for the persistent per-case embedding store (icm.CaseEmbeddings)
     
-    @staticmethod
-    def delete_case(db: Session, case_id: int) -> bool:
-        """Delete a case by ID"""
-        query = text("DELETE FROM icm.Cases WHERE CaseID = :case_id")
-        result = db.execute(query, {"case_id": case_id})
-        db.commit()
-        return result.rowcount > 0
+    Implemented per DATABASE_BACKEND like CaseRepository; use embedding_repository.
+    """
     
-    @staticmethod
-    def get_icm_statistics(db: Session, similar_case_ids: List[int], months: int = 6) -> dict:
-        """Get ICM statistics for similar cases from the last N months"""
-        if not similar_case_ids:
-            return {
-                "total_similar_cases_reviewed": 0,
-                "cases_with_icm": 0,
-                "average_delay_days": 0.0
-            }
+    def get_text_hash(
+        self,
+        db: Session,
+        case_id: int,
+        model_name: str,
+        model_version: str
+    ) -> Optional[str]:
+        """Get the source text hash of a case's stored embedding for the given model"""
+        query = text("""
+            SELECT TextHash
+            FROM icm.CaseEmbeddings
+            WHERE CaseID = :case_id
+                AND ModelName = :model_name
+                AND ModelVersion = :model_version
+        """)
+        result = db.execute(query, {
+            "case_id": case_id,
+            "model_name": model_name,
+            "model_version": model_version
+        })
+        row = result.fetchone()
+        return row.TextHash if row else None
+    
+    def upsert_embedding(
+        self,
+        db: Session,
+        case_id: int,
+        model_name: str,
+        model_version: str,
+        text_hash: str,
+        embedding: bytes,
+        dimension: int,
+        field_embeddings: Optional[bytes] = None
+    ) -> None:
+        """Insert or replace the stored embedding of a case"""
+        self.upsert_embeddings(db, model_name, model_version, [{
+            "case_id": case_id,
+            "dimension": dimension,
+            "text_hash": text_hash,
+            "embedding": embedding,
+            "field_embeddings": field_embeddings
+        }])
+    
+    @abstractmethod
+    def upsert_embeddings(self, db: Session, model_name: str, model_version: str, rows: List[dict]) -> None:
+        """
+        Insert or replace many stored embeddings in one executemany and one commit
+        
+        Args:
+            rows: Dicts with case_id, dimension, text_hash, embedding (bytes) and
+                field_embeddings (bytes or None, see EmbeddingService.field_vectors_to_bytes)
+        """
+    
+    def get_embeddings(
+        self,
+        db: Session,
+        model_name: str,
+        model_version: str,
+        modified_since: Optional[datetime] = None
+    ) -> List[dict]:
+        """
+        Get stored embeddings for the given model with the case attributes used for filtering
+        Returns list of dicts with CaseID, Embedding, FieldEmbeddings, Product, Component, Severity,
+        CaseStatus, Region, CreatedDate, ICMNumber, DaysDelayedBeforeICM, Fingerprint and ModifiedDate (the later of the
+        embedding's and the case's), optionally limited to rows where either was
+        written at or after `modified_since`
+        """
+        query_str = """
+            SELECT
+                e.CaseID,
+                e.Embedding,
+                e.FieldEmbeddings,
+                c.Product,
+                c.Component,
+                c.Severity,
+                c.CaseStatus,
+                c.Region,
+                c.CreatedDate,
+                c.ICMNumber,
+                c.DaysDelayedBeforeICM,
+                c.Fingerprint,
+                CASE
+                    WHEN c.ModifiedDate > e.ModifiedDate THEN c.ModifiedDate
+                    ELSE e.ModifiedDate
+                END AS ModifiedDate
+            FROM icm.CaseEmbeddings e
+            INNER JOIN icm.Cases c ON c.CaseID = e.CaseID
+            WHERE e.ModelName = :model_name
+                AND e.ModelVersion = :model_version
+        """
+        params = {"model_name": model_name, "model_version": model_version}
         
-        case_ids_str = ','.join(map(str, similar_case_ids))
+        if modified_since is not None:
+            # Cases.ModifiedDate catches attribute changes that kept the embedding
+            query_str += " AND (e.ModifiedDate >= :modified_since OR c.ModifiedDate >= :modified_since)"
+            params["modified_since"] = modified_since
         
-        query = text(f"""
-            SELECT 
-                COUNT(*) as total_cases,
-                COUNT(ICMNumber) as cases_with_icm,
-                AVG(CAST(DaysDelayedBeforeICM as FLOAT)) as avg_delay
-            FROM icm.Cases
-            WHERE CaseID IN ({case_ids_str})
-                AND CreatedDate >= DATEADD(MONTH, -{months}, GETDATE())
+        query = text(query_str + " ORDER BY e.CaseID")
+        result = db.execute(query, params)
+        return [dict(row._mapping) for row in result]
+    
+    def get_embedded_case_ids(self, db: Session, model_name: str, model_version: str) -> List[int]:
+        """Get the CaseIDs that have a stored embedding for the given model"""
+        query = text("""
+            SELECT CaseID
+            FROM icm.CaseEmbeddings
+            WHERE ModelName = :model_name
+                AND ModelVersion = :model_version
         """)
+        result = db.execute(query, {
+            "model_name": model_name,
+            "model_version": model_version
+        })
+        return [row.CaseID for row in result]
+    
+    def get_embedding_checksum(self, db: Session, model_name: str, model_version: str) -> Tuple[int, int]:
+        """
+        Count and CaseID sum of the stored embeddings for the given model
+
+        CaseIDs are never reused, so a case deleted and another created
+        between two reads still changes the sum when the count stays put.
+        """
+        query = text("""
+            SELECT COUNT(*) AS total, COALESCE(SUM(CAST(CaseID AS BIGINT)), 0) AS id_sum
+            FROM icm.CaseEmbeddings
+            WHERE ModelName = :model_name
+                AND ModelVersion = :model_version
+        """)
+        row = db.execute(query, {
+            "model_name": model_name,
+            "model_version": model_version
+        }).fetchone()
+        return int(row.total), int(row.id_sum)
+    
+    @abstractmethod
+    def get_cases_for_embedding(
+        self,
+        db: Session,
+        model_name: str,
+        model_version: str,
+        after_case_id: int = 0,
+        limit: int = 256,
+        missing_only: bool = True
+    ) -> List[dict]:
+        """
+        Get the next keyset chunk of cases to (re)embed for the given model
         
-        result = db.execute(query)
-        row = result.fetchone()
-        
-        if row:
-            return {
-                "total_similar_cases_reviewed": row.total_cases or 0,
-                "cases_with_icm": row.cases_with_icm or 0,
-                "average_delay_days": float(row.avg_delay) if row.avg_delay else 0.0
-            }
-        
-        return {
-            "total_similar_cases_reviewed": 0,
-            "cases_with_icm": 0,
-            "average_delay_days": 0.0
-        }
+        Returns up to `limit` dicts ordered by CaseID with CaseID, the text fields
+        used by create_case_text and TextHash (None when the case has no stored
+        embedding). StackTrace is cut by the database to the 1000 characters
+        create_case_text keeps.
+        """
+
+
+class MssqlEmbeddingRepository(EmbeddingRepository):
+    """EmbeddingRepository for SQL Server / Azure SQL (T-SQL)"""
+    
+    def upsert_embeddings(self, db: Session, model_name: str, model_version: str, rows: List[dict]) -> None:
+        if not rows:
+            return
+        # The CAST lets a NULL FieldEmbeddings (bound as a character type) into VARBINARY(MAX)
+        query = text("""
+            MERGE icm.CaseEmbeddings AS target
+            USING (SELECT :case_id AS CaseID) AS source
+            ON target.CaseID = source.CaseID
+            WHEN MATCHED THEN
+                UPDATE SET
+                    ModelName = :model_name,
+                    ModelVersion = :model_version,
+                    Dimension = :dimension,
+                    TextHash = :text_hash,
+                    Embedding = :embedding,
+                    FieldEmbeddings = CAST(:field_embeddings AS VARBINARY(MAX)),
+                    ModifiedDate = GETDATE()
+            WHEN NOT MATCHED THEN
+                INSERT (CaseID, ModelName, ModelVersion, Dimension, TextHash, Embedding, FieldEmbeddings)
+                VALUES (:case_id, :model_name, :model_version, :dimension, :text_hash, :embedding,
+                        CAST(:field_embeddings AS VARBINARY(MAX)));
+        """)
+        db.execute(query, [
+            {"field_embeddings": None, **row, "model_name": model_name, "model_version": model_version}
+            for row in rows
+        ])
+        db.commit()
+    
+    def get_cases_for_embedding(
+        self,
+        db: Session,
+        model_name: str,
+        model_version: str,
+        after_case_id: int = 0,
+        limit: int = 256,
+        missing_only: bool = True
+    ) -> List[dict]:
+        # StackTrace is cut server-side to what create_case_text keeps, so
+        # NVARCHAR(MAX) traces never cross the wire in full
+        query = text(f"""
+            SELECT TOP (:limit)
+                c.CaseID,
+                c.CaseTitle,
+                c.CaseDescription,
+                c.Product,
+                c.ErrorMessage,
+                LEFT(c.StackTrace, 1000) AS StackTrace,
+                e.TextHash
+            FROM icm.Cases c
+            LEFT JOIN icm.CaseEmbeddings e
+                ON e.CaseID = c.CaseID
+                AND e.ModelName = :model_name
+                AND e.ModelVersion = :model_version
+            WHERE c.CaseID > :after_case_id
+                {"AND e.CaseID IS NULL" if missing_only else ""}
+            ORDER BY c.CaseID
+        """)
+        result = db.execute(query, {
+            "model_name": model_name,
+            "model_version": model_version,
+            "after_case_id": after_case_id,
+            "limit": limit
+        })
+        return [dict(row._mapping) for row in result]
+
+
+def create_repositories(backend: str) -> Tuple[CaseRepository, EmbeddingRepository]:
+    """Build the repositories for DATABASE_BACKEND (mssql or sqlite)"""
+    if backend == "mssql":
+        return MssqlCaseRepository(), MssqlEmbeddingRepository()
+    
+    if backend == "sqlite":
+        # Imported here: sqlite_repository builds on the base classes above
+        from sqlite_repository import SqliteCaseRepository, SqliteEmbeddingRepository
+        return SqliteCaseRepository(), SqliteEmbeddingRepository()
+    
+    raise ValueError(f"Unknown DATABASE_BACKEND: {backend}")
+
+
+case_repository, embedding_repository = create_repositories(db_manager.backend)
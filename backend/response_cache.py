@@ -0,0 +1,128 @@
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+from metrics import metrics
+from vector_index import vector_index
+
+response_cache_hits = metrics.counter(
+    "icm_response_cache_hits_total",
+    "/recommend_icm responses served from the response cache"
+)
+response_cache_misses = metrics.counter(
+    "icm_response_cache_misses_total",
+    "/recommend_icm responses computed because no current cached response existed"
+)
+response_cache_evictions = metrics.counter(
+    "icm_response_cache_evictions_total",
+    "Response cache entries dropped",
+    ["reason"]
+)
+response_cache_entries = metrics.gauge(
+    "icm_response_cache_entries",
+    "Responses held in the response cache"
+)
+
+
+class ResponseCache:
+    """
+    Bounded LRU + TTL cache of serialized /recommend_icm responses
+
+    Keyed by the canonical request: the whitespace-normalized query text plus
+    top_k, filters and the request's error fingerprint (the query text cuts
+    the stack trace short, the duplicate lookup does not). Each entry records
+    the corpus version it was computed at, which is this worker's case write
+    counter (bumped by invalidate() on create, update and delete) together
+    with the vector index version. The index version only moves when a
+    refresh applies other workers' writes, so /recommend_icm runs the
+    rate-limited vector_index.refresh() before every lookup; entries are
+    therefore at most one refresh interval behind other workers. An entry
+    from an older version is a miss, so invalidation is O(1) and never scans
+    the cache. Changes to case fields outside the index made by other
+    workers are only seen once the entry's TTL expires.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_seconds: float = 300.0,
+        index_version: Callable[[], int] = lambda: 0
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.index_version = index_version
+        self._entries: "OrderedDict[str, Tuple[float, tuple, bytes]]" = OrderedDict()
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @staticmethod
+    def key(query_text: str, top_k: int, filters: Optional[dict], fingerprint: Optional[int] = None) -> str:
+        """Cache key of a recommendation request (filters as model_dump(mode="json", exclude_none=True))"""
+        normalized = re.sub(r"\s+", " ", query_text).strip()
+        material = json.dumps([normalized, top_k, filters or {}, fingerprint], sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def version(self) -> tuple:
+        """Current corpus version; read it before computing a response to be cached"""
+        return self._writes, self.index_version()
+
+    def invalidate(self):
+        """Record a case write: every cached response becomes stale"""
+        with self._lock:
+            self._writes += 1
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Serialized response for key if cached at the current corpus version"""
+        if not self.enabled:
+            return None
+        version = self.version()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, stored_version, body = entry
+                if stored_version != version:
+                    del self._entries[key]
+                    response_cache_evictions.inc(reason="stale")
+                elif now - stored_at > self.ttl_seconds:
+                    del self._entries[key]
+                    response_cache_evictions.inc(reason="ttl")
+                else:
+                    self._entries.move_to_end(key)
+                    response_cache_hits.inc()
+                    return body
+
+        response_cache_misses.inc()
+        return None
+
+    def put(self, key: str, version: tuple, body: bytes):
+        """Store a response computed at version (dropped if the corpus has changed since)"""
+        if not self.enabled or version != self.version():
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), version, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                response_cache_evictions.inc(reason="capacity")
+
+    def size(self) -> int:
+        return len(self._entries)
+
+
+# Global instance (per worker; 0 entries disables the cache)
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("RESPONSE_CACHE_SIZE", "1024")),
+    ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "300")),
+    index_version=lambda: vector_index.version
+)
+response_cache_entries.set_function(response_cache.size)
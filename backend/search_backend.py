@@ -0,0 +1,291 @@
+from abc import ABC, abstractmethod
+from typing import Optional, Tuple
+import os
+import threading
+import numpy as np
+
+
+class SearchBackend(ABC):
+    """
+    Nearest-neighbour search strategy used by VectorIndex
+
+    VectorIndex owns the normalized embedding matrix and CaseID array and keeps
+    the backend informed of every change. A backend returns scored candidates;
+    VectorIndex applies top-k and the similarity thresholds on top of them, so
+    the /recommend_icm contract is the same for every backend.
+
+    search() runs outside VectorIndex's lock, so it may overlap with
+    rebuild, upsert and remove; backends with state of their own guard it.
+    """
+
+    name = "base"
+
+    # Filtered exact searches copy the matching rows out of the matrix when
+    # they are at most this share of it; for broader filters scoring every
+    # row and keeping the matching columns is cheaper than the copy
+    GATHER_MAX_FRACTION = 0.15
+
+    def rebuild(self, case_ids: np.ndarray, vectors: np.ndarray):
+        """Replace the backend's contents with the given rows"""
+
+    def upsert(self, case_id: int, vector: np.ndarray):
+        """Insert or replace the vector of a case"""
+
+    def remove(self, case_id: int):
+        """Remove a case"""
+
+    def save(self):
+        """Persist the backend to local disk, if it supports it"""
+
+    @abstractmethod
+    def search(
+        self,
+        matrix: np.ndarray,
+        case_ids: np.ndarray,
+        queries: np.ndarray,
+        k: int,
+        rows: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find candidate matches for a batch of normalized query vectors
+
+        Args:
+            matrix: The index's normalized embedding rows
+            case_ids: CaseIDs aligned with matrix rows
+            queries: Q x D matrix of normalized query vectors
+            k: Number of results the caller will keep per query
+            rows: Ascending positions of the only rows that may be returned
+                (the cases matching a filter), or None for every row
+
+        Returns:
+            (candidate_ids, similarities) where similarities is Q x C and
+            candidate_ids is either a C-length array shared by every query
+            (case_ids[rows] in order when rows is given) or a Q x C array;
+            candidates are in no particular order
+        """
+
+    @classmethod
+    def exact_search(
+        cls,
+        matrix: np.ndarray,
+        case_ids: np.ndarray,
+        queries: np.ndarray,
+        rows: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Score every row, or only the given rows, in one matrix product"""
+        if rows is None:
+            return case_ids, queries @ matrix.T
+        if len(rows) <= cls.GATHER_MAX_FRACTION * len(case_ids):
+            return case_ids[rows], queries @ matrix[rows].T
+        return case_ids[rows], (queries @ matrix.T)[:, rows]
+
+
+class ExactSearchBackend(SearchBackend):
+    """Brute-force cosine similarity over every row (one matrix product per batch)"""
+
+    name = "exact"
+
+    def search(self, matrix, case_ids, queries, k, rows=None):
+        return self.exact_search(matrix, case_ids, queries, rows)
+
+
+class HnswSearchBackend(SearchBackend):
+    """
+    Approximate search over an HNSW graph (hnswlib, CPU-only)
+
+    The graph is persisted to index_path so a restarted worker only has to add
+    rows that changed since the file was written. Only the returned candidates
+    are scored, so threshold counts in SimilarityService.summarize cover at most
+    `candidates` rows; max score and top-k are unaffected.
+
+    Filtered searches over-fetch in proportion to the filter's selectivity and
+    keep the matching neighbours. Filters too narrow for that (or queries that
+    come back with fewer than k matches) are scored exactly over the matching
+    rows instead, which is cheap because there are few of them.
+
+    hnswlib cannot resize a graph while it is being queried, so graph
+    operations are serialized by a lock of the backend's own (a query
+    already runs on every core).
+    """
+
+    name = "hnsw"
+
+    # Neighbours fetched per expected match, and the most candidates a
+    # filtered query may fetch (as a multiple of candidates) before it
+    # falls back to exact scoring of the matching rows
+    OVERFETCH = 2
+    MAX_FILTER_OVERFETCH = 10
+
+    def __init__(
+        self,
+        index_path: str,
+        m: int = 16,
+        ef_construction: int = 200,
+        ef_search: int = 64,
+        candidates: int = 100
+    ):
+        try:
+            import hnswlib
+        except ImportError as e:
+            raise ImportError("SEARCH_BACKEND=hnsw requires the hnswlib package") from e
+
+        self._hnswlib = hnswlib
+        self.index_path = index_path
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.candidates = candidates
+        self._index = None
+        self._lock = threading.RLock()
+
+    def rebuild(self, case_ids, vectors):
+        with self._lock:
+            self._rebuild(case_ids, vectors)
+
+    def _rebuild(self, case_ids, vectors):
+        dimension = vectors.shape[1] if vectors.ndim == 2 and vectors.shape[1] else 0
+        if dimension == 0:
+            self._index = None
+            return
+
+        if self._index is None and os.path.exists(self.index_path):
+            self._load(dimension, len(case_ids))
+
+        if self._index is None:
+            self._create(dimension, len(case_ids))
+            if len(case_ids):
+                self._index.add_items(vectors, case_ids)
+            print(f"Built HNSW index with {len(case_ids)} cases")
+            return
+
+        # Loaded from disk: only insert rows that are new or changed since it was saved
+        known = np.array(self._index.get_ids_list(), dtype=np.int64)
+        changed = ~np.isin(case_ids, known)
+        for start in range(0, len(case_ids), 1024):
+            chunk = slice(start, start + 1024)
+            present = np.flatnonzero(~changed[chunk]) + start
+            if len(present) == 0:
+                continue
+            try:
+                stored = self._index.get_items(case_ids[present], return_type="numpy")
+                changed[present] = np.abs(stored - vectors[present]).max(axis=1) > 1e-4
+            except RuntimeError:
+                # Some labels were marked deleted when saved; re-insert the chunk
+                changed[present] = True
+
+        self._ensure_capacity(len(known) + int(changed.sum()))
+        if changed.any():
+            self._index.add_items(vectors[changed], case_ids[changed])
+
+        stale = set(known.tolist()) - set(case_ids.tolist())
+        for case_id in stale:
+            self.remove(case_id)
+        print(f"Loaded HNSW index from {self.index_path} "
+              f"({int(changed.sum())} cases added, {len(stale)} removed)")
+
+    def upsert(self, case_id, vector):
+        with self._lock:
+            if self._index is None:
+                self._create(vector.shape[0], 0)
+            self._ensure_capacity(self._index.get_current_count() + 1)
+            # Re-adding a label that was marked deleted restores it with the new vector
+            self._index.add_items(vector.reshape(1, -1), [case_id])
+
+    def remove(self, case_id):
+        with self._lock:
+            if self._index is None:
+                return
+            try:
+                self._index.mark_deleted(case_id)
+            except RuntimeError:
+                pass
+
+    def save(self):
+        with self._lock:
+            if self._index is None:
+                return
+            directory = os.path.dirname(self.index_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Write then rename so other workers never load a partial file
+            tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+            self._index.save_index(tmp_path)
+            os.replace(tmp_path, self.index_path)
+
+    def search(self, matrix, case_ids, queries, k, rows=None):
+        if len(case_ids) == 0 or self._index is None:
+            empty = np.empty((queries.shape[0], 0))
+            return empty.astype(np.int64), empty.astype(np.float32)
+        if rows is not None:
+            return self._search_filtered(matrix, case_ids, queries, k, rows)
+        return self._query(queries, min(max(k, self.candidates), len(case_ids)))
+
+    def _search_filtered(self, matrix, case_ids, queries, k, rows):
+        n_candidates = min(max(k, self.candidates), len(rows))
+        fetch = int(np.ceil(self.OVERFETCH * n_candidates * len(case_ids) / max(len(rows), 1)))
+        if len(rows) == 0 or fetch >= len(case_ids) or fetch > self.MAX_FILTER_OVERFETCH * n_candidates:
+            return self.exact_search(matrix, case_ids, queries, rows)
+
+        labels, similarities = self._query(queries, fetch)
+        allowed = np.isin(labels, case_ids[rows])
+        matched = int(allowed.sum(axis=1).min())
+        if matched < min(k, len(rows)):
+            return self.exact_search(matrix, case_ids, queries, rows)
+        # Keep the first matches of every query (a stable sort moves them to the front)
+        order = np.argsort(~allowed, axis=1, kind="stable")[:, :min(matched, n_candidates)]
+        return np.take_along_axis(labels, order, axis=1), np.take_along_axis(similarities, order, axis=1)
+
+    def _query(self, queries: np.ndarray, n_candidates: int) -> Tuple[np.ndarray, np.ndarray]:
+        with self._lock:
+            self._index.set_ef(max(self.ef_search, n_candidates))
+            labels, distances = self._index.knn_query(queries, k=n_candidates)
+        # hnswlib's "cosine" space returns 1 - cosine similarity
+        return labels.astype(np.int64), (1.0 - distances).astype(np.float32)
+
+    def _create(self, dimension: int, capacity: int):
+        self._index = self._hnswlib.Index(space="cosine", dim=dimension)
+        self._index.init_index(
+            max_elements=max(capacity, 1024),
+            ef_construction=self.ef_construction,
+            M=self.m,
+            allow_replace_deleted=False
+        )
+        self._index.set_ef(self.ef_search)
+
+    def _load(self, dimension: int, capacity: int):
+        index = self._hnswlib.Index(space="cosine", dim=dimension)
+        try:
+            index.load_index(self.index_path, max_elements=max(capacity, 1024))
+        except Exception as e:
+            print(f"Ignoring unreadable HNSW index {self.index_path}: {e}")
+            return
+        index.set_ef(self.ef_search)
+        self._index = index
+
+    def _ensure_capacity(self, required: int):
+        capacity = self._index.get_max_elements()
+        if required > capacity:
+            while capacity < required:
+                capacity *= 2
+            self._index.resize_index(capacity)
+
+
+def create_search_backend(model_name: str, model_version: str) -> SearchBackend:
+    """Build the search backend selected by SEARCH_BACKEND (exact or hnsw)"""
+    backend = os.getenv("SEARCH_BACKEND", "exact").lower()
+
+    if backend == "exact":
+        return ExactSearchBackend()
+
+    if backend == "hnsw":
+        index_dir = os.getenv("HNSW_INDEX_DIR", ".cache")
+        safe_model = model_name.replace("/", "_")
+        return HnswSearchBackend(
+            index_path=os.path.join(index_dir, f"hnsw_{safe_model}_v{model_version}.bin"),
+            m=int(os.getenv("HNSW_M", "16")),
+            ef_construction=int(os.getenv("HNSW_EF_CONSTRUCTION", "200")),
+            ef_search=int(os.getenv("HNSW_EF_SEARCH", "64")),
+            candidates=int(os.getenv("ANN_CANDIDATES", "100"))
+        )
+
+    raise ValueError(f"Unknown SEARCH_BACKEND: {backend}")
@@ -1,6 +1,5 @@
 import numpy as np
-from typing import List, Tuple
-from sklearn.metrics.pairwise import cosine_similarity
+from typing import List
 
 
 class SimilarityService:
@@ -10,47 +9,20 @@ class SimilarityService:
     RECOMMEND_ICM_THRESHOLD = 0.80
     
     @staticmethod
-    def compute_cosine_similarity(
-        query_embedding: np.ndarray,
-        candidate_embeddings: np.ndarray
-    ) -> np.ndarray:
+    def normalize(embeddings: np.ndarray) -> np.ndarray:
         """
-        Compute cosine similarity between query and candidates
+        L2-normalize embedding rows as float32
         
         Args:
-            query_embedding: Single embedding vector (1D array)
-            candidate_embeddings: Multiple embedding vectors (2D array)
-            
-        Returns:
-            Array of similarity scores
-        """
-        # Ensure query is 2D for sklearn
-        if query_embedding.ndim == 1:
-            query_embedding = query_embedding.reshape(1, -1)
-        
-        similarities = cosine_similarity(query_embedding, candidate_embeddings)
-        return similarities[0]  # Return 1D array
-    
-    @staticmethod
-    def get_top_k_similar(
-        similarities: np.ndarray,
-        k: int = 5
-    ) -> List[Tuple[int, float]]:
-        """
-        Get indices and scores of top-k most similar items
+            embeddings: Single vector (1D) or one vector per row (2D)
         
-        Args:
-            similarities: Array of similarity scores
-            k: Number of top results to return
-            
         Returns:
-            List of (index, score) tuples sorted by score descending
+            Array of the same shape with unit-length rows (zero rows stay zero)
         """
-        # Get indices of top-k scores
-        top_k_indices = np.argsort(similarities)[::-1][:k]
-        
-        # Return as list of (index, score) tuples
-        return [(int(idx), float(similarities[idx])) for idx in top_k_indices]
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return embeddings / norms
     
     @staticmethod
     def should_alert(similarity_score: float) -> bool:
@@ -63,28 +35,96 @@ class SimilarityService:
         return similarity_score >= SimilarityService.RECOMMEND_ICM_THRESHOLD
     
     @staticmethod
-    def analyze_similarities(similarities: np.ndarray) -> dict:
+    def score(
+        query_embeddings: np.ndarray,
+        candidate_embeddings: np.ndarray,
+        k: int = 5
+    ) -> List[dict]:
         """
-        Analyze similarity scores and return summary
+        Score pre-normalized queries against pre-normalized candidates
+        
+        Args:
+            query_embeddings: One query (1D) or a batch of queries (2D), L2-normalized
+            candidate_embeddings: N x D matrix of L2-normalized candidates
+            k: Number of top results per query
         
         Returns:
-            Dictionary with analysis results
+            One summarize() result per query
         """
-        if len(similarities) == 0:
-            return {
-                "max_score": 0.0,
-                "alert": False,
-                "recommend_icm": False,
-                "count_above_alert": 0,
-                "count_above_icm": 0
-            }
+        queries = np.atleast_2d(query_embeddings)
+        if candidate_embeddings.shape[0] == 0:
+            return SimilarityService.summarize(np.empty((queries.shape[0], 0), dtype=np.float32), k)
+        return SimilarityService.summarize(queries @ candidate_embeddings.T, k)
+    
+    @staticmethod
+    def summarize(similarities: np.ndarray, k: int = 5) -> List[dict]:
+        """
+        Top-k selection and threshold analysis for a Q x N similarity matrix
+        
+        Uses argpartition so only the k best scores per row are sorted, and
+        derives the max score from the top-k instead of another pass.
+        
+        Returns:
+            One dictionary per row with max_score, alert, recommend_icm,
+            count_above_alert, count_above_icm and top_k, a list of
+            (column index, score) tuples sorted by score descending
+        """
+        similarities = np.atleast_2d(similarities)
+        n_queries, n_candidates = similarities.shape
+        
+        if n_candidates == 0:
+            return [
+                {
+                    "max_score": 0.0,
+                    "alert": False,
+                    "recommend_icm": False,
+                    "count_above_alert": 0,
+                    "count_above_icm": 0,
+                    "top_k": []
+                }
+                for _ in range(n_queries)
+            ]
+        
+        top_k_indices = SimilarityService._top_k_indices(similarities, k)
+        top_k_scores = np.take_along_axis(similarities, top_k_indices, axis=1)
+        
+        # ICM threshold is above the alert threshold, so only alert hits need a second look
+        above_alert = similarities >= SimilarityService.ALERT_THRESHOLD
+        count_above_alert = above_alert.sum(axis=1)
+        rows, cols = np.nonzero(above_alert)
+        count_above_icm = np.bincount(
+            rows[similarities[rows, cols] >= SimilarityService.RECOMMEND_ICM_THRESHOLD],
+            minlength=n_queries
+        )
+        
+        results = []
+        for i in range(n_queries):
+            max_score = float(top_k_scores[i, 0])
+            results.append({
+                "max_score": max_score,
+                "alert": SimilarityService.should_alert(max_score),
+                "recommend_icm": SimilarityService.should_recommend_icm(max_score),
+                "count_above_alert": int(count_above_alert[i]),
+                "count_above_icm": int(count_above_icm[i]),
+                "top_k": [
+                    (int(idx), float(score))
+                    for idx, score in zip(top_k_indices[i], top_k_scores[i])
+                ]
+            })
+        return results
+    
+    @staticmethod
+    def _top_k_indices(similarities: np.ndarray, k: int) -> np.ndarray:
+        """Column indices of the k largest scores per row, sorted descending"""
+        n_candidates = similarities.shape[1]
+        k = min(k, n_candidates)
+        if k == 0:
+            return np.empty((similarities.shape[0], 0), dtype=np.intp)
         
-        max_score = float(np.max(similarities))
+        if k < n_candidates:
+            partition = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        else:
+            partition = np.broadcast_to(np.arange(n_candidates), similarities.shape)
         
-        return {
-            "max_score": max_score,
-            "alert": SimilarityService.should_alert(max_score),
-            "recommend_icm": SimilarityService.should_recommend_icm(max_score),
-            "count_above_alert": int(np.sum(similarities >= SimilarityService.ALERT_THRESHOLD)),
-            "count_above_icm": int(np.sum(similarities >= SimilarityService.RECOMMEND_ICM_THRESHOLD))
-        }
+        order = np.argsort(-np.take_along_axis(similarities, partition, axis=1), axis=1)
+        return np.take_along_axis(partition, order, axis=1)
@@ -0,0 +1,172 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from typing import List, Optional, Tuple
+from models import CaseCreate, Case
+from datetime import datetime
+
+from db import SQLITE_NOW
+from repository import CaseRepository, EmbeddingRepository
+
+CASE_COLUMNS = [*CaseCreate.model_fields, "Fingerprint"]
+
+
+class SqliteCaseRepository(CaseRepository):
+    """
+    CaseRepository for a local SQLite file (DATABASE_BACKEND=sqlite)
+
+    The file is attached as schema icm (see db.attach_sqlite_database), so the
+    portable queries of CaseRepository run unchanged. RETURNING rows are read
+    before the commit, which would otherwise discard them.
+    """
+
+    NOW_SQL = SQLITE_NOW
+
+    def create_case(self, db: Session, case_data: CaseCreate) -> Case:
+        result = db.execute(text(f"""
+            INSERT INTO icm.Cases ({", ".join(CASE_COLUMNS)}, CreatedDate)
+            VALUES ({", ".join(":" + column for column in CASE_COLUMNS)}, {SQLITE_NOW})
+            RETURNING *
+        """), self._insert_params(case_data))
+        case = Case.model_validate(dict(result.fetchone()._mapping))
+        db.commit()
+        return case
+
+    def create_cases(self, db: Session, cases: List[CaseCreate]) -> List[Case]:
+        """One INSERT ... RETURNING per row (no network round trips) and one commit"""
+        query = text(f"""
+            INSERT INTO icm.Cases ({", ".join(CASE_COLUMNS)}, CreatedDate)
+            VALUES ({", ".join(":" + column for column in CASE_COLUMNS)}, {SQLITE_NOW})
+            RETURNING *
+        """)
+        created = [
+            Case.model_validate(dict(db.execute(query, self._insert_params(case)).fetchone()._mapping))
+            for case in cases
+        ]
+        db.commit()
+        return created
+
+    def get_cases_page(
+        self,
+        db: Session,
+        columns: List[str],
+        limit: int,
+        after: Optional[Tuple[str, int]] = None
+    ) -> List[dict]:
+        where = ""
+        params = {"limit": limit}
+        if after:
+            # Normalize the cursor's ISO string to the stored text format so
+            # timestamps compare correctly as strings
+            where = """
+            WHERE CreatedDate < strftime('%Y-%m-%d %H:%M:%f', :after_created)
+                OR (CreatedDate = strftime('%Y-%m-%d %H:%M:%f', :after_created) AND CaseID < :after_case_id)
+            """
+            params.update(after_created=after[0], after_case_id=after[1])
+
+        query = text(f"""
+            SELECT {", ".join(columns)}
+            FROM icm.Cases
+            {where}
+            ORDER BY CreatedDate DESC, CaseID DESC
+            LIMIT :limit
+        """)
+        result = db.execute(query, params)
+        return [dict(row._mapping) for row in result]
+
+    def update_case(self, db: Session, case_id: int, updates: dict) -> Optional[Case]:
+        set_clauses, params = self._set_clauses(case_id, updates)
+        if not set_clauses:
+            return self.get_case_by_id(db, case_id)
+
+        set_clauses.append(f"ModifiedDate = {SQLITE_NOW}")
+
+        result = db.execute(text(f"""
+            UPDATE icm.Cases
+            SET {', '.join(set_clauses)}
+            WHERE CaseID = :case_id
+            RETURNING *
+        """), params)
+        row = result.fetchone()
+        if row:
+            row = self._refresh_fingerprint(db, dict(row._mapping), updates)
+        db.commit()
+
+        if row:
+            return Case.model_validate(row)
+        return None
+
+
+class SqliteEmbeddingRepository(EmbeddingRepository):
+    """EmbeddingRepository for a local SQLite file (DATABASE_BACKEND=sqlite)"""
+
+    def upsert_embeddings(self, db: Session, model_name: str, model_version: str, rows: List[dict]) -> None:
+        if not rows:
+            return
+        query = text(f"""
+            INSERT INTO icm.CaseEmbeddings
+                (CaseID, ModelName, ModelVersion, Dimension, TextHash, Embedding, FieldEmbeddings)
+            VALUES (:case_id, :model_name, :model_version, :dimension, :text_hash, :embedding, :field_embeddings)
+            ON CONFLICT (CaseID) DO UPDATE SET
+                ModelName = excluded.ModelName,
+                ModelVersion = excluded.ModelVersion,
+                Dimension = excluded.Dimension,
+                TextHash = excluded.TextHash,
+                Embedding = excluded.Embedding,
+                FieldEmbeddings = excluded.FieldEmbeddings,
+                ModifiedDate = {SQLITE_NOW}
+        """)
+        db.execute(query, [
+            {"field_embeddings": None, **row, "model_name": model_name, "model_version": model_version}
+            for row in rows
+        ])
+        db.commit()
+
+    def get_embeddings(
+        self,
+        db: Session,
+        model_name: str,
+        model_version: str,
+        modified_since: Optional[datetime] = None
+    ) -> List[dict]:
+        rows = super().get_embeddings(db, model_name, model_version, modified_since)
+        # A CASE expression has no declared type, so it is not converted
+        for row in rows:
+            if isinstance(row["ModifiedDate"], str):
+                row["ModifiedDate"] = datetime.fromisoformat(row["ModifiedDate"])
+        return rows
+
+    def get_cases_for_embedding(
+        self,
+        db: Session,
+        model_name: str,
+        model_version: str,
+        after_case_id: int = 0,
+        limit: int = 256,
+        missing_only: bool = True
+    ) -> List[dict]:
+        query = text(f"""
+            SELECT
+                c.CaseID,
+                c.CaseTitle,
+                c.CaseDescription,
+                c.Product,
+                c.ErrorMessage,
+                substr(c.StackTrace, 1, 1000) AS StackTrace,
+                e.TextHash
+            FROM icm.Cases c
+            LEFT JOIN icm.CaseEmbeddings e
+                ON e.CaseID = c.CaseID
+                AND e.ModelName = :model_name
+                AND e.ModelVersion = :model_version
+            WHERE c.CaseID > :after_case_id
+                {"AND e.CaseID IS NULL" if missing_only else ""}
+            ORDER BY c.CaseID
+            LIMIT :limit
+        """)
+        result = db.execute(query, {
+            "model_name": model_name,
+            "model_version": model_version,
+            "after_case_id": after_case_id,
+            "limit": limit
+        })
+        return [dict(row._mapping) for row in result]
@@ -5,5 +5,6 @@
 pip install --upgrade pip
 pip install -r requirements.txt
 
-# Start the application with Gunicorn
-gunicorn -w 4 -k uvicorn.workers.UvicornWorker main:app --bind 0.0.0.0:8000
+# Start the application with Gunicorn (see gunicorn.conf.py; the master preloads
+# the model and vector index so workers share them copy-on-write)
+gunicorn -c gunicorn.conf.py main:app
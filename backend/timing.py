@@ -0,0 +1,100 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+import threading
+import time
+
+from metrics import metrics
+
+stage_seconds = metrics.histogram(
+    "icm_stage_seconds",
+    "Time spent in each stage of request handling (query_text, encode, index_refresh, score, top_k, ...)",
+    ["stage"]
+)
+db_query_seconds = metrics.histogram(
+    "icm_db_query_seconds",
+    "Database statement execution time by statement kind",
+    ["statement"]
+)
+request_seconds = metrics.histogram(
+    "icm_request_seconds",
+    "Time to produce a response (streamed bodies excluded) by route",
+    ["route", "method", "status"]
+)
+request_db_queries = metrics.histogram(
+    "icm_request_db_queries",
+    "Database statements executed per request",
+    ["route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+)
+request_db_seconds = metrics.histogram(
+    "icm_request_db_seconds",
+    "Total database statement time per request",
+    ["route"]
+)
+
+
+class RequestTimings:
+    """
+    Stage durations and database usage of one request
+
+    Shared by reference with the threadpool calls the request makes (context
+    variables are copied into them), so updates are locked.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add_stage(self, name: str, seconds: float):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def add_query(self, seconds: float):
+        with self._lock:
+            self.db_queries += 1
+            self.db_seconds += seconds
+
+    def server_timing(self) -> str:
+        """Server-Timing header value (durations in milliseconds)"""
+        with self._lock:
+            entries = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.stages.items()]
+            entries.append(f'db;dur={self.db_seconds * 1000:.2f};desc="{self.db_queries} queries"')
+        return ", ".join(entries)
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def begin_request() -> RequestTimings:
+    """Start collecting timings for the request running in this context"""
+    timings = RequestTimings()
+    _current.set(timings)
+    return timings
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block into icm_stage_seconds and the current request's timings"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        stage_seconds.observe(seconds, stage=name)
+        timings = _current.get()
+        if timings is not None:
+            timings.add_stage(name, seconds)
+
+
+def record_query(statement: str, seconds: float):
+    """Record one executed database statement (called from SQLAlchemy cursor events)"""
+    kind = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+    if kind not in ("SELECT", "INSERT", "UPDATE", "DELETE", "MERGE"):
+        kind = "OTHER"
+    db_query_seconds.observe(seconds, statement=kind)
+    timings = _current.get()
+    if timings is not None:
+        timings.add_query(seconds)
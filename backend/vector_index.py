@@ -0,0 +1,639 @@
+from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import Dict, List, Optional
+import os
+import threading
+import time
+import numpy as np
+
+from case_metadata import CaseMetadata
+from embedder import embedding_service
+from embedding_snapshot import EmbeddingSnapshot, SnapshotError
+from field_vectors import FieldVectors, parse_field_weights
+from fingerprint import NEAR_DUPLICATE_DISTANCE, FingerprintIndex
+from metrics import metrics
+from repository import embedding_repository, subtract_months
+from similarity import SimilarityService
+from search_backend import SearchBackend, ExactSearchBackend, create_search_backend
+from timing import stage
+
+vector_index_bytes = metrics.gauge(
+    "icm_vector_index_bytes",
+    "Memory held by the in-memory vector index (case vectors, per-field chunk vectors)",
+    ["part"]
+)
+
+
+class VectorIndex:
+    """
+    In-memory index of stored case embeddings, warmed once per worker
+
+    Holds a contiguous float32 matrix of L2-normalized vectors and a parallel
+    CaseID array. Local writes update it in place; writes made by other workers
+    or processes are picked up by refresh() from the icm.CaseEmbeddings
+    ModifiedDate watermark. Candidate search is delegated to a SearchBackend
+    (exact by default, or an approximate HNSW graph).
+
+    With a snapshot_path the index starts from a memory-mapped
+    EmbeddingSnapshot and only reads rows newer than its watermark from SQL.
+
+    Case attributes (product, severity, status, ICM outcome, ...) are kept in
+    CaseMetadata columns aligned with the matrix rows, so filtered searches
+    score only the matching rows and ICM statistics need no SQL. Their error
+    fingerprints also feed a FingerprintIndex for duplicate lookups.
+
+    With field_vectors, cases also carry per-field chunk vectors and every
+    scored case gets a late-fused score (see FieldVectors). Those vectors are
+    not part of the snapshot, so the snapshot is not used with them.
+    """
+
+    INITIAL_CAPACITY = 1024
+
+    def __init__(
+        self,
+        backend: Optional[SearchBackend] = None,
+        refresh_interval: float = 30.0,
+        snapshot_path: Optional[str] = None,
+        snapshot_dtype: str = "float32",
+        field_vectors: Optional[FieldVectors] = None
+    ):
+        self.backend = backend or ExactSearchBackend()
+        self.refresh_interval = refresh_interval
+        self.snapshot_path = None if field_vectors else snapshot_path
+        self.snapshot_dtype = snapshot_dtype
+        self._fields = field_vectors
+        self._changes = 0
+        self._snapshot_changes = None
+        self._lock = threading.RLock()
+        # Serializes warm-ups: a full load must never run twice at once
+        self._warm_lock = threading.Lock()
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+        self._case_ids = np.empty(0, dtype=np.int64)
+        self._metadata = CaseMetadata()
+        self._positions: Dict[int, int] = {}
+        self._duplicates = FingerprintIndex()
+        self._size = 0
+        self._watermark: Optional[datetime] = None
+        self._last_refresh = 0.0
+        self._warm = False
+        # months -> ((since, changes, size), rows) of the last icm_rollup()
+        self._rollups: Dict[int, tuple] = {}
+
+    @property
+    def size(self) -> int:
+        """Number of indexed cases"""
+        return self._size
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the case vectors and CaseIDs"""
+        return self._matrix.nbytes + self._case_ids.nbytes
+
+    @property
+    def field_nbytes(self) -> int:
+        """Memory held by per-field chunk vectors (0 when disabled)"""
+        return self._fields.nbytes if self._fields else 0
+
+    @property
+    def version(self) -> int:
+        """Counter that moves on every change to the indexed rows or their attributes"""
+        return self._changes
+
+    def is_warm(self) -> bool:
+        """Check if the index has been loaded from the database"""
+        return self._warm
+
+    def warm(self, db: Session):
+        """Load the snapshot and catch up from SQL, or load every stored embedding for the current model"""
+        with self._warm_lock:
+            self._load(db)
+
+    def ensure_warm(self, db: Session) -> bool:
+        """
+        Warm the index unless it is already warm
+
+        Callers arriving while another thread warms it (the background
+        warm-up, or a request before /ready) wait for that load instead of
+        starting a second one.
+
+        Returns:
+            True if this call loaded the index
+        """
+        if self._warm:
+            return False
+        with self._warm_lock:
+            if self._warm:
+                return False
+            self._load(db)
+            return True
+
+    def _load(self, db: Session):
+        """warm() body; the caller holds _warm_lock"""
+        if self._warm_from_snapshot(db):
+            return
+
+        rows = embedding_repository.get_embeddings(
+            db,
+            embedding_service.model_name,
+            embedding_service.model_version
+        )
+
+        with self._lock:
+            self._matrix = np.empty((0, 0), dtype=np.float32)
+            self._case_ids = np.empty(0, dtype=np.int64)
+            self._metadata = CaseMetadata()
+            self._rollups = {}
+            self._positions = {}
+            self._duplicates = FingerprintIndex()
+            self._size = 0
+            self._watermark = None
+            if self._fields:
+                self._fields.reset()
+            self._apply_rows(rows, update_backend=False)
+            self.backend.rebuild(self._case_ids[:self._size], self._matrix[:self._size])
+            self._last_refresh = time.monotonic()
+            self._warm = True
+
+        fields = f", {self._fields.segments} field vectors" if self._fields else ""
+        print(f"Vector index warmed with {self._size} cases{fields} ({self.backend.name} search, "
+              f"{(self.nbytes + self.field_nbytes) / 2**20:.1f} MiB)")
+        self.save()
+
+    def _warm_from_snapshot(self, db: Session) -> bool:
+        """Map the snapshot, then apply rows modified since its watermark"""
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return False
+        try:
+            snapshot = EmbeddingSnapshot.open(
+                self.snapshot_path,
+                embedding_service.model_name,
+                embedding_service.model_version
+            )
+        except SnapshotError as e:
+            print(f"Ignoring embedding snapshot: {e}")
+            return False
+        if "vocabularies" not in snapshot.header["attributes"] or not set(CaseMetadata.COLUMNS) <= set(snapshot.columns):
+            print(f"Ignoring embedding snapshot {self.snapshot_path}: case metadata missing or outdated")
+            return False
+
+        with self._lock:
+            self._matrix = snapshot.matrix
+            self._case_ids = snapshot.case_ids
+            self._metadata = CaseMetadata.from_columns(
+                snapshot.columns,
+                snapshot.header["attributes"]["vocabularies"],
+                snapshot.header["attributes"].get("labels")
+            )
+            self._rollups = {}
+            self._size = snapshot.rows
+            self._positions = {case_id: i for i, case_id in enumerate(self._case_ids[:self._size].tolist())}
+            self._duplicates = FingerprintIndex()
+            for case_id, fingerprint in zip(self._positions, self._metadata.fingerprints(self._size).tolist()):
+                self._duplicates.set(case_id, fingerprint)
+            self._watermark = snapshot.watermark
+            self.backend.rebuild(self._case_ids[:self._size], self._matrix[:self._size])
+            self._snapshot_changes = self._changes
+
+        loaded = self._size
+        self._catch_up(db)
+        self._warm = True
+        print(f"Vector index warmed from {self.snapshot_path} with {loaded} cases, "
+              f"{self._changes - self._snapshot_changes} changed since ({self.backend.name} search)")
+        return True
+
+    def refresh(self, db: Session, force: bool = False):
+        """
+        Pick up embeddings written since the last refresh
+
+        Runs at most once per refresh_interval unless forced. Rows deleted by
+        other workers are detected by comparing the stored row count and
+        CaseID sum with the index's (see get_embedding_checksum), and only
+        then are the stored CaseIDs read. A cold index is warmed first (see
+        ensure_warm).
+        """
+        if self.ensure_warm(db):
+            return
+
+        if not force and not self.refresh_due():
+            return
+
+        self._catch_up(db)
+
+    def refresh_due(self) -> bool:
+        """Check whether refresh() would read the database (cold index or refresh_interval elapsed)"""
+        return not self._warm or time.monotonic() - self._last_refresh >= self.refresh_interval
+
+    def _catch_up(self, db: Session):
+        """Apply rows modified since the watermark and drop rows deleted from the database"""
+        # DATETIME has ~3ms resolution, so rows at the watermark are re-read;
+        # upserting them again is idempotent
+        rows = embedding_repository.get_embeddings(
+            db,
+            embedding_service.model_name,
+            embedding_service.model_version,
+            modified_since=self._watermark
+        )
+        checksum = embedding_repository.get_embedding_checksum(
+            db,
+            embedding_service.model_name,
+            embedding_service.model_version
+        )
+
+        with self._lock:
+            self._apply_rows(rows)
+            indexed = (self._size, int(self._case_ids[:self._size].sum()))
+            indexed_ids = set(self._positions) if checksum != indexed else None
+
+        if indexed_ids is not None:
+            # Read outside the lock; cases indexed after the snapshot above
+            # (e.g. created by this worker meanwhile) are never removed
+            stored_ids = set(embedding_repository.get_embedded_case_ids(
+                db,
+                embedding_service.model_name,
+                embedding_service.model_version
+            ))
+            with self._lock:
+                for case_id in indexed_ids - stored_ids:
+                    self.remove(case_id)
+
+        self._last_refresh = time.monotonic()
+
+    def save(self):
+        """Persist the search backend and, if it changed, the embedding snapshot to local disk"""
+        with self._lock:
+            self.backend.save()
+            if self.snapshot_path and self._warm and self._changes != self._snapshot_changes:
+                try:
+                    EmbeddingSnapshot.write(
+                        self.snapshot_path,
+                        embedding_service.model_name,
+                        embedding_service.model_version,
+                        self._case_ids[:self._size],
+                        self._matrix[:self._size],
+                        self._watermark,
+                        dtype=self.snapshot_dtype,
+                        columns=self._metadata.to_columns(),
+                        attributes={
+                            "vocabularies": self._metadata.vocabularies(),
+                            "labels": self._metadata.labels()
+                        }
+                    )
+                except OSError as e:
+                    # The next start just loads more rows from SQL
+                    print(f"Failed to write embedding snapshot {self.snapshot_path}: {e}")
+                    return
+                self._snapshot_changes = self._changes
+
+    def upsert(
+        self,
+        case_id: int,
+        embedding: np.ndarray,
+        case: Optional[dict] = None,
+        field_vectors: Optional[tuple] = None
+    ):
+        """
+        Insert or replace the vector of a case
+
+        Args:
+            case: Case row (icm.Cases column names) whose attributes are used
+                by filtered searches; keeps the current attributes if omitted
+            field_vectors: (field codes, normalized vectors) of the case's
+                chunks (EmbeddingService.encode_segments), or None for none
+        """
+        vector = SimilarityService.normalize(np.ravel(embedding))
+
+        with self._lock:
+            position = self._positions.get(case_id)
+            if position is not None and np.array_equal(self._matrix[position], vector):
+                if case is not None:
+                    self.update_metadata(case_id, case)
+                if self._fields and self._set_fields(position, field_vectors):
+                    self._changes += 1
+                return
+            self._set_row(case_id, vector, case, field_vectors)
+            self.backend.upsert(case_id, vector)
+
+    def update_metadata(self, case_id: int, case: dict) -> bool:
+        """Refresh the filterable attributes of an indexed case (e.g. after a status change)"""
+        with self._lock:
+            position = self._positions.get(case_id)
+            if position is None:
+                return False
+            if self._metadata.set_row(position, case):
+                self._changes += 1
+            self._duplicates.set(case_id, case.get("Fingerprint"))
+            return True
+
+    def _set_row(
+        self,
+        case_id: int,
+        vector: np.ndarray,
+        case: Optional[dict] = None,
+        field_vectors: Optional[tuple] = None
+    ):
+        """Write a normalized vector, its field vectors and its case attributes into the index (caller holds the lock)"""
+        position = self._positions.get(case_id)
+        if position is None:
+            self._ensure_capacity(self._size + 1, vector.shape[0])
+            position = self._size
+            self._positions[case_id] = position
+            self._case_ids[position] = case_id
+            self._metadata.set_row(position, case or {})
+            self._size += 1
+        elif case is not None:
+            self._metadata.set_row(position, case)
+        if case is not None:
+            self._duplicates.set(case_id, case.get("Fingerprint"))
+        self._matrix[position] = vector
+        if self._fields:
+            self._set_fields(position, field_vectors)
+        self._changes += 1
+
+    def _set_fields(self, position: int, field_vectors: Optional[tuple]) -> bool:
+        codes, vectors = field_vectors if field_vectors is not None else (None, None)
+        changed = self._fields.set(position, codes, vectors)
+        self._fields.compact(self._size)
+        return changed
+
+    def remove(self, case_id: int) -> bool:
+        """Remove a case from the index by moving the last row into its slot"""
+        with self._lock:
+            position = self._positions.pop(case_id, None)
+            if position is None:
+                return False
+
+            last = self._size - 1
+            if position != last:
+                moved_case_id = int(self._case_ids[last])
+                self._matrix[position] = self._matrix[last]
+                self._case_ids[position] = moved_case_id
+                self._metadata.move_row(last, position)
+                self._positions[moved_case_id] = position
+            if self._fields:
+                if position != last:
+                    self._fields.move(last, position)
+                else:
+                    self._fields.set(position, None, None)
+            self._size = last
+            self._changes += 1
+            self._duplicates.remove(case_id)
+            self.backend.remove(case_id)
+            return True
+
+    def find_duplicates(
+        self,
+        fingerprint: Optional[int],
+        max_distance: int = NEAR_DUPLICATE_DISTANCE,
+        filters: Optional[dict] = None,
+        limit: int = 10
+    ) -> List[tuple]:
+        """
+        Indexed cases whose error fingerprint is within max_distance bits
+
+        Args:
+            fingerprint: fingerprint.error_fingerprint() of the query
+            filters: Optional CaseMetadata.mask() filters
+
+        Returns:
+            Up to limit (CaseID, distance) tuples, closest first
+        """
+        with self._lock:
+            matches = self._duplicates.find(fingerprint, max_distance)
+            if filters and matches:
+                positions = [self._positions[case_id] for case_id, _ in matches]
+                keep = self._metadata.matches(filters, np.array(positions, dtype=np.int64))
+                matches = [match for match, kept in zip(matches, keep) if kept]
+            return matches[:limit]
+
+    def vector(self, case_id: int) -> Optional[np.ndarray]:
+        """Copy of the normalized vector of an indexed case"""
+        with self._lock:
+            position = self._positions.get(case_id)
+            return None if position is None else self._matrix[position].copy()
+
+    def icm_statistics(self, case_ids: List[int], months: int = 6, now: Optional[datetime] = None) -> dict:
+        """
+        ICM statistics of the given indexed cases created in the last months
+
+        Read from the in-memory ICM columns, so recommendations need no extra
+        database round trip; cases not in the index are ignored.
+        """
+        since = subtract_months(now or datetime.now(), months)
+        with self._lock:
+            positions = [self._positions[case_id] for case_id in case_ids if case_id in self._positions]
+            return self._metadata.icm_statistics(np.array(positions, dtype=np.int64), since)
+
+    def icm_rollup(self, months: int = 12, now: Optional[datetime] = None) -> List[dict]:
+        """
+        Per-product, per-month ICM statistics for the last months calendar
+        months (the current one included)
+
+        The result is materialized and reused until the index changes or the
+        window moves to the next month.
+        """
+        month_start = (now or datetime.now()).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        since = subtract_months(month_start, months - 1)
+        with self._lock:
+            key = (since, self._changes, self._size)
+            cached = self._rollups.get(months)
+            if cached is None or cached[0] != key:
+                cached = (key, self._metadata.icm_rollup(self._size, since))
+                self._rollups[months] = cached
+            return cached[1]
+
+    def search(self, query_embedding: np.ndarray, k: int = 5, filters: Optional[dict] = None) -> dict:
+        """
+        Score one query against the indexed cases
+
+        Args:
+            query_embedding: Query vector (does not need to be normalized)
+            k: Number of top results to return
+            filters: Optional CaseMetadata.mask() filters
+
+        Returns:
+            SimilarityService.summarize() result whose top_k holds
+            (CaseID, score) tuples sorted by score descending
+        """
+        return self.search_batch(np.atleast_2d(query_embedding), k, [filters])[0]
+
+    def search_batch(
+        self,
+        query_embeddings: np.ndarray,
+        k: int = 5,
+        filters: Optional[List[Optional[dict]]] = None
+    ) -> List[dict]:
+        """
+        Score a batch of queries against the indexed cases in one matrix product
+
+        Queries sharing the same filters are scored together through the
+        search backend, restricted to the rows matching their filters (see
+        SearchBackend.search). Threshold counts cover every scored case (all
+        matching cases for exact scoring, the candidates for approximate
+        backends).
+
+        Args:
+            filters: Optional CaseMetadata.mask() filters per query
+
+        Returns:
+            One SimilarityService.summarize() result per query, with top_k
+            holding (CaseID, score) tuples
+        """
+        queries = SimilarityService.normalize(np.atleast_2d(query_embeddings))
+        filters = filters or [None] * queries.shape[0]
+
+        groups: Dict[tuple, List[int]] = {}
+        for i, query_filters in enumerate(filters):
+            groups.setdefault(CaseMetadata.filter_key(query_filters), []).append(i)
+
+        # Snapshot under the lock and score outside it, so concurrent searches
+        # and writes only wait for the bookkeeping. Appends past size and
+        # capacity growth (new arrays) do not touch the snapshot; a case
+        # removed meanwhile may be scored with the row that replaced it, like
+        # one deleted by another worker since the last refresh.
+        with self._lock:
+            size = self._size
+            version = self._changes
+            matrix = self._matrix[:size]
+            case_ids = self._case_ids[:size].copy()
+            group_rows = {
+                key: np.flatnonzero(self._metadata.mask(filters[indices[0]], size)) if key else None
+                for key, indices in groups.items()
+            }
+
+        results: List[Optional[dict]] = [None] * queries.shape[0]
+        for key, indices in groups.items():
+            group_results = self._search_rows(queries[indices], k, matrix, case_ids, group_rows[key], version)
+            for i, result in zip(indices, group_results):
+                results[i] = result
+
+        return results
+
+    def _search_rows(
+        self,
+        queries: np.ndarray,
+        k: int,
+        matrix: np.ndarray,
+        case_ids: np.ndarray,
+        rows: Optional[np.ndarray],
+        version: int
+    ) -> List[dict]:
+        """Score queries against a snapshot of the rows, or only the given rows of it (without the lock)"""
+        if len(case_ids) == 0:
+            return SimilarityService.summarize(np.empty((queries.shape[0], 0)), k)
+
+        with stage("score"):
+            candidate_ids, similarities = self.backend.search(matrix, case_ids, queries, k, rows)
+        if self._fields and self._fields.segments:
+            with stage("fuse"):
+                with self._lock:
+                    plans = self._fusion_plans(candidate_ids, rows, version)
+                similarities = self._fuse(queries, similarities, plans)
+        with stage("top_k"):
+            results = SimilarityService.summarize(similarities, k)
+
+        for i, result in enumerate(results):
+            row_ids = candidate_ids if candidate_ids.ndim == 1 else candidate_ids[i]
+            result["top_k"] = [(int(row_ids[idx]), score) for idx, score in result["top_k"]]
+        return results
+
+    def _fusion_plans(self, candidate_ids: np.ndarray, rows: Optional[np.ndarray], version: int) -> list:
+        """
+        FieldVectors plans of search candidates (caller holds the lock)
+
+        Returns:
+            (query index or None for every query, valid candidate mask or
+            None for all, plan) tuples; candidates no longer indexed are
+            left out of the plans
+        """
+        if candidate_ids.ndim == 1 and version == self._changes:
+            # Snapshot positions are still current
+            return [(None, None, self._fields.plan(rows, self._size))]
+        positions = self._candidate_positions(candidate_ids)
+        if positions.ndim == 1:
+            valid = positions >= 0
+            return [(None, valid, self._fields.plan(positions[valid], self._size))]
+        # Approximate backends return different candidates for every query
+        plans = []
+        for i, query_positions in enumerate(positions):
+            valid = query_positions >= 0
+            plans.append((i, valid, self._fields.plan(query_positions[valid], self._size)))
+        return plans
+
+    def _candidate_positions(self, candidate_ids: np.ndarray) -> np.ndarray:
+        """Current positions of search backend candidates (-1 if not indexed)"""
+        return np.array(
+            [self._positions.get(case_id, -1) for case_id in candidate_ids.ravel().tolist()],
+            dtype=np.int64
+        ).reshape(candidate_ids.shape)
+
+    def _fuse(self, queries: np.ndarray, similarities: np.ndarray, plans: list) -> np.ndarray:
+        """Late-fuse field scores into candidate similarities (Q x C) with _fusion_plans() plans"""
+        if len(plans) == 1 and plans[0][0] is None and plans[0][1] is None:
+            return self._fields.fuse(queries, similarities, plans[0][2])
+        fused = similarities.copy()
+        for i, valid, plan in plans:
+            query_rows = slice(None) if i is None else slice(i, i + 1)
+            if valid is None:
+                fused[query_rows] = self._fields.fuse(queries[query_rows], similarities[query_rows], plan)
+            else:
+                fused[query_rows, valid] = self._fields.fuse(
+                    queries[query_rows], similarities[query_rows][:, valid], plan
+                )
+        return fused
+
+    def _apply_rows(self, rows: List[dict], update_backend: bool = True):
+        for row in rows:
+            embedding = embedding_service.from_bytes(row["Embedding"])
+            field_vectors = None
+            if self._fields and row.get("FieldEmbeddings"):
+                field_vectors = embedding_service.field_vectors_from_bytes(row["FieldEmbeddings"], embedding.shape[0])
+            if update_backend:
+                self.upsert(row["CaseID"], embedding, row, field_vectors)
+            else:
+                self._set_row(row["CaseID"], SimilarityService.normalize(np.ravel(embedding)), row, field_vectors)
+            if self._watermark is None or row["ModifiedDate"] > self._watermark:
+                self._watermark = row["ModifiedDate"]
+
+    def _ensure_capacity(self, required: int, dimension: int):
+        """Grow the backing arrays geometrically so appends stay amortized O(1)"""
+        if self._matrix.shape[0] >= required and self._matrix.shape[1] == dimension:
+            return
+
+        capacity = max(self.INITIAL_CAPACITY, self._matrix.shape[0])
+        while capacity < required:
+            capacity *= 2
+
+        matrix = np.zeros((capacity, dimension), dtype=np.float32)
+        case_ids = np.zeros(capacity, dtype=np.int64)
+        if self._size:
+            matrix[:self._size] = self._matrix[:self._size]
+            case_ids[:self._size] = self._case_ids[:self._size]
+        self._matrix = matrix
+        self._case_ids = case_ids
+        self._metadata.resize(capacity, self._size)
+        if self._fields:
+            self._fields.resize(capacity, self._size)
+
+
+def _snapshot_path() -> Optional[str]:
+    """Snapshot file for the current model, or None when VECTOR_SNAPSHOT_DIR is empty"""
+    snapshot_dir = os.getenv("VECTOR_SNAPSHOT_DIR", ".cache")
+    if not snapshot_dir:
+        return None
+    safe_model = embedding_service.model_name.replace("/", "_")
+    return os.path.join(snapshot_dir, f"embeddings_{safe_model}_v{embedding_service.model_version}.snap")
+
+
+# Global instance (one per gunicorn worker)
+vector_index = VectorIndex(
+    backend=create_search_backend(embedding_service.model_name, embedding_service.model_version),
+    refresh_interval=float(os.getenv("VECTOR_INDEX_REFRESH_SECONDS", "30")),
+    snapshot_path=_snapshot_path(),
+    snapshot_dtype=os.getenv("VECTOR_SNAPSHOT_DTYPE", "float32"),
+    field_vectors=FieldVectors(
+        weights=parse_field_weights(os.getenv("FIELD_WEIGHTS", "")),
+        fusion=os.getenv("FIELD_FUSION", "mean")
+    ) if embedding_service.field_embeddings else None
+)
+vector_index_bytes.set_function(lambda: vector_index.nbytes, part="vectors")
+vector_index_bytes.set_function(lambda: vector_index.field_nbytes, part="field_vectors")
@@ -0,0 +1,39 @@
+-- Migration script to add the persistent case embedding store
+-- Run this if you already have the icm.Cases table created
+
+IF OBJECT_ID('icm.CaseEmbeddings', 'U') IS NULL
+BEGIN
+    CREATE TABLE icm.CaseEmbeddings (
+        CaseID INT NOT NULL PRIMARY KEY,
+        ModelName NVARCHAR(200) NOT NULL,
+        ModelVersion NVARCHAR(50) NOT NULL,
+        Dimension INT NOT NULL,
+        TextHash CHAR(64) NOT NULL,
+        Embedding VARBINARY(MAX) NOT NULL,
+        CreatedDate DATETIME DEFAULT GETDATE() NOT NULL,
+        ModifiedDate DATETIME DEFAULT GETDATE() NOT NULL,
+
+        CONSTRAINT FK_CaseEmbeddings_Cases FOREIGN KEY (CaseID)
+            REFERENCES icm.Cases(CaseID) ON DELETE CASCADE
+    );
+    PRINT 'Created icm.CaseEmbeddings table';
+END
+ELSE
+BEGIN
+    PRINT 'icm.CaseEmbeddings table already exists';
+END
+GO
+
+IF NOT EXISTS (
+    SELECT * FROM sys.indexes
+    WHERE object_id = OBJECT_ID('icm.CaseEmbeddings')
+    AND name = 'IX_CaseEmbeddings_Model'
+)
+BEGIN
+    CREATE INDEX IX_CaseEmbeddings_Model ON icm.CaseEmbeddings(ModelName, ModelVersion);
+    PRINT 'Created IX_CaseEmbeddings_Model index';
+END
+GO
+
+PRINT 'Migration completed successfully!';
+PRINT 'Run backend/reindex.py to embed existing cases';
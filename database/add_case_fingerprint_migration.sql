@@ -0,0 +1,16 @@
+-- Migration script to add error fingerprints (near-duplicate detection) to icm.Cases
+-- Run this if you already have the icm.Cases table created
+
+IF COL_LENGTH('icm.Cases', 'Fingerprint') IS NULL
+BEGIN
+    ALTER TABLE icm.Cases ADD Fingerprint BIGINT NULL;
+    PRINT 'Added Fingerprint column to icm.Cases';
+END
+ELSE
+BEGIN
+    PRINT 'Fingerprint column already exists';
+END
+GO
+
+PRINT 'Migration completed successfully!';
+PRINT 'Run backend/backfill_fingerprints.py to fingerprint existing cases';
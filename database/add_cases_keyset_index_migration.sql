@@ -0,0 +1,30 @@
+-- Migration script to add the keyset pagination index used by GET /cases
+-- Run this if you already have the icm.Cases table created
+--
+-- GET /cases orders by (CreatedDate DESC, CaseID DESC) and continues from the
+-- last row of the previous page. IX_Cases_CreatedDate only keys CreatedDate
+-- (CaseID follows in ascending order), so each page needed a Top-N sort and
+-- key lookups; this index serves a page as one seek covering the summary columns.
+
+IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_Cases_CreatedDate_CaseID' AND object_id = OBJECT_ID('icm.Cases'))
+BEGIN
+    CREATE INDEX IX_Cases_CreatedDate_CaseID ON icm.Cases(CreatedDate DESC, CaseID DESC)
+    INCLUDE (CaseTitle, Product, Component, Severity, Priority, CaseStatus, Region,
+             AssignedTeam, AssignedTo, ICMNumber, ModifiedDate);
+    PRINT 'Created index IX_Cases_CreatedDate_CaseID';
+END
+ELSE
+BEGIN
+    PRINT 'IX_Cases_CreatedDate_CaseID already exists';
+END
+GO
+
+-- Superseded: same leading key
+IF EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_Cases_CreatedDate' AND object_id = OBJECT_ID('icm.Cases'))
+BEGIN
+    DROP INDEX IX_Cases_CreatedDate ON icm.Cases;
+    PRINT 'Dropped index IX_Cases_CreatedDate';
+END
+GO
+
+PRINT 'Migration completed successfully!';
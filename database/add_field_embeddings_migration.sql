@@ -0,0 +1,16 @@
+-- Migration script to add per-field chunk embeddings to the embedding store
+-- Run this if you already have the icm.CaseEmbeddings table created
+
+IF COL_LENGTH('icm.CaseEmbeddings', 'FieldEmbeddings') IS NULL
+BEGIN
+    ALTER TABLE icm.CaseEmbeddings ADD FieldEmbeddings VARBINARY(MAX) NULL;
+    PRINT 'Added FieldEmbeddings column to icm.CaseEmbeddings';
+END
+ELSE
+BEGIN
+    PRINT 'FieldEmbeddings column already exists';
+END
+GO
+
+PRINT 'Migration completed successfully!';
+PRINT 'Set FIELD_EMBEDDINGS=true and run backend/reindex.py --mode changed to embed case fields';
@@ -5,7 +5,11 @@ BEGIN
 END
 GO
 
--- Drop table if exists (for clean setup)
+-- Drop tables if they exist (for clean setup)
+IF OBJECT_ID('icm.CaseEmbeddings', 'U') IS NOT NULL
+    DROP TABLE icm.CaseEmbeddings
+GO
+
 IF OBJECT_ID('icm.Cases', 'U') IS NOT NULL
     DROP TABLE icm.Cases
 GO
@@ -45,6 +49,10 @@ CREATE TABLE icm.Cases (
     ICMDescription NVARCHAR(MAX),
     DaysDelayedBeforeICM INT,
     
+    -- SimHash of ErrorMessage, ErrorCodes and StackTrace for duplicate detection
+    -- (computed by the API; see backend/fingerprint.py)
+    Fingerprint BIGINT NULL,
+    
     -- Constraints
     CONSTRAINT CK_Cases_Severity CHECK (Severity IN ('Critical', 'High', 'Medium', 'Low')),
     CONSTRAINT CK_Cases_Status CHECK (CaseStatus IN ('Open', 'In Progress', 'Resolved', 'Closed', 'Pending'))
@@ -61,7 +69,31 @@ GO
 CREATE INDEX IX_Cases_Status ON icm.Cases(CaseStatus)
 GO
 
-CREATE INDEX IX_Cases_CreatedDate ON icm.Cases(CreatedDate DESC)
+-- Keyset pagination of GET /cases: one seek per page, covering the summary columns
+CREATE INDEX IX_Cases_CreatedDate_CaseID ON icm.Cases(CreatedDate DESC, CaseID DESC)
+INCLUDE (CaseTitle, Product, Component, Severity, Priority, CaseStatus, Region,
+         AssignedTeam, AssignedTo, ICMNumber, ModifiedDate)
+GO
+
+-- Create embedding store (one vector per case, computed on create/update)
+CREATE TABLE icm.CaseEmbeddings (
+    CaseID INT NOT NULL PRIMARY KEY,
+    ModelName NVARCHAR(200) NOT NULL,
+    ModelVersion NVARCHAR(50) NOT NULL,
+    Dimension INT NOT NULL,
+    TextHash CHAR(64) NOT NULL,
+    Embedding VARBINARY(MAX) NOT NULL,
+    -- Per-field chunk vectors (FIELD_EMBEDDINGS=true): uint8 field codes, then float16 vectors
+    FieldEmbeddings VARBINARY(MAX) NULL,
+    CreatedDate DATETIME DEFAULT GETDATE() NOT NULL,
+    ModifiedDate DATETIME DEFAULT GETDATE() NOT NULL,
+
+    CONSTRAINT FK_CaseEmbeddings_Cases FOREIGN KEY (CaseID)
+        REFERENCES icm.Cases(CaseID) ON DELETE CASCADE
+)
+GO
+
+CREATE INDEX IX_CaseEmbeddings_Model ON icm.CaseEmbeddings(ModelName, ModelVersion)
 GO
 
 -- Optional: Create a view for active cases
@@ -73,4 +105,5 @@ GO
 
 PRINT 'Database schema created successfully!'
 PRINT 'Table: icm.Cases'
+PRINT 'Table: icm.CaseEmbeddings'
 PRINT 'View: icm.ActiveCases'
@@ -1,5 +1,5 @@
 import axios from 'axios';
-import { CaseData, Case, RecommendationRequest, RecommendationResponse } from './types';
+import { CaseData, Case, CasePage, RecommendationRequest, RecommendationResponse } from './types';
 
 const API_BASE_URL = '/api';
 
@@ -27,8 +27,8 @@ export const getRecommendations = async (
   return response.data;
 };
 
-export const getCases = async (limit = 100, offset = 0): Promise<Case[]> => {
-  const response = await api.get('/cases', { params: { limit, offset } });
+export const getCases = async (limit = 100, cursor?: string, fields?: string): Promise<CasePage> => {
+  const response = await api.get('/cases', { params: { limit, cursor, fields } });
   return response.data;
 };
 
@@ -30,6 +30,11 @@ export interface Case extends CaseData {
   ModifiedDate?: string;
 }
 
+export interface CasePage {
+  items: Partial<Case>[];
+  next_cursor: string | null;
+}
+
 export interface SimilarCase {
   case: Case;
   similarity_score: number;